@@ -1,6 +1,7 @@
 import streamlit as st
 
 from data.data_store import init_session_state
+from services.jobs import hand_off_finished_jobs
 
 import views.home as home
 import views.matches as matches
@@ -52,6 +53,10 @@ def main() -> None:
     # Initialise in-memory dataframes and other session state
     init_session_state()
 
+    # Resultaten van afgeronde achtergrondjobs overnemen
+    for job in hand_off_finished_jobs():
+        st.toast(f"Achtergrondjob afgerond: {job.description}")
+
     page = render_sidebar()
 
     # Router over de tabbladen
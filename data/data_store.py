@@ -1,5 +1,6 @@
 # data/data_store.py
 # data/data_store.py
+import os
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
@@ -15,6 +16,9 @@ NEWSLETTERS_KEY = "newsletters_df"
 PROMPTS_KEY = "prompts_df"
 ACTIVE_PROMPT_ID_KEY = "active_prompt_id"
 
+# Map voor gegevens die een herstart moeten overleven (caches e.d.).
+LOCAL_DATA_DIR = os.getenv("SUBSIDIEMATCH_DATA_DIR", ".subsidiematch")
+
 
 def init_session_state() -> None:
     """Initialiseer alle in-memory tabellen in st.session_state als ze nog niet bestaan."""
@@ -160,6 +164,8 @@ def _seed_subsidies() -> pd.DataFrame:
                 "instrumenten en wordt via RVO verstrekt."
             ),
             "weblink": "https://www.rvo.nl/subsidies-financiering/mit/rd-samenwerkingsprojecten-ai",
+            # Harde voorwaarden (zie services/eligibility.py): alleen mkb
+            "voorwaarden": '{"max_medewerkers": 250, "max_omzet": 50000000}',
         },
 
         # 2. Praktijkgericht onderzoek naar opschaling van digitale/hybride zorg (ZonMw)
@@ -197,6 +203,7 @@ def _seed_subsidies() -> pd.DataFrame:
                 "andere instellingen, bijvoorbeeld via publicaties, handreikingen en implementatieplannen."
             ),
             "weblink": "https://www.zonmw.nl/nl/subsidie/praktijkgericht-onderzoek-naar-opschaling-van-digitale-hybride-zorg",
+            "voorwaarden": '{"sectoren": ["zorg", "welzijn", "onderwijs"]}',
         },
 
         # 3. Implementatie- en opschalingscoaching Ouderen Thuis (Zorg voor innoveren / ZonMw)
@@ -234,6 +241,7 @@ def _seed_subsidies() -> pd.DataFrame:
                 "ambitie om ouderen zo lang mogelijk zelfstandig en ondersteund thuis te laten wonen."
             ),
             "weblink": "https://www.zonmw.nl/nl/subsidie/implementatie-en-opschalingscoaching-ouderen-thuis-ronde-3",
+            "voorwaarden": '{"sectoren": ["zorg"]}',
         },
     ]
 
@@ -254,6 +262,7 @@ def _empty_matches() -> pd.DataFrame:
         "match_score",
         "match_toelichting",
         "datum_toegevoegd",
+        "status",             # 'gescoord', 'voorgefilterd', 'buiten_budget', 'uitgesloten' of 'fout'
     ]
     return pd.DataFrame(columns=columns)
 
@@ -387,3 +396,9 @@ def get_active_prompt() -> Optional[Dict[str, Any]]:
 def set_active_prompt_id(prompt_id: int) -> None:
     """Stel een prompt in als actief."""
     st.session_state[ACTIVE_PROMPT_ID_KEY] = int(prompt_id)
+
+
+def local_data_path(filename: str) -> str:
+    """Geef een pad binnen LOCAL_DATA_DIR en maak de map aan als die nog niet bestaat."""
+    os.makedirs(LOCAL_DATA_DIR, exist_ok=True)
+    return os.path.join(LOCAL_DATA_DIR, filename)
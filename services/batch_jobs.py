@@ -0,0 +1,292 @@
+# services/batch_jobs.py
+"""
+Offline batch-scoring voor grote, niet-interactieve herberekeningen.
+
+Flow:
+1. alle gerenderde prompts naar een JSONL-jobbestand schrijven
+   (formaat van de OpenAI Batch API);
+2. het bestand indienen bij een batch-backend;
+3. pollen tot de job klaar is;
+4. de resultaten via custom_id terugkoppelen naar (organisatie, subsidie).
+
+Naast de OpenAI-backend is er een lokale, bestandsgebaseerde stand-in
+zodat de hele pipeline offline te testen is.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from data.data_store import local_data_path
+from services.llm_client import error_result, parse_score_json
+from services.llm_stub_server import deterministic_score_content
+
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+BATCH_BACKENDS = ("local", "openai")
+
+# Statussen zoals de OpenAI Batch API ze teruggeeft
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+# --------------------------------------------------------
+# JOBBESTAND SCHRIJVEN EN RESULTATEN LEZEN
+# --------------------------------------------------------
+def pair_custom_id(organisatie_id: Any, subsidie_id: Any) -> str:
+    """Sleutel per paar in het jobbestand."""
+    return f"org-{organisatie_id}__sub-{subsidie_id}"
+
+
+def write_job_file(
+    path: str,
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    prompt_template: str,
+    llm_client,
+) -> List[str]:
+    """
+    Schrijf één request per paar naar een JSONL-bestand.
+    Retourneert de custom_id's in pair-volgorde.
+    """
+    custom_ids = []
+    with open(path, "w", encoding="utf-8") as fh:
+        for org, sub in pairs:
+            custom_id = pair_custom_id(org["organisatie_id"], sub["subsidie_id"])
+            prompt = llm_client.render_prompt(prompt_template, org, sub)
+            request = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": CHAT_COMPLETIONS_URL,
+                "body": llm_client.chat_request_body(prompt),
+            }
+            fh.write(json.dumps(request, ensure_ascii=False, default=str) + "\n")
+            custom_ids.append(custom_id)
+    return custom_ids
+
+
+def read_results_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Lees een batch-outputbestand in als {custom_id: resultaat-dict}.
+    Regels met een fout of onleesbare content krijgen status "fout".
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            try:
+                if record.get("error"):
+                    raise RuntimeError(record["error"])
+                response = record["response"]
+                if response.get("status_code") != 200:
+                    raise RuntimeError(f"HTTP {response.get('status_code')}")
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[custom_id] = parse_score_json(json.loads(content))
+            except Exception as exc:
+                results[custom_id] = error_result(exc)
+    return results
+
+
+# --------------------------------------------------------
+# BACKENDS
+# --------------------------------------------------------
+class OpenAIBatchBackend:
+    """
+    Batch-backend via de OpenAI Batch API (files + batches).
+    """
+
+    def __init__(self, openai_client, completion_window: str = "24h"):
+        self._client = openai_client
+        self._completion_window = completion_window
+
+    def submit(self, job_path: str) -> str:
+        with open(job_path, "rb") as fh:
+            uploaded = self._client.files.create(file=fh, purpose="batch")
+        batch = self._client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self._completion_window,
+        )
+        return batch.id
+
+    def status(self, job_id: str) -> str:
+        return self._client.batches.retrieve(job_id).status
+
+    def download_results(self, job_id: str, output_path: str) -> None:
+        batch = self._client.batches.retrieve(job_id)
+        with open(output_path, "w", encoding="utf-8") as out:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    out.write(self._client.files.content(file_id).text)
+
+
+class LocalBatchBackend:
+    """
+    Lokale stand-in voor de batch-API.
+
+    Jobs worden in een map op schijf gezet en bij de eerste statuscheck
+    verwerkt met een deterministische nep-score per prompt. Het
+    outputformaat is gelijk aan dat van de OpenAI Batch API.
+    """
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        os.makedirs(workdir, exist_ok=True)
+
+    def submit(self, job_path: str) -> str:
+        job_id = f"local-batch-{uuid.uuid4().hex[:12]}"
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        shutil.copyfile(job_path, os.path.join(job_dir, "input.jsonl"))
+        self._write_status(job_id, "validating")
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        status = self._read_status(job_id)
+        if status not in FINISHED_STATUSES:
+            self._process(job_id)
+            status = self._read_status(job_id)
+        return status
+
+    def download_results(self, job_id: str, output_path: str) -> None:
+        shutil.copyfile(os.path.join(self._job_dir(job_id), "output.jsonl"), output_path)
+
+    # ---- intern ----
+    def _process(self, job_id: str) -> None:
+        job_dir = self._job_dir(job_id)
+        self._write_status(job_id, "in_progress")
+        with open(os.path.join(job_dir, "input.jsonl"), encoding="utf-8") as src, open(
+            os.path.join(job_dir, "output.jsonl"), "w", encoding="utf-8"
+        ) as out:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                prompt = request["body"]["messages"][-1]["content"]
+                content = deterministic_score_content(prompt, "Lokale batch-stand-in")
+                out.write(
+                    json.dumps(
+                        {
+                            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                            "custom_id": request["custom_id"],
+                            "response": {
+                                "status_code": 200,
+                                "body": {
+                                    "choices": [
+                                        {"message": {"content": content}}
+                                    ]
+                                },
+                            },
+                            "error": None,
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+        self._write_status(job_id, "completed")
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.workdir, job_id)
+
+    def _write_status(self, job_id: str, status: str) -> None:
+        with open(os.path.join(self._job_dir(job_id), "status"), "w") as fh:
+            fh.write(status)
+
+    def _read_status(self, job_id: str) -> str:
+        with open(os.path.join(self._job_dir(job_id), "status")) as fh:
+            return fh.read().strip()
+
+
+def get_batch_backend(name: str, llm_client):
+    """
+    Kies een batch-backend: "local" (stand-in op schijf) of "openai".
+    """
+    if name == "local":
+        return LocalBatchBackend(local_data_path(os.path.join("batch_jobs", "local_backend")))
+    if name == "openai":
+        if llm_client.openai_client() is None:
+            raise ValueError("De OpenAI-batchbackend vereist een OPENAI_API_KEY.")
+        return OpenAIBatchBackend(llm_client.openai_client())
+    raise ValueError(f"Onbekende batch-backend: {name}")
+
+
+def default_batch_workdir() -> str:
+    return local_data_path("batch_jobs")
+
+
+# --------------------------------------------------------
+# PIPELINE
+# --------------------------------------------------------
+def score_pairs_via_batch(
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    prompt_template: str,
+    llm_client,
+    backend,
+    workdir: str,
+    poll_interval: float = 30.0,
+    timeout: Optional[float] = None,
+    job_id: Optional[str] = None,
+    on_submit: Optional[Callable[[str], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Scoor paren via een batch-job en retourneer de resultaten in pair-volgorde.
+
+    Met job_id (een eerder ingediende job voor dezelfde paren, zie
+    services.checkpoints) wordt die job verder gepolld in plaats van een
+    nieuwe in te dienen; is hij onbekend of mislukt, dan volgt alsnog een
+    nieuwe. on_submit krijgt het id van een nieuw ingediende job.
+
+    Paren zonder resultaat in de output (of na een mislukte job) krijgen
+    status "fout".
+    """
+    if not pairs:
+        return []
+
+    os.makedirs(workdir, exist_ok=True)
+    run_id = uuid.uuid4().hex[:12]
+    job_path = os.path.join(workdir, f"job-{run_id}.jsonl")
+    output_path = os.path.join(workdir, f"job-{run_id}.output.jsonl")
+
+    status = None
+    if job_id is not None:
+        try:
+            status = backend.status(job_id)
+        except Exception:
+            # Bijvoorbeeld een lokale jobmap die is opgeruimd
+            status = None
+        if status is None or (status in FINISHED_STATUSES and status != "completed"):
+            job_id = None
+
+    if job_id is None:
+        custom_ids = write_job_file(job_path, pairs, prompt_template, llm_client)
+        job_id = backend.submit(job_path)
+        if on_submit is not None:
+            on_submit(job_id)
+        status = backend.status(job_id)
+    else:
+        custom_ids = [
+            pair_custom_id(org["organisatie_id"], sub["subsidie_id"]) for org, sub in pairs
+        ]
+
+    started = time.monotonic()
+    while status not in FINISHED_STATUSES:
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch-job {job_id} niet klaar binnen {timeout} s.")
+        time.sleep(poll_interval)
+        status = backend.status(job_id)
+
+    if status != "completed":
+        failed = error_result(RuntimeError(f"Batch-job {job_id} eindigde met status {status}."))
+        return [failed for _ in pairs]
+
+    backend.download_results(job_id, output_path)
+    results = read_results_file(output_path)
+
+    missing = error_result(RuntimeError("Geen resultaat in batch-output."))
+    return [results.get(custom_id, missing) for custom_id in custom_ids]
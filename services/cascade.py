@@ -0,0 +1,203 @@
+# services/cascade.py
+"""
+Modelcascade: eerst goedkoop scoren, alleen twijfelgevallen naar een sterk model.
+
+Een goedkope scorer beoordeelt elk kandidaat-paar: het standaardmodel van
+de client (CASCADE_MODEL, bijvoorbeeld gpt-4o-mini) of een lokale lexicale
+score zonder LLM-call (CASCADE_LEXICAAL). Daarna gaan alleen door naar het
+sterke model:
+
+- paren met een score in de onzekere band (standaard 35–75);
+- de top-K paren per organisatie (die bepalen wat de gebruiker ziet);
+- paren waarvan de goedkope scoring mislukte.
+
+De kolom score_bron in de matches-tabel zegt per paar welke stap de score
+leverde ("goedkoop:<scorer>" of "sterk:<model>").
+
+CascadeTracker houdt per run bij hoeveel paren er zijn geëscaleerd en hoe
+lang elke stap duurde; samen met de LLM-metingen per stap (zie
+services.instrumentation) levert dat een rapport met kosten en doorlooptijd
+naast een schatting voor "alles met het sterke model".
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.instrumentation import estimate_cost, get_metrics
+
+
+CASCADE_MODEL = "model"
+CASCADE_LEXICAAL = "lexicaal"
+CASCADE_SCORERS = (CASCADE_MODEL, CASCADE_LEXICAAL)
+
+DEFAULT_STRONG_MODEL = os.getenv("SUBSIDIEMATCH_CASCADE_STRONG_MODEL", "gpt-4o")
+DEFAULT_CASCADE_BAND = (35, 75)
+DEFAULT_CASCADE_TOP_K = 3
+
+STAGE_GOEDKOOP = "goedkoop"
+STAGE_STERK = "sterk"
+
+# Laatste cascaderapport (voor weergave op Home)
+CASCADE_REPORT_KEY = "cascade_report"
+
+
+def score_source(stage: str, name: str) -> str:
+    """Waarde voor de kolom score_bron, zoals "sterk:gpt-4o"."""
+    return f"{stage}:{name}"
+
+
+def stage_run_id(run_id: str, stage: str) -> str:
+    """Run-label voor de LLM-metingen van één stap van de cascade."""
+    return f"{run_id}:{stage}"
+
+
+def lexical_first_pass(
+    lexical: np.ndarray,
+    pairs: Sequence[Tuple[int, int]],
+) -> List[Dict[str, Any]]:
+    """
+    Goedkope scores zonder LLM: de BM25-score, per organisatie genormaliseerd
+    naar 1–100 (de best passende subsidie van een organisatie krijgt 100).
+    """
+    row_max = lexical.max(axis=1) if lexical.size else np.zeros(0)
+    results = []
+    for i, j in pairs:
+        value = float(lexical[i, j])
+        relative = value / row_max[i] if row_max[i] > 0 else 0.0
+        score = 1 + int(round(99 * relative))
+        results.append(
+            {
+                "match_score": score,
+                "match_toelichting": [
+                    f"Lexicale eerste ronde: BM25-score {value:.2f} "
+                    "(genormaliseerd per organisatie).",
+                    "Niet door een model beoordeeld.",
+                ],
+                "status": "ok",
+            }
+        )
+    return results
+
+
+def escalation_mask(
+    org_positions: Sequence[int],
+    scores: Sequence[Optional[float]],
+    band: Tuple[float, float] = DEFAULT_CASCADE_BAND,
+    top_k: int = DEFAULT_CASCADE_TOP_K,
+) -> np.ndarray:
+    """
+    Welke paren naar het sterke model gaan: score binnen de band (grenzen
+    inclusief), top-K per organisatie of geen score (mislukt).
+    """
+    values = np.array([np.nan if score is None else float(score) for score in scores])
+    if values.size == 0:
+        return np.zeros(0, dtype=bool)
+
+    low, high = band
+    escalate = np.isnan(values) | ((values >= low) & (values <= high))
+    if top_k > 0:
+        rank = (
+            pd.Series(values)
+            .groupby(np.asarray(org_positions))
+            .rank(method="first", ascending=False)
+            .to_numpy()
+        )
+        escalate |= rank <= top_k
+    return escalate
+
+
+class CascadeTracker:
+    """Aantallen en doorlooptijd per stap van één cascaderun. Thread-safe."""
+
+    def __init__(self, run_id: str, cheap_name: str, strong_model: str):
+        self.run_id = run_id
+        self.cheap_name = cheap_name
+        self.strong_model = strong_model
+        self.n_pairs = 0
+        self.n_escalated = 0
+        self.cheap_seconds = 0.0
+        self.strong_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        n_pairs: int,
+        n_escalated: int,
+        cheap_seconds: float,
+        strong_seconds: float,
+    ) -> None:
+        with self._lock:
+            self.n_pairs += n_pairs
+            self.n_escalated += n_escalated
+            self.cheap_seconds += cheap_seconds
+            self.strong_seconds += strong_seconds
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Kosten en doorlooptijd per stap en in totaal, naast een schatting
+        voor een run waarin het sterke model alle paren scoort:
+
+        - kosten: per paar de tokens van een goedkope call tegen de prijzen
+          van het sterke model × aantal paren; zonder goedkope calls
+          (lexicale eerste ronde, alles uit de score-cache) de gemiddelde
+          kosten per sterke call × aantal paren;
+        - doorlooptijd: de tijd van de sterke stap per geëscaleerd paar ×
+          aantal paren.
+
+        Calls die uit de score-cache kwamen hebben geen metingen; de
+        schattingen rekenen daarom met gemiddelden per gemeten call.
+        """
+        metrics = get_metrics()
+        cheap = metrics.run_stats(stage_run_id(self.run_id, STAGE_GOEDKOOP))
+        strong = metrics.run_stats(stage_run_id(self.run_id, STAGE_STERK))
+        with self._lock:
+            n_pairs, n_escalated = self.n_pairs, self.n_escalated
+            cheap_seconds, strong_seconds = self.cheap_seconds, self.strong_seconds
+
+        cheap_cost = cheap["cost_usd"] if cheap else 0.0
+        strong_cost = strong["cost_usd"] if strong else 0.0
+
+        baseline_cost = None
+        if cheap and cheap["calls"]:
+            cheap_at_strong_prices = estimate_cost(
+                self.strong_model,
+                cheap["prompt_tokens"],
+                cheap["cached_tokens"],
+                cheap["completion_tokens"],
+            )
+            baseline_cost = cheap_at_strong_prices / cheap["calls"] * n_pairs
+        elif strong and strong["calls"]:
+            baseline_cost = strong_cost / strong["calls"] * n_pairs
+        baseline_seconds = strong_seconds / n_escalated * n_pairs if n_escalated else None
+
+        total_cost = cheap_cost + strong_cost
+        total_seconds = cheap_seconds + strong_seconds
+        return {
+            "n_pairs": n_pairs,
+            "n_escalated": n_escalated,
+            "escalation_share": n_escalated / n_pairs if n_pairs else 0.0,
+            "cheap": {
+                "scorer": self.cheap_name,
+                "calls": cheap["calls"] if cheap else 0,
+                "cost_usd": round(cheap_cost, 6),
+                "seconds": round(cheap_seconds, 3),
+            },
+            "strong": {
+                "model": self.strong_model,
+                "calls": strong["calls"] if strong else 0,
+                "cost_usd": round(strong_cost, 6),
+                "seconds": round(strong_seconds, 3),
+            },
+            "total": {"cost_usd": round(total_cost, 6), "seconds": round(total_seconds, 3)},
+            "baseline": {
+                "cost_usd": round(baseline_cost, 6) if baseline_cost is not None else None,
+                "seconds": round(baseline_seconds, 3) if baseline_seconds is not None else None,
+            },
+            "cost_saving": 1 - total_cost / baseline_cost if baseline_cost else None,
+            "time_saving": 1 - total_seconds / baseline_seconds if baseline_seconds else None,
+        }
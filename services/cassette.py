@@ -0,0 +1,192 @@
+# services/cassette.py
+"""
+Opnemen en afspelen van LLM-antwoorden ("cassette").
+
+Bij opnemen gaat elke call gewoon naar het model; het ruwe antwoord en het
+tokengebruik worden daarnaast bewaard onder een hash van de request-body
+(model, berichten, max_tokens, temperatuur). Bij afspelen komt hetzelfde
+antwoord uit het geheugen terug, zonder netwerk, rate limiter of kosten.
+Zo kunnen herberekeningen en benchmarks offline draaien op realistische
+modeloutput in plaats van op _mock_response.
+
+Het cassettebestand is gzip-gecomprimeerde JSONL: één regel per opname
+{"k": sleutel, "c": ruwe content, "u": tokengebruik}. Elke opname wordt
+als los gzip-member aangevuld, zodat ook meerdere processen (sharded
+herberekening) veilig naar hetzelfde bestand schrijven; compact() zet het
+bestand om naar één member zonder dubbele sleutels.
+
+Instellen via de omgeving:
+- SUBSIDIEMATCH_CASSETTE_MODE: "record" of "replay" (leeg = uit);
+- SUBSIDIEMATCH_CASSETTE_PATH: pad naar het bestand.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from data.data_store import local_data_path
+
+
+CASSETTE_RECORD = "record"
+CASSETTE_REPLAY = "replay"
+CASSETTE_MODES = (CASSETTE_RECORD, CASSETTE_REPLAY)
+
+# 128 bits is ruim genoeg om botsingen uit te sluiten en houdt regels kort
+KEY_HEX_CHARS = 32
+
+
+class CassetteMiss(LookupError):
+    """Afspelen: er is geen opname voor deze request."""
+
+
+def cassette_key(body: Dict[str, Any]) -> str:
+    """Sleutel van een chat-request: hash over de volledige body."""
+    raw = json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:KEY_HEX_CHARS]
+
+
+class Cassette:
+    """
+    Opnames in het geheugen plus het bestand waar ze in staan.
+
+    Thread-safe via één lock; bij afspelen is een lookup één dict-get.
+    """
+
+    def __init__(self, path: str, mode: str):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Onbekende cassettemodus: {mode}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, Dict[str, int]]] = _load(path)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == CASSETTE_REPLAY
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def replay(self, body: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """Ruwe content en tokengebruik van de opname; CassetteMiss als die er niet is."""
+        key = cassette_key(body)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                raise CassetteMiss(f"Geen opname in de cassette voor deze prompt ({key}).")
+            self.hits += 1
+        return entry
+
+    def record(self, body: Dict[str, Any], content: str, usage: Dict[str, int]) -> None:
+        """Bewaar een antwoord; een al opgenomen request wordt niet opnieuw weggeschreven."""
+        key = cassette_key(body)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (content, usage)
+            line = json.dumps({"k": key, "c": content, "u": usage}, ensure_ascii=False)
+            # Eén write per gzip-member: veilig aanvullen vanuit meerdere processen
+            with open(self.path, "ab") as f:
+                f.write(gzip.compress((line + "\n").encode("utf-8")))
+            self.recorded += 1
+
+    def compact(self) -> None:
+        """Herschrijf het bestand als één gzip-member, zonder dubbele sleutels."""
+        with self._lock:
+            self._entries.update(_load(self.path))
+            tmp_path = self.path + ".tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for key, (content, usage) in self._entries.items():
+                    f.write(json.dumps({"k": key, "c": content, "u": usage}, ensure_ascii=False))
+                    f.write("\n")
+            os.replace(tmp_path, self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Tellers voor weergave in de UI."""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+            }
+
+
+def _load(path: str) -> Dict[str, Tuple[str, Dict[str, int]]]:
+    entries: Dict[str, Tuple[str, Dict[str, int]]] = {}
+    if not os.path.exists(path):
+        return entries
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries.setdefault(record["k"], (record["c"], record.get("u") or {}))
+    except (EOFError, OSError, zlib.error):
+        # Afgebroken laatste opname (proces gestopt tijdens het schrijven):
+        # alles daarvoor is bruikbaar
+        pass
+    return entries
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_cassette: Optional[Cassette] = None
+_shared_cassette_lock = threading.Lock()
+
+
+def default_cassette_path() -> str:
+    return os.getenv("SUBSIDIEMATCH_CASSETTE_PATH") or local_data_path("llm_cassette.jsonl.gz")
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    De cassette uit SUBSIDIEMATCH_CASSETTE_MODE, of None als opnemen en
+    afspelen uit staan.
+    """
+    global _shared_cassette
+    mode = (os.getenv("SUBSIDIEMATCH_CASSETTE_MODE") or "").strip().lower()
+    if not mode:
+        return None
+    with _shared_cassette_lock:
+        if _shared_cassette is None:
+            _shared_cassette = Cassette(default_cassette_path(), mode)
+        return _shared_cassette
+
+
+# --------------------------------------------------------
+# CLI: python -m services.cassette [--compact] [pad]
+# --------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cassette met opgenomen LLM-antwoorden.")
+    parser.add_argument("path", nargs="?", default=None, help="Pad naar het cassettebestand")
+    parser.add_argument(
+        "--compact", action="store_true", help="Herschrijf als één member zonder duplicaten"
+    )
+    args = parser.parse_args()
+
+    path = args.path or default_cassette_path()
+    cassette = Cassette(path, CASSETTE_REPLAY)
+    if args.compact:
+        cassette.compact()
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    print(f"{path}: {len(cassette)} opnames, {size / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# services/checkpoints.py
+"""
+Checkpoints voor herberekeningen, zodat een onderbroken run (herstart van
+het Streamlit-proces, afgebroken job) kan worden hervat.
+
+Elke run heeft een run_id, de prompt_id en een fingerprint: een hash van
+het prompt-template, het model, de relevante opties en de inhoud van de
+organisatie- en subsidietabellen. Gescoorde rijen worden per blok in een
+SQLite-bestand weggeschreven. Start er later een herberekening met
+dezelfde fingerprint, dan wordt de onafgemaakte run hervat en gaan alleen
+de ontbrekende paren nog naar de LLM.
+
+Bij een offline batch-job (services.batch_jobs) wordt daarnaast het id van
+de ingediende job bij de run bewaard. Wordt de run hervat voordat de
+resultaten binnen zijn, dan wordt diezelfde job opnieuw gepolld in plaats
+van een nieuwe in te dienen.
+
+Zodra het resultaat van een run in de matches-tabel staat, wordt de run
+afgesloten en verdwijnen zijn rijen uit het checkpointbestand.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from data.data_store import local_data_path
+
+
+RUN_BEZIG = "bezig"
+RUN_KLAAR = "klaar"
+
+
+def run_fingerprint(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    prompt_template: str,
+    model: str,
+    options: Dict[str, Any],
+) -> str:
+    """Hash over alles wat de uitkomst van een run bepaalt."""
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {"prompt": prompt_template, "model": model, "options": options},
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    )
+    for df in (organisations_df, subsidies_df):
+        digest.update(_frame_hash(df))
+    return digest.hexdigest()
+
+
+def _frame_hash(df: pd.DataFrame) -> bytes:
+    df = df[sorted(df.columns)]
+    digest = hashlib.sha256("|".join(map(str, df.columns)).encode("utf-8"))
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    except TypeError:
+        # Niet-hashbare celwaarden (lijsten, dicts): via JSON
+        digest.update(df.to_json(orient="split", index=False, default_handler=str).encode("utf-8"))
+    return digest.digest()
+
+
+class RunCheckpoint:
+    """
+    Checkpoint van één run: de al gescoorde rijen (per match_id) en een
+    methode om nieuwe rijen weg te schrijven.
+    """
+
+    def __init__(self, store: "CheckpointStore", run_id: str, done: Dict[int, Dict[str, Any]]):
+        self.store = store
+        self.run_id = run_id
+        self.done = done
+        self.resumed = bool(done)
+
+    def save(self, rows: Iterable[Dict[str, Any]]) -> None:
+        self.store.save_rows(self.run_id, rows)
+
+    def batch_job(self) -> Optional[str]:
+        """Id van de batch-job die voor deze run is ingediend (of None)."""
+        return self.store.batch_job(self.run_id)
+
+    def save_batch_job(self, job_id: str) -> None:
+        self.store.save_batch_job(self.run_id, job_id)
+
+
+class CheckpointStore:
+    """
+    SQLite-opslag voor runs en hun gescoorde rijen. Thread-safe via één lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                prompt_id INTEGER,
+                fingerprint TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_fingerprint ON runs (fingerprint, status);
+            CREATE TABLE IF NOT EXISTS rows (
+                run_id TEXT NOT NULL,
+                match_id INTEGER NOT NULL,
+                row TEXT NOT NULL,
+                PRIMARY KEY (run_id, match_id)
+            );
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                run_id TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def open_run(self, prompt_id: Optional[int], fingerprint: str, total: int) -> RunCheckpoint:
+        """Hervat de onafgemaakte run met deze fingerprint, of begin een nieuwe."""
+        with self._lock:
+            found = self._conn.execute(
+                """
+                SELECT run_id FROM runs
+                WHERE fingerprint = ? AND status = ?
+                ORDER BY updated DESC LIMIT 1
+                """,
+                (fingerprint, RUN_BEZIG),
+            ).fetchone()
+
+            if found is None:
+                run_id = uuid.uuid4().hex[:12]
+                now = time.time()
+                self._conn.execute(
+                    "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        int(prompt_id) if prompt_id is not None else None,
+                        fingerprint,
+                        RUN_BEZIG,
+                        total,
+                        now,
+                        now,
+                    ),
+                )
+                self._conn.commit()
+                return RunCheckpoint(self, run_id, {})
+
+            run_id = found[0]
+            done = {
+                match_id: json.loads(raw)
+                for match_id, raw in self._conn.execute(
+                    "SELECT match_id, row FROM rows WHERE run_id = ?", (run_id,)
+                )
+            }
+        return RunCheckpoint(self, run_id, done)
+
+    def save_rows(self, run_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+        records = [
+            (run_id, int(row["match_id"]), json.dumps(row, ensure_ascii=False, default=str))
+            for row in rows
+        ]
+        if not records:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (run_id, match_id, row) VALUES (?, ?, ?)",
+                records,
+            )
+            self._conn.execute(
+                "UPDATE runs SET updated = ? WHERE run_id = ?", (time.time(), run_id)
+            )
+            self._conn.commit()
+
+    def batch_job(self, run_id: str) -> Optional[str]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT job_id FROM batch_jobs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return found[0] if found else None
+
+    def save_batch_job(self, run_id: str, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batch_jobs (run_id, job_id) VALUES (?, ?)",
+                (run_id, job_id),
+            )
+            self._conn.commit()
+
+    def finish_run(self, run_id: str) -> None:
+        """Markeer een run als klaar; de rijen zijn dan niet meer nodig."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rows WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM batch_jobs WHERE run_id = ?", (run_id,))
+            self._conn.execute(
+                "UPDATE runs SET status = ?, updated = ? WHERE run_id = ?",
+                (RUN_KLAAR, time.time(), run_id),
+            )
+            self._conn.commit()
+
+    def discard_run(self, run_id: str) -> None:
+        """Gooi een onafgemaakte run weg (hij wordt dan niet meer hervat)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rows WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM batch_jobs WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+    def unfinished_runs(self) -> List[Dict[str, Any]]:
+        """Onafgemaakte runs met het aantal al gescoorde paren, nieuwste eerst."""
+        with self._lock:
+            records = self._conn.execute(
+                """
+                SELECT r.run_id, r.prompt_id, r.total, r.created, r.updated,
+                       (SELECT COUNT(*) FROM rows WHERE rows.run_id = r.run_id)
+                FROM runs r
+                WHERE r.status = ?
+                ORDER BY r.updated DESC
+                """,
+                (RUN_BEZIG,),
+            ).fetchall()
+        return [
+            {
+                "run_id": run_id,
+                "prompt_id": prompt_id,
+                "total": total,
+                "created": created,
+                "updated": updated,
+                "n_done": n_done,
+            }
+            for run_id, prompt_id, total, created, updated, n_done in records
+        ]
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_store: Optional[CheckpointStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Eén checkpointbestand per proces, gedeeld door alle sessies."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            path = os.getenv("SUBSIDIEMATCH_CHECKPOINT_PATH") or local_data_path(
+                "checkpoints.sqlite"
+            )
+            _shared_store = CheckpointStore(path)
+        return _shared_store
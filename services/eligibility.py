@@ -0,0 +1,218 @@
+# services/eligibility.py
+"""
+Harde subsidievoorwaarden als filter vóór LLM-scoring.
+
+Elke subsidie kan in de kolom "voorwaarden" een JSON-object met
+declaratieve regels hebben over organisatiekolommen, bijvoorbeeld:
+
+    {"max_medewerkers": 250, "max_omzet": 50000000}     (alleen mkb)
+    {"sectoren": ["zorg"]}                              (alleen zorg)
+
+Ondersteunde regels:
+- sectoren, types_organisatie, locaties: lijst toegestane waarden
+  (hoofdletterongevoelig) voor sector, type_organisatie en locatie;
+- min_medewerkers, max_medewerkers: grenzen voor aantal_medewerkers;
+- min_omzet, max_omzet: grenzen voor omzet.
+
+Daarnaast valt elk paar af als de sluitingsdatum van de subsidie al
+verstreken is. Ontbreekt een organisatiewaarde, dan sluiten we niet uit:
+dat oordeel laten we aan de LLM.
+
+De regels worden gecompileerd tot booleaanse maskers over de hele
+organisaties × subsidies-matrix; er is geen Python-lus per paar.
+"""
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+RULES_COLUMN = "voorwaarden"
+
+# regel → organisatiekolom
+SET_RULES = {
+    "sectoren": "sector",
+    "types_organisatie": "type_organisatie",
+    "locaties": "locatie",
+}
+
+# regel → (organisatiekolom, "min" of "max")
+RANGE_RULES = {
+    "min_medewerkers": ("aantal_medewerkers", "min"),
+    "max_medewerkers": ("aantal_medewerkers", "max"),
+    "min_omzet": ("omzet", "min"),
+    "max_omzet": ("omzet", "max"),
+}
+
+_RANGE_LABELS = {
+    "aantal_medewerkers": "medewerkers",
+    "omzet": "omzet",
+}
+
+
+def parse_rules(raw: Any) -> Dict[str, Any]:
+    """
+    Lees de voorwaarden van één subsidie (JSON-string, dict of leeg).
+    Onbekende regels geven een ValueError, zodat tikfouten niet stil
+    worden genegeerd.
+    """
+    if raw is None or (isinstance(raw, float) and np.isnan(raw)):
+        return {}
+    if isinstance(raw, str):
+        if not raw.strip():
+            return {}
+        raw = json.loads(raw)
+    if not isinstance(raw, dict):
+        raise ValueError("Voorwaarden moeten een JSON-object zijn.")
+
+    unknown = set(raw) - set(SET_RULES) - set(RANGE_RULES)
+    if unknown:
+        raise ValueError(f"Onbekende voorwaarde(n): {', '.join(sorted(unknown))}")
+
+    # Ook de waarden controleren: een verkeerd type zou anders pas bij het
+    # matchen (en dan bij elke herberekening opnieuw) een fout geven
+    for rule in SET_RULES:
+        value = raw.get(rule)
+        if value is None or isinstance(value, str):
+            continue
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise ValueError(f"{rule} moet een tekst of een lijst met teksten zijn.")
+    for rule in RANGE_RULES:
+        value = raw.get(rule)
+        if value is None:
+            continue
+        # bool is een int, maar {"max_omzet": true} is vrijwel zeker een tikfout
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or np.isnan(value):
+            raise ValueError(f"{rule} moet een getal zijn.")
+    return raw
+
+
+def eligibility_matrix(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    today: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Pas alle voorwaarden toe op organisaties × subsidies.
+
+    Retourneert een dict met:
+    - "eligible": bool-matrix, True = paar mag naar de LLM;
+    - "reason_codes": int-matrix met per uitgesloten paar de index van de
+      (eerste) reden in "reasons", en -1 voor toegestane paren;
+    - "reasons": lijst met leesbare redenen.
+    """
+    n_orgs, n_subs = len(organisations_df), len(subsidies_df)
+    reason_codes = np.full((n_orgs, n_subs), -1, dtype=np.int32)
+    reasons: List[str] = []
+    reason_index: Dict[str, int] = {}
+
+    def exclude(j: int, failing: np.ndarray, reason: str) -> None:
+        # Alleen de eerste reden per paar bewaren; gelijke redenen delen een code
+        column = reason_codes[:, j]
+        new = failing & (column < 0)
+        if new.any():
+            if reason not in reason_index:
+                reason_index[reason] = len(reasons)
+                reasons.append(reason)
+            column[new] = reason_index[reason]
+
+    if n_orgs == 0 or n_subs == 0:
+        return {"eligible": reason_codes < 0, "reason_codes": reason_codes, "reasons": reasons}
+
+    _apply_closing_date(subsidies_df, today, exclude, n_orgs)
+
+    rules_per_sub = [
+        parse_rules(raw)
+        for raw in (
+            subsidies_df[RULES_COLUMN]
+            if RULES_COLUMN in subsidies_df.columns
+            else [None] * n_subs
+        )
+    ]
+
+    for rule, org_column in SET_RULES.items():
+        _apply_set_rule(organisations_df, rules_per_sub, rule, org_column, exclude)
+
+    for rule, (org_column, bound) in RANGE_RULES.items():
+        _apply_range_rule(organisations_df, rules_per_sub, rule, org_column, bound, exclude)
+
+    return {"eligible": reason_codes < 0, "reason_codes": reason_codes, "reasons": reasons}
+
+
+def exclusion_reason(eligibility: Dict[str, Any], i: int, j: int) -> Optional[str]:
+    """Reden waarom paar (i, j) is uitgesloten, of None."""
+    code = eligibility["reason_codes"][i, j]
+    return eligibility["reasons"][code] if code >= 0 else None
+
+
+# --------------------------------------------------------
+# REGELS → MASKERS
+# --------------------------------------------------------
+def _apply_closing_date(subsidies_df, today, exclude, n_orgs) -> None:
+    if "sluitingsdatum" not in subsidies_df.columns:
+        return
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    closing = pd.to_datetime(subsidies_df["sluitingsdatum"])
+    for j in np.flatnonzero((closing < today).to_numpy()):
+        exclude(
+            j,
+            np.ones(n_orgs, dtype=bool),
+            f"sluitingsdatum {closing.iloc[j].date()} is verstreken",
+        )
+
+
+def _apply_set_rule(organisations_df, rules_per_sub, rule, org_column, exclude) -> None:
+    if not any(rule in rules for rules in rules_per_sub):
+        return
+
+    values = _column(organisations_df, org_column)
+    normalised = pd.Series(values, dtype=object).map(
+        lambda v: str(v).strip().lower() if v is not None and v == v else None
+    )
+    codes, uniques = pd.factorize(normalised)
+    lookup = {value: code for code, value in enumerate(uniques)}
+    missing = codes < 0
+
+    for j, rules in enumerate(rules_per_sub):
+        allowed = rules.get(rule)
+        if allowed is None:
+            continue
+        if isinstance(allowed, str):
+            allowed = [allowed]
+        allowed_codes = [lookup[a.strip().lower()] for a in allowed if a.strip().lower() in lookup]
+        failing = ~np.isin(codes, allowed_codes) & ~missing
+        exclude(j, failing, f"{org_column} niet in: {', '.join(allowed)}")
+
+
+def _apply_range_rule(organisations_df, rules_per_sub, rule, org_column, bound, exclude) -> None:
+    limits = np.array(
+        [float(rules[rule]) if rules.get(rule) is not None else np.nan for rules in rules_per_sub]
+    )
+    has_limit = ~np.isnan(limits)
+    if not has_limit.any():
+        return
+
+    values = pd.to_numeric(
+        pd.Series(_column(organisations_df, org_column)), errors="coerce"
+    ).to_numpy(dtype=float)
+
+    # Hele matrix in één keer; NaN-vergelijkingen zijn altijd False
+    if bound == "min":
+        failing = values[:, None] < limits[None, :]
+        label = f"minder dan {{limit:,.0f}} {_RANGE_LABELS[org_column]}"
+    else:
+        failing = values[:, None] > limits[None, :]
+        label = f"meer dan {{limit:,.0f}} {_RANGE_LABELS[org_column]}"
+
+    for j in np.flatnonzero(has_limit):
+        exclude(j, failing[:, j], label.format(limit=limits[j]).replace(",", "."))
+
+
+def _column(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col in df.columns:
+        return df[col].to_numpy(dtype=object)
+    return np.full(len(df), None, dtype=object)
@@ -0,0 +1,375 @@
+# services/instrumentation.py
+"""
+Meetgegevens per LLM-call, opgeteld per run en per prompt_id.
+
+Per call leggen we vast: totale duur, wachttijd op de limiter (queue),
+prompt-, completion- en cached tokens, geschatte kosten, aantal retries en
+de foutklasse ("ok" bij succes). Losse calls worden niet bewaard; alleen
+tellers, sommen en histogrammen per (run_id, prompt_id), zodat het geheugen
+niet meegroeit met het aantal paren. Alleen de laatste METRICS_MAX_RUNS runs
+blijven apart staan; oudere runs tellen alleen nog mee in de totalen per
+prompt_id.
+
+Welke run en prompt een call hoort, gaat via call_labels(): een
+contextvariabele die de scoringcode om een blok calls zet. Threads van een
+ThreadPoolExecutor erven die niet vanzelf; gebruik bind() om een functie
+met de huidige labels in een andere thread uit te voeren.
+
+Export als JSON (metrics_json / write_metrics_file) of in het
+Prometheus-tekstformaat (prometheus_text).
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from data.data_store import local_data_path
+
+
+# Prijzen in USD per miljoen tokens: (input, cached input, output)
+MODEL_PRICES_PER_MTOK: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+
+# Bovengrenzen (seconden) van de histogrammen voor duur en wachttijd
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ERROR_OK = "ok"
+
+# Aantal runs (run_id's) met eigen meetgegevens; een cascaderun telt per stap
+METRICS_MAX_RUNS = int(os.getenv("SUBSIDIEMATCH_METRICS_MAX_RUNS", "50"))
+
+_labels: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar(
+    "llm_call_labels", default={}
+)
+
+
+def model_prices(model: str) -> Tuple[float, float, float]:
+    """
+    Prijzen voor een model; SUBSIDIEMATCH_PRICE_INPUT / _CACHED / _OUTPUT
+    (USD per miljoen tokens) gaan voor de tabel.
+    """
+    base = MODEL_PRICES_PER_MTOK.get(model, (0.0, 0.0, 0.0))
+    names = ("SUBSIDIEMATCH_PRICE_INPUT", "SUBSIDIEMATCH_PRICE_CACHED", "SUBSIDIEMATCH_PRICE_OUTPUT")
+    return tuple(
+        float(os.getenv(name)) if os.getenv(name) else default
+        for name, default in zip(names, base)
+    )
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """Geschatte kosten van één call in USD."""
+    price_input, price_cached, price_output = model_prices(model)
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (
+        uncached * price_input + cached_tokens * price_cached + completion_tokens * price_output
+    ) / 1_000_000
+
+
+# --------------------------------------------------------
+# LABELS
+# --------------------------------------------------------
+@contextmanager
+def call_labels(run_id: Optional[str] = None, prompt_id: Optional[int] = None) -> Iterator[None]:
+    """Koppel alle calls binnen dit blok (in deze thread) aan run en prompt."""
+    token = _labels.set({"run_id": run_id, "prompt_id": prompt_id})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def bind(fn: Callable) -> Callable:
+    """fn met de huidige labels, ook als hij in een andere thread draait."""
+    labels = _labels.get()
+
+    def wrapper(*args, **kwargs):
+        token = _labels.set(labels)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _labels.reset(token)
+
+    return wrapper
+
+
+# --------------------------------------------------------
+# AGGREGATIE
+# --------------------------------------------------------
+class Histogram:
+    """Cumulatief histogram in Prometheus-stijl (vaste bovengrenzen + som)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Benadering: de bovengrens van het bucket waarin het kwantiel valt."""
+        n = sum(self.counts)
+        if n == 0:
+            return None
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= q * n:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def cumulative(self) -> List[int]:
+        out, running = [], 0
+        for count in self.counts:
+            running += count
+            out.append(running)
+        return out
+
+
+class CallStats:
+    """Opgetelde meetgegevens van een groep calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost_usd = 0.0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+        self.wall = Histogram()
+        self.queue = Histogram()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.calls += 1
+        self.prompt_tokens += record["prompt_tokens"]
+        self.completion_tokens += record["completion_tokens"]
+        self.cached_tokens += record["cached_tokens"]
+        self.cost_usd += record["cost_usd"]
+        self.retries += record["retries"]
+        self.errors[record["error"]] = self.errors.get(record["error"], 0) + 1
+        self.wall.observe(record["wall_seconds"])
+        self.queue.observe(record["queue_seconds"])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "retries": self.retries,
+            "errors": {k: v for k, v in self.errors.items() if k != ERROR_OK},
+            "wall_seconds_total": round(self.wall.total, 3),
+            "wall_seconds_p50": self.wall.quantile(0.5),
+            "wall_seconds_p95": self.wall.quantile(0.95),
+            "queue_seconds_total": round(self.queue.total, 3),
+            "queue_seconds_p95": self.queue.quantile(0.95),
+            "wall_histogram": dict(zip(_bucket_labels(), self.wall.cumulative())),
+            "queue_histogram": dict(zip(_bucket_labels(), self.queue.cumulative())),
+        }
+
+
+class Metrics:
+    """
+    Procesbrede verzameling van CallStats per (run_id, prompt_id), voor de
+    max_runs runs met de meest recente calls.
+    """
+
+    def __init__(self, max_runs: int = METRICS_MAX_RUNS):
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._groups: Dict[Tuple[Optional[str], Optional[int]], CallStats] = {}
+        # run_id's, minst recent gebruikt eerst
+        self._runs: "OrderedDict[Optional[str], None]" = OrderedDict()
+        # Opgetelde meetgegevens van verwijderde runs, per prompt_id
+        self._retired: Dict[Optional[int], CallStats] = {}
+
+    def record(
+        self,
+        model: str,
+        wall_seconds: float,
+        queue_seconds: float = 0.0,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        retries: int = 0,
+        error: str = ERROR_OK,
+    ) -> None:
+        """Leg één call vast onder de huidige labels (zie call_labels)."""
+        labels = _labels.get()
+        key = (labels.get("run_id"), labels.get("prompt_id"))
+        record = {
+            "wall_seconds": wall_seconds,
+            "queue_seconds": queue_seconds,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost_usd": estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens),
+            "retries": retries,
+            "error": error,
+        }
+        with self._lock:
+            self._groups.setdefault(key, CallStats()).add(record)
+            self._runs[key[0]] = None
+            self._runs.move_to_end(key[0])
+            while len(self._runs) > self.max_runs:
+                self._retire(self._runs.popitem(last=False)[0])
+
+    def _retire(self, run_id: Optional[str]) -> None:
+        """Haal een run uit _groups; zijn calls blijven in per_prompt meetellen."""
+        for key in [key for key in self._groups if key[0] == run_id]:
+            _merge(self._retired.setdefault(key[1], CallStats()), self._groups.pop(key))
+
+    def per_run(self) -> List[Dict[str, Any]]:
+        """Samenvatting per (run_id, prompt_id), in volgorde van eerste call."""
+        with self._lock:
+            return [
+                {"run_id": run_id, "prompt_id": prompt_id, **stats.summary()}
+                for (run_id, prompt_id), stats in self._groups.items()
+            ]
+
+    def per_prompt(self) -> List[Dict[str, Any]]:
+        """Samenvatting per prompt_id over alle runs, ook de verwijderde."""
+        with self._lock:
+            merged: Dict[Optional[int], CallStats] = {}
+            for prompt_id, stats in self._retired.items():
+                _merge(merged.setdefault(prompt_id, CallStats()), stats)
+            for (_, prompt_id), stats in self._groups.items():
+                _merge(merged.setdefault(prompt_id, CallStats()), stats)
+            return [
+                {"prompt_id": prompt_id, **stats.summary()} for prompt_id, stats in merged.items()
+            ]
+
+    def run_stats(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Samenvatting van één run over alle prompts, of None zonder calls."""
+        with self._lock:
+            merged = CallStats()
+            for (key_run_id, _), stats in self._groups.items():
+                if key_run_id == run_id:
+                    _merge(merged, stats)
+            return merged.summary() if merged.calls else None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._groups.clear()
+            self._runs.clear()
+            self._retired.clear()
+
+    # --------------------------------------------------------
+    # EXPORT
+    # --------------------------------------------------------
+    def metrics_json(self) -> str:
+        return json.dumps(
+            {"per_run": self.per_run(), "per_prompt": self.per_prompt()},
+            ensure_ascii=False,
+            indent=2,
+            default=str,
+        )
+
+    def write_metrics_file(self, path: Optional[str] = None) -> str:
+        """Schrijf de metrics als JSON (standaard in de lokale datamap)."""
+        path = path or local_data_path("llm_metrics.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.metrics_json())
+        return path
+
+    def prometheus_text(self) -> str:
+        """Metrics in het Prometheus-tekstformaat, met labels run_id en prompt_id."""
+        with self._lock:
+            groups = list(self._groups.items())
+
+        lines = []
+        counters = (
+            ("subsidiematch_llm_calls_total", "Aantal LLM-calls", lambda s: s.calls),
+            ("subsidiematch_llm_prompt_tokens_total", "Input-tokens", lambda s: s.prompt_tokens),
+            ("subsidiematch_llm_cached_tokens_total", "Input-tokens uit de prompt-cache", lambda s: s.cached_tokens),
+            ("subsidiematch_llm_completion_tokens_total", "Output-tokens", lambda s: s.completion_tokens),
+            ("subsidiematch_llm_cost_usd_total", "Geschatte kosten in USD", lambda s: s.cost_usd),
+            ("subsidiematch_llm_retries_total", "Retries", lambda s: s.retries),
+        )
+        for name, help_text, value in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for key, stats in groups:
+                lines.append(f"{name}{{{_label_text(key)}}} {value(stats)}")
+
+        name = "subsidiematch_llm_errors_total"
+        lines += [f"# HELP {name} Mislukte calls per foutklasse", f"# TYPE {name} counter"]
+        for key, stats in groups:
+            for error, count in stats.errors.items():
+                if error != ERROR_OK:
+                    lines.append(f'{name}{{{_label_text(key)},error="{_escape(error)}"}} {count}')
+
+        for name, help_text, attr in (
+            ("subsidiematch_llm_call_seconds", "Duur per call inclusief retries", "wall"),
+            ("subsidiematch_llm_queue_seconds", "Wachttijd op de limiter", "queue"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for key, stats in groups:
+                histogram: Histogram = getattr(stats, attr)
+                labels = _label_text(key)
+                for bound, count in zip(_bucket_labels(), histogram.cumulative()):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+                lines.append(f"{name}_count{{{labels}}} {stats.calls}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(target: CallStats, source: CallStats) -> None:
+    target.calls += source.calls
+    target.prompt_tokens += source.prompt_tokens
+    target.completion_tokens += source.completion_tokens
+    target.cached_tokens += source.cached_tokens
+    target.cost_usd += source.cost_usd
+    target.retries += source.retries
+    for error, count in source.errors.items():
+        target.errors[error] = target.errors.get(error, 0) + count
+    for attr in ("wall", "queue"):
+        mine, theirs = getattr(target, attr), getattr(source, attr)
+        mine.counts = [a + b for a, b in zip(mine.counts, theirs.counts)]
+        mine.total += theirs.total
+
+
+def _bucket_labels() -> List[str]:
+    return [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+
+
+def _label_text(key: Tuple[Optional[str], Optional[int]]) -> str:
+    run_id, prompt_id = key
+    return f'run_id="{_escape(run_id or "")}",prompt_id="{"" if prompt_id is None else prompt_id}"'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_metrics: Optional[Metrics] = None
+_shared_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Eén verzameling per proces, gedeeld door alle sessies en jobs."""
+    global _shared_metrics
+    with _shared_metrics_lock:
+        if _shared_metrics is None:
+            _shared_metrics = Metrics()
+        return _shared_metrics
@@ -0,0 +1,245 @@
+# services/jobs.py
+"""
+Achtergrondjobs voor langlopend werk (herberekeningen, nieuwsbrieven).
+
+Een job draait in een thread van een procesbrede runner en is dus niet
+gebonden aan één Streamlit-rerun of aan een open browsertab. Jobs hebben
+een id, status, voortgang en kunnen geannuleerd worden.
+
+Omdat achtergrondthreads geen toegang hebben tot st.session_state, werkt
+een job altijd op een snapshot van de invoer. Het resultaat wordt bij een
+volgende rerun in de hoofdthread van de sessie aan de datastore
+overgedragen via de `handoff` van de job. Daarna laat de job zijn
+resultaat los; afgeronde jobs verdwijnen na JOB_TTL_SECONDS uit de runner.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import streamlit as st
+
+
+JOB_WACHTEND = "wachtend"
+JOB_BEZIG = "bezig"
+JOB_KLAAR = "klaar"
+JOB_GEANNULEERD = "geannuleerd"
+JOB_MISLUKT = "mislukt"
+
+FINISHED_JOB_STATUSES = (JOB_KLAAR, JOB_GEANNULEERD, JOB_MISLUKT)
+
+DEFAULT_MAX_CONCURRENT_JOBS = int(os.getenv("SUBSIDIEMATCH_MAX_CONCURRENT_JOBS", "2"))
+
+# Hoe lang een afgeronde job (met een niet-overgedragen resultaat) bewaard blijft
+JOB_TTL_SECONDS = float(os.getenv("SUBSIDIEMATCH_JOB_TTL_SECONDS", "3600"))
+
+# Job-id's die in deze sessie gestart zijn
+SESSION_JOBS_KEY = "job_ids"
+
+
+class JobCancelled(Exception):
+    """Wordt opgegooid in een job zodra annulering is aangevraagd."""
+
+
+class Job:
+    """
+    Eén achtergrondjob. De job-functie rapporteert voortgang via report()
+    en controleert met check_cancelled() of hij moet stoppen.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        description: str,
+        handoff: Optional[Callable[[Any], None]] = None,
+    ):
+        self.job_id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.description = description
+        self.handoff = handoff
+
+        self.status = JOB_WACHTEND
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = datetime.now()
+        self.finished: Optional[datetime] = None
+        self.handed_off = False
+
+        self._cancel_event = threading.Event()
+
+    def report(self, **progress: Any) -> None:
+        self.progress = progress
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_JOB_STATUSES
+
+
+class JobRunner:
+    """
+    Procesbrede runner met een begrensd aantal gelijktijdige jobs.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+        ttl_seconds: float = JOB_TTL_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent_jobs,
+            thread_name_prefix="subsidiematch-job",
+        )
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        description: str,
+        fn: Callable[[Job], Any],
+        handoff: Optional[Callable[[Any], None]] = None,
+    ) -> Job:
+        """Plan fn(job) in; het resultaat komt in job.result."""
+        self.purge()
+        job = Job(kind, description, handoff)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        """Alle jobs, nieuwste eerst."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda job: job.created, reverse=True)
+
+    def purge(self) -> int:
+        """
+        Verwijder jobs die langer dan ttl_seconds afgerond zijn, ook als hun
+        resultaat nooit is overgenomen. Retourneert het aantal verwijderde jobs.
+        """
+        now = datetime.now()
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.is_finished()
+                and job.finished is not None
+                and (now - job.finished).total_seconds() > self.ttl_seconds
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def cancel(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is not None and not job.is_finished():
+            job.cancel()
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        if job.cancel_requested():
+            job.status = JOB_GEANNULEERD
+            job.finished = datetime.now()
+            return
+
+        job.status = JOB_BEZIG
+        try:
+            job.result = fn(job)
+            job.status = JOB_KLAAR
+        except JobCancelled:
+            job.status = JOB_GEANNULEERD
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}"
+            job.status = JOB_MISLUKT
+        finally:
+            job.finished = datetime.now()
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_runner: Optional[JobRunner] = None
+_shared_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Eén runner per proces, gedeeld door alle sessies."""
+    global _shared_runner
+    with _shared_runner_lock:
+        if _shared_runner is None:
+            _shared_runner = JobRunner()
+        return _shared_runner
+
+
+# --------------------------------------------------------
+# KOPPELING MET DE SESSIE
+# --------------------------------------------------------
+def submit_session_job(
+    kind: str,
+    description: str,
+    fn: Callable[[Job], Any],
+    handoff: Optional[Callable[[Any], None]] = None,
+) -> Job:
+    """Start een job en onthoud hem in de huidige sessie."""
+    job = get_job_runner().submit(kind, description, fn, handoff)
+    st.session_state.setdefault(SESSION_JOBS_KEY, []).append(job.job_id)
+    return job
+
+
+def session_jobs() -> List[Job]:
+    """Jobs die in deze sessie gestart zijn, nieuwste eerst."""
+    runner = get_job_runner()
+    jobs = [runner.get(job_id) for job_id in st.session_state.get(SESSION_JOBS_KEY, [])]
+    jobs = [job for job in jobs if job is not None]
+    # Id's van opgeruimde jobs niet blijven bewaren
+    st.session_state[SESSION_JOBS_KEY] = [job.job_id for job in jobs]
+    return sorted(jobs, key=lambda job: job.created, reverse=True)
+
+
+def has_active_jobs() -> bool:
+    """Loopt of wacht er in deze sessie nog een job?"""
+    return any(not job.is_finished() for job in session_jobs())
+
+
+def hand_off(job: Job) -> None:
+    """Draag het resultaat van een afgeronde job over aan de datastore van deze sessie."""
+    if job.status != JOB_KLAAR or job.handed_off:
+        return
+    if job.handoff is not None:
+        job.handoff(job.result)
+    job.handed_off = True
+    # Het resultaat (vaak een volledige matches-tabel) staat nu in de sessie
+    job.result = None
+
+
+def hand_off_finished_jobs() -> List[Job]:
+    """
+    Draag resultaten van afgeronde jobs uit deze sessie over en ruim
+    verlopen jobs op. Wordt bij elke rerun vanuit de hoofdthread aangeroepen.
+    """
+    get_job_runner().purge()
+    handed = []
+    for job in session_jobs():
+        if job.status == JOB_KLAAR and not job.handed_off:
+            hand_off(job)
+            handed.append(job)
+    return handed
@@ -1,72 +1,335 @@
 import os
 import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
 import streamlit as st
 
+from services.prompt_templates import (
+    LAYOUT_TEMPLATE,
+    ORG_PROMPT_FIELDS,
+    PART_ORG,
+    PART_SUBSIDIE,
+    PART_TEKST,
+    SUBSIDIE_PROMPT_FIELDS,
+    compile_prompt,
+)
+from services.cassette import get_cassette
+from services.instrumentation import ERROR_OK, get_metrics
+from services.prompt_budget import prompt_budget_from_env
+from services.rate_limit import (
+    DEFAULT_MAX_CONCURRENCY,
+    call_with_retries,
+    estimate_tokens,
+    get_rate_limiter,
+    usage_counts,
+)
+from services.score_cache import get_score_cache, score_cache_key
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# HTTP-verbindingspool van de gedeelde OpenAI-client. Standaard minstens
+# zoveel verbindingen als de limiter gelijktijdige calls toestaat.
+HTTP_POOL_SIZE = int(os.getenv("SUBSIDIEMATCH_OPENAI_POOL_SIZE", str(DEFAULT_MAX_CONCURRENCY)))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("SUBSIDIEMATCH_OPENAI_KEEPALIVE", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("SUBSIDIEMATCH_OPENAI_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUBSIDIEMATCH_OPENAI_CONNECT_TIMEOUT", "10"))
+
+# --------------------------------------------------------
+# BATCH-PROMPT: één organisatie, meerdere subsidies per call
+# --------------------------------------------------------
+BATCH_MAX_TOKENS_PER_ITEM = 200
+
+# De batch-prompt wordt opgebouwd uit het actieve template: de vaste tekst,
+# het organisatieblok en per subsidie het subsidieblok onder deze kop,
+# gevolgd door BATCH_INSTRUCTIE voor het antwoordformaat.
+BATCH_SUBSIDIE_HEADER = (
+    "==============================\n"
+    "SUBSIDIE {subsidie_id}\n"
+    "==============================\n"
+)
+
+BATCH_INSTRUCTIE = (
+    "==============================\n"
+    "INSTRUCTIE VOOR MEERDERE SUBSIDIES\n"
+    "==============================\n"
+    "Beoordeel elke subsidie hierboven afzonderlijk volgens de instructie aan het "
+    "begin van deze prompt. Gebruik niet het antwoordformaat voor één subsidie, maar "
+    "produceer alleen de volgende JSON-output, met precies één item per subsidie:\n"
+    "{\n"
+    '  "matches": [\n'
+    "    {\n"
+    '      "subsidie_id": <ID van de subsidie>,\n'
+    '      "match_score": <integer tussen 1 en 100>,\n'
+    '      "match_toelichting": ["korte bullet", "korte bullet", "korte bullet"]\n'
+    "    }\n"
+    "  ]\n"
+    "}\n"
+)
+
 
 class LLMClient:
     """
     Wrapper rond OpenAI of een mock-LLM afhankelijk van de omgeving.
     """
 
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY", None)
+    def __init__(self, use_cache: bool = True, base_url=None, cassette=None, model=None):
+        # Met een base_url (of OPENAI_BASE_URL) kan de client naar een
+        # OpenAI-compatibele server wijzen, zoals services.llm_stub_server.
+        # Met een cassette (of SUBSIDIEMATCH_CASSETTE_MODE) worden antwoorden
+        # opgenomen of afgespeeld, zie services.cassette.
+        # model gaat voor OPENAI_MODEL (bijvoorbeeld het sterke model van
+        # een cascade, zie services.cascade).
+        base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        api_key = _configured_api_key()
+        if base_url and not api_key:
+            # Lokale stand-ins controleren de key niet
+            api_key = "lokaal"
         self._api_key = api_key
+        self._base_url = base_url
+        self._model = model or os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
+        self._use_cache = use_cache
+        self._variants = {}
+        self._variants_lock = threading.Lock()
+        self._cassette = cassette if cassette is not None else get_cassette()
+        # Tokenbudget voor prompts (None = volledige velden), zie services.prompt_budget
+        self._prompt_budget = prompt_budget_from_env(self._model)
 
         if api_key:
             try:
+                import httpx
                 from openai import OpenAI
-                self._client = OpenAI(api_key=api_key)
+
+                # Eén pool met keep-alive verbindingen voor alle threads
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=HTTP_POOL_SIZE,
+                        max_keepalive_connections=HTTP_POOL_SIZE,
+                        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                    ),
+                    timeout=httpx.Timeout(
+                        HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS
+                    ),
+                )
+                # Retries lopen via services.rate_limit, niet dubbel in de SDK
+                self._client = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    max_retries=0,
+                    http_client=http_client,
+                )
             except Exception:
                 self._client = None
         else:
             self._client = None
 
     def is_real(self) -> bool:
-        return self._client is not None
+        # Afspelen van een cassette doorloopt het echte pad, ook zonder key
+        return self._client is not None or self._replaying()
+
+    def cassette(self):
+        """Actieve cassette (None als opnemen/afspelen uit staat)."""
+        return self._cassette
+
+    def _replaying(self) -> bool:
+        return self._cassette is not None and self._cassette.replaying
+
+    def _score_cache_enabled(self) -> bool:
+        # Met een cassette gaat elke call erlangs: opnames blijven compleet
+        # en afspelen test hetzelfde pad als een echte run
+        return self._use_cache and self._cassette is None
+
+    def openai_client(self):
+        """Onderliggende OpenAI-client (None in mock-modus)."""
+        return self._client
+
+    def model_name(self) -> str:
+        return self._model
+
+    def with_model(self, model):
+        """
+        Client met dezelfde instellingen (server, cache, cassette) maar een
+        ander model. Eén instantie per model, hergebruikt bij volgende calls.
+        """
+        if not model or model == self._model:
+            return self
+        with self._variants_lock:
+            client = self._variants.get(model)
+            if client is None:
+                client = LLMClient(
+                    use_cache=self._use_cache,
+                    base_url=self._base_url,
+                    cassette=self._cassette,
+                    model=model,
+                )
+                self._variants[model] = client
+            return client
+
+    def prompt_budget(self):
+        """Actief tokenbudget voor prompts (None als het uit staat)."""
+        return self._prompt_budget
 
     # --------------------------------------------------------
     # PUBLIC API
     # --------------------------------------------------------
-    def score_match_org_subsidy(self, prompt_template, org, subsidie):
+    def score_match_org_subsidy(self, prompt_template, org, subsidie, layout=LAYOUT_TEMPLATE):
         """
         Bouw de prompt → LLM-call → interpreteer JSON.
-        """
 
-        # Context voor .format()
-        ctx = {
-            # organisatie
-            "organisatie_id": org.get("organisatie_id", ""),
-            "organisatie_naam": org.get("organisatie_naam", ""),
-            "sector": org.get("sector", ""),
-            "type_organisatie": org.get("type_organisatie", ""),
-            "locatie": org.get("locatie", ""),
-            "omzet": org.get("omzet", ""),
-            "aantal_medewerkers": org.get("aantal_medewerkers", ""),
-            "abonnement_type": org.get("abonnement_type", ""),
-            "website_link": org.get("website_link", ""),
-            "organisatieprofiel": org.get("organisatieprofiel", ""),
-
-            # subsidie
-            "subsidie_id": subsidie.get("subsidie_id", ""),
-            "subsidie_naam": subsidie.get("subsidie_naam", ""),
-            "bron": subsidie.get("bron", ""),
-            "datum_toegevoegd": subsidie.get("datum_toegevoegd", ""),
-            "sluitingsdatum": subsidie.get("sluitingsdatum", ""),
-            "subsidiebedrag": subsidie.get("subsidiebedrag", ""),
-            "voor_wie": subsidie.get("voor_wie", ""),
-            "samenvatting_eisen": subsidie.get("samenvatting_eisen", ""),
-            "subsidie_tekst_volledig": subsidie.get("subsidie_tekst_volledig", ""),
-            "weblink": subsidie.get("weblink", ""),
-        }
+        layout bepaalt de volgorde van de stukken in de prompt (zie
+        services.prompt_templates.PROMPT_LAYOUTS).
+        """
 
-        # Formatteer de prompt veilig
-        prompt = prompt_template.format_map(_SafeDict(ctx))
+        prompt = self.render_prompt(prompt_template, org, subsidie, layout)
 
         # Kies mock-LLM of echte OpenAI
         if not self.is_real():
             return self._mock_response(org, subsidie)
 
-        return self._call_openai(prompt)
+        if not self._score_cache_enabled():
+            return self._call_openai(prompt)
+
+        # Persistente cache: alleen betalen voor paren waarvan de input is gewijzigd
+        cache = get_score_cache()
+        key = self._cache_key(prompt, org, subsidie)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = self._call_openai(prompt)
+        if result.get("status") == "ok":
+            cache.put(key, result)
+        return result
+
+    def render_prompt(self, prompt_template, org, subsidie, layout=LAYOUT_TEMPLATE):
+        """
+        Vul het prompt-template met de velden van organisatie en subsidie.
+
+        Het template wordt één keer gecompileerd; organisatie- en
+        subsidiestukken worden per entiteit gerenderd en hergebruikt
+        (zie services.prompt_templates). Met een tokenbudget worden lange
+        velden zo nodig ingekort (zie services.prompt_budget).
+        """
+        compiled = compile_prompt(prompt_template)
+        if self._prompt_budget is not None:
+            return self._prompt_budget.render(compiled, org, subsidie, layout)
+        return compiled.render(org, subsidie, layout)
+
+    def chat_request_body(self, prompt, max_tokens=400):
+        """
+        Request-body voor chat.completions; ook gebruikt voor batch-jobbestanden.
+        """
+        return {
+            "model": self._model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "Je bent een formele subsidie-analist. "
+                        "Je antwoordt uitsluitend in JSON volgens de gevraagde structuur."
+                    ),
+                },
+                {
+                    "role": "user",
+                    "content": prompt,
+                },
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.2,
+            "max_tokens": max_tokens,
+        }
+
+    def complete_json(self, prompt, max_tokens=400):
+        """
+        Losse JSON-call voor andere taken dan scoring (zoals
+        subsidiesamenvattingen). Fouten gaan naar de aanroeper.
+        """
+        if not self.is_real():
+            raise RuntimeError("Geen LLM-backend geconfigureerd (mock-modus).")
+        return self._chat_json(prompt, max_tokens=max_tokens)
+
+    def score_org_subsidies_batch(self, prompt_template, org, subsidies, layout=LAYOUT_TEMPLATE):
+        """
+        Scoor één organisatie tegen meerdere subsidies in één LLM-call.
+
+        De prompt komt uit prompt_template: eerst de vaste tekst, dan het
+        organisatieblok (één keer) en per subsidie het subsidieblok. Het
+        model antwoordt met een JSON-array van {subsidie_id, match_score,
+        match_toelichting}. Elk item wordt gevalideerd; subsidies zonder
+        geldig item worden alsnog per paar gescoord met prompt_template en
+        layout. Met een tokenbudget worden de velden ingekort zoals bij de
+        losse prompt van elk paar (de organisatie zoals bij het eerste paar).
+
+        Retourneert de resultaten in de volgorde van `subsidies`.
+        """
+        if not subsidies:
+            return []
+
+        if not self.is_real():
+            return [self._mock_response(org, sub) for sub in subsidies]
+
+        compiled = compile_prompt(prompt_template)
+        prompt_org, prompt_subs = org, subsidies
+        if self._prompt_budget is not None:
+            fitted = [self._prompt_budget.fit(compiled, org, sub, layout) for sub in subsidies]
+            prompt_org = fitted[0][0]
+            prompt_subs = [sub for _, sub in fitted]
+
+        # Blokken los van elkaar gezet; witruimte rond een stuk hoort bij de
+        # plek in het template, niet bij de batch-prompt
+        fixed_text = compiled.render_kind(PART_TEKST, {}).strip() + "\n\n"
+        org_block = compiled.render_kind(PART_ORG, prompt_org).strip() + "\n\n"
+        sub_blocks = [
+            BATCH_SUBSIDIE_HEADER.format(subsidie_id=sub.get("subsidie_id"))
+            + compiled.render_kind(PART_SUBSIDIE, sub).strip()
+            + "\n\n"
+            for sub in prompt_subs
+        ]
+
+        # Per paar in de cache kijken; alleen de misses gaan mee in de batch-call.
+        # Het template zit in de sleutel: een gewijzigde prompt geeft nieuwe scores.
+        cache = get_score_cache() if self._score_cache_enabled() else None
+        keys = [
+            self._cache_key(prompt_template + org_block + block, org, sub)
+            for sub, block in zip(subsidies, sub_blocks)
+        ]
+        results = [cache.get(key) if cache else None for key in keys]
+        todo = [i for i, result in enumerate(results) if result is None]
+
+        if todo:
+            prompt = (
+                fixed_text
+                + org_block
+                + "".join(sub_blocks[i] for i in todo)
+                + BATCH_INSTRUCTIE
+            )
+            by_id = self._call_openai_batch(prompt, n_items=len(todo))
+
+            for i in todo:
+                result = by_id.get(str(subsidies[i].get("subsidie_id")))
+                if result is None:
+                    # Ontbrekend of ongeldig item → terugvallen op een losse call
+                    result = self.score_match_org_subsidy(
+                        prompt_template, org, subsidies[i], layout
+                    )
+                if cache and result.get("status") == "ok":
+                    cache.put(keys[i], result)
+                results[i] = result
+
+        return results
+
+    def _cache_key(self, prompt, org, subsidie):
+        return score_cache_key(
+            prompt,
+            self._model,
+            org,
+            subsidie,
+            ORG_PROMPT_FIELDS,
+            SUBSIDIE_PROMPT_FIELDS,
+        )
 
     # --------------------------------------------------------
     # PRIVATE: ECHTE OPENAI CALL
@@ -77,59 +340,83 @@ class LLMClient:
         Verwacht JSON-object in response.
         """
         try:
-            response = self._client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Je bent een formele subsidie-analist. "
-                            "Je antwoordt uitsluitend in JSON volgens de gevraagde structuur."
-                        ),
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    },
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.2,
-                max_tokens=400,
-            )
+            return parse_score_json(self._chat_json(prompt, max_tokens=400))
+        except Exception as exc:
+            return error_result(exc)
 
-            # Nieuwe API → message is object, geen dict → gebruik .content
-            raw_json = response.choices[0].message.content
-            parsed = json.loads(raw_json)
+    def _call_openai_batch(self, prompt: str, n_items: int):
+        """
+        Batch-call: retourneert {subsidie_id (str): resultaat} voor alle
+        geldige items. Bij een fout of onbruikbare output een lege dict,
+        zodat de aanroeper per paar terugvalt.
+        """
+        try:
+            parsed = self._chat_json(prompt, max_tokens=BATCH_MAX_TOKENS_PER_ITEM * n_items)
+        except Exception:
+            return {}
 
-            score = int(parsed.get("match_score", 50))
-            toel = parsed.get("match_toelichting", [])
+        items = parsed.get("matches") if isinstance(parsed, dict) else None
+        if not isinstance(items, list):
+            return {}
 
-            if isinstance(toel, str):
-                toel = [toel]
-            elif not isinstance(toel, list):
-                toel = [str(toel)]
+        by_id = {}
+        for item in items:
+            validated = _validate_batch_item(item)
+            if validated is None:
+                continue
+            subsidie_id, result = validated
+            by_id.setdefault(subsidie_id, result)
+        return by_id
 
-            return {
-                "match_score": score,
-                "match_toelichting": toel,
-            }
+    def _chat_json(self, prompt: str, max_tokens: int):
+        body = self.chat_request_body(prompt, max_tokens=max_tokens)
+        started = time.monotonic()
+        stats = {}
+        usage = {}
+        error = ERROR_OK
+        try:
+            if self._replaying():
+                # Afspelen: geen netwerk, geen limiter; tokens zoals opgenomen
+                raw_json, usage = self._cassette.replay(body)
+            else:
+                # Rate limiting, backoff en retries op 429/5xx/timeouts
+                response = call_with_retries(
+                    lambda: self._client.chat.completions.create(**body),
+                    get_rate_limiter(),
+                    estimate_tokens(prompt, max_tokens),
+                    stats=stats,
+                )
 
+                # Nieuwe API → message is object, geen dict → gebruik .content
+                raw_json = response.choices[0].message.content
+                usage = usage_counts(response.usage)
+                if self._cassette is not None:
+                    # Vóór het parsen: ook onbruikbare output wordt afgespeeld
+                    self._cassette.record(body, raw_json, usage)
+            return json.loads(raw_json)
         except Exception as exc:
-            return {
-                "match_score": 50,
-                "match_toelichting": [
-                    "Fout bij OpenAI-call.",
-                    str(exc),
-                ],
-            }
+            error = type(exc).__name__
+            raise
+        finally:
+            get_metrics().record(
+                self._model,
+                wall_seconds=time.monotonic() - started,
+                queue_seconds=stats.get("queue_seconds", 0.0),
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                cached_tokens=usage.get("cached_tokens", 0),
+                retries=stats.get("retries", 0),
+                error=error,
+            )
 
     # --------------------------------------------------------
     # PRIVATE: MOCK (fallback)
     # --------------------------------------------------------
     def _mock_response(self, org, subsidie):
         # Zeer eenvoudige demo-respons voor non-OpenAI modus
+        same_sector = subsidie.get("sector") == org.get("sector")
         base_score = 40
-        if subsidie.get("sector") == org.get("sector"):
+        if same_sector:
             base_score += 30
 
         return {
@@ -138,30 +425,183 @@ class LLMClient:
                 "Mock-modus actief (geen echte OpenAI).",
                 f"Organisatie: {org.get('organisatie_naam')}",
                 f"Subsidie: {subsidie.get('subsidie_naam')}",
+                _mock_sector_line(same_sector),
             ],
+            "status": "ok",
         }
 
+    # --------------------------------------------------------
+    # MOCK: VOLLEDIGE MATRIX IN ÉÉN KEER
+    # --------------------------------------------------------
+    def mock_score_matrix(self, organisations_df, subsidies_df):
+        """
+        Gevectoriseerde variant van _mock_response over alle organisaties ×
+        subsidies tegelijk, met exact dezelfde uitkomst als per paar.
+
+        Retourneert een dict met:
+        - "match_score": int-array (organisaties × subsidies), in de
+          rijvolgorde van beide DataFrames;
+        - "match_toelichting": object-array met de toelichting per paar,
+          rij-voor-rij afgevlakt (organisatie-major). De tekst per
+          organisatie en per subsidie wordt één keer opgebouwd; per paar
+          rest alleen het aan elkaar plakken.
+        """
+        same_sector = _equal_matrix(
+            _column_values(organisations_df, "sector"),
+            _column_values(subsidies_df, "sector"),
+        )
+        scores = np.where(same_sector, 70, 40)
+
+        # Zelfde opmaak als f"{org.get(...)}" per paar, maar één str() per entiteit
+        org_parts = np.array(
+            [
+                f"Mock-modus actief (geen echte OpenAI).\nOrganisatie: {name}\n"
+                for name in _column_values(organisations_df, "organisatie_naam")
+            ],
+            dtype=object,
+        )
+        sub_parts = np.array(
+            [f"Subsidie: {name}\n" for name in _column_values(subsidies_df, "subsidie_naam")],
+            dtype=object,
+        )
+        sector_lines = np.array(
+            [_mock_sector_line(False), _mock_sector_line(True)], dtype=object
+        )
+        toelichting = (
+            org_parts[:, None] + sub_parts[None, :] + sector_lines[same_sector.astype(np.int8)]
+        ).ravel()
+
+        return {
+            "match_score": scores,
+            "match_toelichting": toelichting,
+        }
+
+
+def parse_score_json(parsed):
+    """
+    Zet een geparst JSON-antwoord voor één paar om naar een resultaat-dict.
+    """
+    score = int(parsed.get("match_score", 50))
+    toel = _normalise_toelichting(parsed.get("match_toelichting", []))
+
+    return {
+        "match_score": score,
+        "match_toelichting": toel,
+        "status": "ok",
+    }
+
+
+def error_result(exc):
+    """
+    Resultaat-dict voor een mislukte scoring: geen score, status "fout"
+    (in de matches-tabel klaar voor services.matching.retry_failed_matches).
+    """
+    return {
+        "match_score": None,
+        "match_toelichting": [
+            "Fout bij OpenAI-call.",
+            str(exc),
+        ],
+        "status": "fout",
+    }
+
+
+def _normalise_toelichting(toel):
+    if isinstance(toel, str):
+        return [toel]
+    if not isinstance(toel, list):
+        return [str(toel)]
+    return toel
+
+
+def _validate_batch_item(item):
+    """
+    Controleer één item uit een batch-antwoord.
+    Retourneert (subsidie_id als str, resultaat) of None als het item onbruikbaar is.
+    """
+    if not isinstance(item, dict) or item.get("subsidie_id") in (None, ""):
+        return None
+
+    try:
+        score = int(item.get("match_score"))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= score <= 100:
+        return None
+
+    toel = item.get("match_toelichting")
+    if toel in (None, "", []):
+        return None
+
+    return str(item["subsidie_id"]).strip(), {
+        "match_score": score,
+        "match_toelichting": _normalise_toelichting(toel),
+        "status": "ok",
+    }
+
+
+def _mock_sector_line(same_sector):
+    if same_sector:
+        return "Sector van organisatie en subsidie komt overeen."
+    return "Geen sectorovereenkomst tussen organisatie en subsidie."
+
 
 # --------------------------------------------------------
-# HULP: SAFE FORMAT-DICT
+# HULP: KOLOMMEN VERGELIJKEN ZOALS dict.get(...) == dict.get(...)
 # --------------------------------------------------------
-class _SafeDict(dict):
+def _column_values(df, column):
+    """Kolom als object-array; ontbreekt de kolom, dan overal None (zoals dict.get)."""
+    if column in df.columns:
+        return df[column].to_numpy(dtype=object)
+    return np.full(len(df), None, dtype=object)
+
+
+def _equal_matrix(a, b):
     """
-    Voorkomt KeyErrors in str.format_map().
-    Mist een key → return "".
+    Matrix a[i] == b[j] met Python-semantiek (NaN != NaN, None == None),
+    zonder n×m Python-vergelijkingen: waarden worden eerst gefactoriseerd.
     """
+    codes, _ = pd.factorize(np.concatenate([a, b]), use_na_sentinel=True)
+    codes_a = codes[: len(a)].reshape(-1, 1)
+    codes_b = codes[len(a):].reshape(1, -1)
+    equal = (codes_a == codes_b) & (codes_a >= 0)
+
+    # factorize zet None en NaN allebei op -1; alleen None == None is waar
+    a_none = np.array([value is None for value in a], dtype=bool).reshape(-1, 1)
+    b_none = np.array([value is None for value in b], dtype=bool).reshape(1, -1)
+    return equal | (a_none & b_none)
 
-    def __missing__(self, key):
-        return ""
+
+def _configured_api_key():
+    """
+    API-key uit de omgeving of uit st.secrets. Zonder secrets-bestand
+    geeft st.secrets een fout; dat betekent hier gewoon: geen key.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        return st.secrets.get("OPENAI_API_KEY", None)
+    except Exception:
+        return None
 
 
 # --------------------------------------------------------
 # FABRIEK
 # --------------------------------------------------------
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
 def get_llm_client():
     """
-    Singleton LLM-client per sessie.
+    Eén LLM-client per proces, gedeeld door alle sessies en threads.
+
+    Alle sessies hergebruiken zo dezelfde warme HTTP-verbindingen en
+    vallen onder dezelfde rate limiter (services.rate_limit).
     """
-    if "llm_client" not in st.session_state:
-        st.session_state["llm_client"] = LLMClient()
-    return st.session_state["llm_client"]
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient()
+        return _shared_client
@@ -0,0 +1,371 @@
+# services/llm_stub_server.py
+"""
+Lokale, OpenAI-compatibele stand-in voor chat.completions.
+
+Bedoeld om het echte scoringpad (HTTP, JSON-parsing, retries, rate
+limiting, cache) offline te testen en te benchmarken. De server
+antwoordt op POST /v1/chat/completions met een deterministische score
+per prompt (of een extractieve samenvatting bij een samenvattingsprompt
+uit services.subsidy_summaries), en kan vertraging, 429's, 500's en kapotte JSON injecteren.
+Net als OpenAI meldt de stub in usage.prompt_tokens_details.cached_tokens
+hoeveel input-tokens een gemeenschappelijk begin hadden met een recente
+prompt (in blokken van 128 tokens, vanaf 1024 tokens).
+
+Starten:
+
+    python -m services.llm_stub_server --port 8787 --latency lognormal \\
+        --latency-ms 400 --rate-429 0.05 --rate-500 0.01 --rate-malformed 0.01
+
+en de app ernaar laten wijzen met OPENAI_BASE_URL=http://127.0.0.1:8787/v1
+(een OPENAI_API_KEY is dan niet nodig).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+
+LATENCY_DISTRIBUTIONS = ("vast", "uniform", "lognormal")
+
+# Prompt-cache zoals bij OpenAI: vanaf een minimumlengte, in vaste blokken
+CACHE_BLOCK_TOKENS = 128
+CACHE_RECENT_PROMPTS = 256
+
+# Subsidieblokken in een batch-prompt (zie BATCH_SUBSIDIE_HEADER)
+_BATCH_SUBSIDIE_RE = re.compile(r"^SUBSIDIE (\S+)$", re.MULTILINE)
+
+# Secties van een samenvattingsprompt (zie SUMMARY_PROMPT)
+_SUMMARY_SECTION_RE = re.compile(
+    r"^(Voor wie|Samenvatting eisen|Volledige subsidie-tekst):\n(.*?)(?=\n\n)",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+class StubSettings:
+    """
+    Gedrag van de stub-server.
+
+    latency: "vast", "uniform" (0 – 2× latency_ms) of "lognormal"
+    (mediaan latency_ms, spreiding latency_sigma). De foutkansen gelden
+    per request en sluiten elkaar uit. cache_min_tokens is de minimale
+    lengte van een gedeeld begin voordat er cached tokens worden gemeld.
+    """
+
+    def __init__(
+        self,
+        latency: str = "vast",
+        latency_ms: float = 0.0,
+        latency_sigma: float = 0.5,
+        rate_429: float = 0.0,
+        rate_500: float = 0.0,
+        rate_malformed: float = 0.0,
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = None,
+        cache_min_tokens: int = 1024,
+    ):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Onbekende latency-verdeling: {latency}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_malformed = rate_malformed
+        self.retry_after = retry_after
+        self.seed = seed
+        self.cache_min_tokens = cache_min_tokens
+
+
+class StubServer(ThreadingHTTPServer):
+    """HTTP-server met instellingen en tellers per uitkomst."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], settings: StubSettings):
+        super().__init__(address, _ChatCompletionsHandler)
+        self.settings = settings
+        self.counts = {"requests": 0, "ok": 0, "429": 0, "500": 0, "malformed": 0}
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._recent_prompts: deque = deque(maxlen=CACHE_RECENT_PROMPTS)
+        self._random = random.Random(settings.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def draw(self) -> Tuple[str, float]:
+        """Kies uitkomst en vertraging (seconden) voor één request."""
+        settings = self.settings
+        with self._lock:
+            self.counts["requests"] += 1
+            roll = self._random.random()
+            if settings.latency == "uniform":
+                delay_ms = self._random.uniform(0, 2 * settings.latency_ms)
+            elif settings.latency == "lognormal" and settings.latency_ms > 0:
+                delay_ms = self._random.lognormvariate(
+                    math.log(settings.latency_ms), settings.latency_sigma
+                )
+            else:
+                delay_ms = settings.latency_ms
+
+            if roll < settings.rate_429:
+                outcome = "429"
+            elif roll < settings.rate_429 + settings.rate_500:
+                outcome = "500"
+            elif roll < settings.rate_429 + settings.rate_500 + settings.rate_malformed:
+                outcome = "malformed"
+            else:
+                outcome = "ok"
+            self.counts[outcome] += 1
+        return outcome, delay_ms / 1000.0
+
+    def cached_tokens_for(self, text: str) -> int:
+        """Tokens van het langste gedeelde begin met een recente prompt, afgerond op blokken."""
+        with self._lock:
+            shared = max(
+                (_common_prefix_length(text, other) for other in self._recent_prompts),
+                default=0,
+            )
+            self._recent_prompts.append(text)
+            tokens = shared // 4
+            cached = 0
+            if tokens >= self.settings.cache_min_tokens:
+                cached = tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+            self.prompt_tokens += max(1, len(text) // 4)
+            self.cached_tokens += cached
+        return cached
+
+
+class _ChatCompletionsHandler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Onbekend pad: {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            prompt = body["messages"][-1]["content"]
+            full_text = "".join(message["content"] for message in body["messages"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send_json(400, {"error": {"message": "Ongeldige request-body."}})
+            return
+
+        outcome, delay = self.server.draw()
+        time.sleep(delay)
+
+        if outcome == "429":
+            headers = {}
+            if self.server.settings.retry_after is not None:
+                headers["Retry-After"] = str(self.server.settings.retry_after)
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stub).", "type": "requests"}},
+                headers,
+            )
+            return
+        if outcome == "500":
+            self._send_json(500, {"error": {"message": "Interne fout (stub)."}})
+            return
+
+        content = stub_completion_content(prompt)
+        if outcome == "malformed":
+            content = content[: len(content) // 2]
+
+        prompt_tokens = max(1, len(full_text) // 4)
+        cached_tokens = self.server.cached_tokens_for(full_text)
+        completion_tokens = max(1, len(content) // 4)
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+            },
+        )
+
+    def log_message(self, format, *args):
+        # Geen regel per request op stderr
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    # Binair zoeken met slice-vergelijkingen: veel sneller dan per teken
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+# --------------------------------------------------------
+# DETERMINISTISCHE ANTWOORDEN
+# --------------------------------------------------------
+def deterministic_score(text: str) -> int:
+    """Score 1–100 die alleen van de tekst afhangt."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return 1 + int.from_bytes(digest[:4], "big") % 100
+
+
+def deterministic_score_content(prompt: str, herkomst: str) -> str:
+    """JSON-antwoord voor één paar, zoals parse_score_json het verwacht."""
+    score = deterministic_score(prompt)
+    return json.dumps(
+        {
+            "match_score": score,
+            "match_toelichting": [
+                f"{herkomst} (geen echte OpenAI).",
+                f"Deterministische score op basis van de prompt: {score}.",
+            ],
+        },
+        ensure_ascii=False,
+    )
+
+
+def stub_completion_content(prompt: str) -> str:
+    """
+    Antwoord van de stub: bij een batch-prompt (meerdere SUBSIDIE-blokken
+    en een "matches"-instructie) één item per subsidie, anders één score.
+    """
+    if '"uitsluitingen"' in prompt:
+        return _summary_content(prompt)
+
+    subsidie_ids = _BATCH_SUBSIDIE_RE.findall(prompt)
+    if subsidie_ids and '"matches"' in prompt:
+        blocks = _BATCH_SUBSIDIE_RE.split(prompt)
+        # split levert [voor, id1, blok1, id2, blok2, ...]
+        items = []
+        for subsidie_id, block in zip(blocks[1::2], blocks[2::2]):
+            score = deterministic_score(blocks[0] + block)
+            items.append(
+                {
+                    "subsidie_id": subsidie_id,
+                    "match_score": score,
+                    "match_toelichting": [
+                        "Lokale stub-server (geen echte OpenAI).",
+                        f"Deterministische score op basis van de prompt: {score}.",
+                    ],
+                }
+            )
+        return json.dumps({"matches": items}, ensure_ascii=False)
+
+    return deterministic_score_content(prompt, "Lokale stub-server")
+
+
+def _summary_content(prompt: str) -> str:
+    """Samenvatting uit de eerste zin van elke sectie van de prompt."""
+    sections = {name: text.strip() for name, text in _SUMMARY_SECTION_RE.findall(prompt)}
+
+    def first_sentence(name: str) -> str:
+        return re.split(r"(?<=[.!?])\s+", sections.get(name, ""), maxsplit=1)[0]
+
+    return json.dumps(
+        {
+            "doel": first_sentence("Volledige subsidie-tekst"),
+            "doelgroep": first_sentence("Voor wie"),
+            "eisen": [first_sentence("Samenvatting eisen")],
+            "uitsluitingen": [],
+            "bedrag_en_looptijd": "",
+        },
+        ensure_ascii=False,
+    )
+
+
+# --------------------------------------------------------
+# STARTEN
+# --------------------------------------------------------
+def start_stub_server(
+    settings: Optional[StubSettings] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> StubServer:
+    """
+    Start de stub in een achtergrondthread (port 0 = vrije poort).
+    Stoppen met server.shutdown().
+    """
+    server = StubServer((host, port), settings or StubSettings())
+    thread = threading.Thread(target=server.serve_forever, name="llm-stub-server", daemon=True)
+    thread.start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatibele stub voor chat.completions.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="vast")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--rate-malformed", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        rate_429=args.rate_429,
+        rate_500=args.rate_500,
+        rate_malformed=args.rate_malformed,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        cache_min_tokens=args.cache_min_tokens,
+    )
+    server = StubServer((args.host, args.port), settings)
+    print(f"Stub-server luistert op {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 # services/matching.py
 from __future__ import annotations
 
+import itertools
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -18,20 +25,293 @@ from data.data_store import (
     next_id,
     set_table,
 )
-from services.llm_client import get_llm_client
+from services.batch_jobs import default_batch_workdir, get_batch_backend, score_pairs_via_batch
+from services.cascade import (
+    CASCADE_LEXICAAL,
+    CASCADE_MODEL,
+    CASCADE_REPORT_KEY,
+    CASCADE_SCORERS,
+    DEFAULT_CASCADE_BAND,
+    DEFAULT_CASCADE_TOP_K,
+    DEFAULT_STRONG_MODEL,
+    STAGE_GOEDKOOP,
+    STAGE_STERK,
+    CascadeTracker,
+    escalation_mask,
+    lexical_first_pass,
+    score_source,
+    stage_run_id,
+)
+from services.checkpoints import RunCheckpoint, get_checkpoint_store, run_fingerprint
+from services.eligibility import eligibility_matrix, exclusion_reason
+from services.instrumentation import bind, call_labels
+from services.jobs import Job, submit_session_job
+from services.llm_client import error_result, get_llm_client
+from services.prioritization import pair_priority
+from services.prompt_templates import LAYOUT_SUBSIDIE_VAST, LAYOUT_TEMPLATE, PROMPT_LAYOUTS
+from services.rate_limit import configure_rate_limiter, get_rate_limiter
+from services.retrieval import lexical_score_matrix, prefilter_recall, select_candidates
+from services.subsidy_summaries import with_summaries
+from services.work_queue import (
+    DEFAULT_LEASE_SECONDS,
+    SHARD_BY_ORGANISATIE,
+    SHARD_KLAAR,
+    SHARD_MISLUKT,
+    WorkQueue,
+    get_work_queue,
+    shard_pairs,
+)
+
+
+# Standaard aantal gelijktijdige LLM-calls bij een volledige herberekening.
+# 1 betekent sequentieel (oude gedrag).
+DEFAULT_MAX_WORKERS = int(os.getenv("SUBSIDIEMATCH_MAX_WORKERS", "8"))
+
+# Aantal subsidies per organisatie in één LLM-call. 1 = één call per paar.
+DEFAULT_BATCH_SIZE = int(os.getenv("SUBSIDIEMATCH_BATCH_SIZE", "1"))
+
+# Waarden voor de kolom "status" in de matches-tabel
+STATUS_GESCOORD = "gescoord"
+STATUS_VOORGEFILTERD = "voorgefilterd"
+STATUS_BUITEN_BUDGET = "buiten_budget"
+STATUS_UITGESLOTEN = "uitgesloten"
+# Mislukte LLM-call: geen score, wacht op retry_failed_matches
+STATUS_FOUT = "fout"
+
+# Volgorde van de stukken in de prompt (zie services.prompt_templates)
+DEFAULT_PROMPT_LAYOUT = os.getenv("SUBSIDIEMATCH_PROMPT_LAYOUT", LAYOUT_TEMPLATE)
+
+# Aantal paren per blok bij een (streaming) herberekening
+DEFAULT_CHUNK_SIZE = int(os.getenv("SUBSIDIEMATCH_CHUNK_SIZE", "200"))
+
+# Eerste blok bij een tijdsbudget, zolang de snelheid nog onbekend is
+TIME_BUDGET_FIRST_CHUNK = 16
+
+# Standaard aantal shards per worker-proces: klein genoeg om werk te
+# verdelen als een proces trager is, groot genoeg om weinig overhead te hebben
+SHARDS_PER_WORKER = 4
+
+# Hoe vaak het hoofdproces de wachtrij controleert op klaargezette shards
+SHARD_POLL_INTERVAL = 0.5
+
+# Aantal voorlopige topresultaten dat tijdens een herberekening zichtbaar is
+LIVE_TOP_N = 20
+
+# Rapport van de laatste lexicale voorselectie (voor weergave op Home)
+PREFILTER_REPORT_KEY = "prefilter_report"
+
+# Voorselectie van de laatste volledige herberekening ({"top_k", "min_score"});
+# het incrementele onderhoud past dezelfde selectie toe
+PREFILTER_SETTINGS_KEY = "prefilter_settings"
+
+# Voortgang van een lopende herberekening (voor Home en Matches)
+RECOMPUTE_PROGRESS_KEY = "recompute_progress"
+
+# Soort-aanduiding voor herberekeningen in de jobrunner
+RECOMPUTE_JOB_KIND = "herberekening"
+
+
+class RecomputeOptions:
+    """
+    Instellingen van een volledige herberekening; zie recompute_all_matches
+    voor de werking. Zonder waarde gelden de standaardwaarden (deels uit de
+    omgeving). Combinaties die niet samengaan geven een ValueError bij
+    validate(), zodat een formulier de opties kan opbouwen zonder te falen.
+
+    - max_workers, batch_size, chunk_size: parallelle calls, subsidies per
+      call en paren per blok;
+    - prefilter_top_k, prefilter_min_score: lexicale voorselectie;
+    - batch_backend, batch_poll_interval: offline batch-job;
+    - time_budget (seconden), call_budget (paren): budget;
+    - prompt_layout: volgorde van de stukken in de prompt;
+    - shard_workers, shard_by, n_shards: worker-processen en shards;
+    - cascade, cascade_band, cascade_top_k, strong_model: modelcascade;
+    - checkpoint: gescoorde blokken checkpointen (en hervatten).
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        prefilter_top_k: Optional[int] = None,
+        prefilter_min_score: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        batch_backend: Optional[str] = None,
+        batch_poll_interval: float = 30.0,
+        chunk_size: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        call_budget: Optional[int] = None,
+        prompt_layout: Optional[str] = None,
+        shard_workers: Optional[int] = None,
+        shard_by: str = SHARD_BY_ORGANISATIE,
+        n_shards: Optional[int] = None,
+        cascade: Optional[str] = None,
+        cascade_band: Tuple[float, float] = DEFAULT_CASCADE_BAND,
+        cascade_top_k: int = DEFAULT_CASCADE_TOP_K,
+        strong_model: Optional[str] = None,
+        checkpoint: bool = True,
+    ):
+        self.max_workers = DEFAULT_MAX_WORKERS if max_workers is None else max_workers
+        self.prefilter_top_k = prefilter_top_k
+        self.prefilter_min_score = prefilter_min_score
+        self.batch_size = DEFAULT_BATCH_SIZE if batch_size is None else batch_size
+        self.batch_backend = batch_backend
+        self.batch_poll_interval = batch_poll_interval
+        self.chunk_size = DEFAULT_CHUNK_SIZE if chunk_size is None else chunk_size
+        self.time_budget = time_budget
+        self.call_budget = call_budget
+        self.prompt_layout = DEFAULT_PROMPT_LAYOUT if prompt_layout is None else prompt_layout
+        self.shard_workers = shard_workers
+        self.shard_by = shard_by
+        self.n_shards = n_shards
+        self.cascade = cascade
+        self.cascade_band = cascade_band
+        self.cascade_top_k = cascade_top_k
+        self.strong_model = strong_model
+        self.checkpoint = checkpoint
+
+    @property
+    def use_prefilter(self) -> bool:
+        return bool(self.prefilter_top_k) or self.prefilter_min_score is not None
+
+    @property
+    def use_budget(self) -> bool:
+        return self.time_budget is not None or self.call_budget is not None
 
+    @property
+    def use_shards(self) -> bool:
+        return bool(self.shard_workers)
 
-def recompute_all_matches() -> None:
+    @property
+    def use_cascade(self) -> bool:
+        return bool(self.cascade)
+
+    def validate(self) -> None:
+        """ValueError bij een onbekende waarde of een combinatie die niet samengaat."""
+        if self.prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Onbekende prompt-layout: {self.prompt_layout}")
+        if self.time_budget is not None and self.batch_backend is not None:
+            raise ValueError(
+                "Een tijdsbudget werkt niet met een offline batch-job; gebruik een callbudget."
+            )
+        if self.use_shards and (self.use_budget or self.batch_backend is not None):
+            raise ValueError(
+                "Worker-processen werken niet samen met een budget of een offline batch-job."
+            )
+        if self.cascade and self.cascade not in CASCADE_SCORERS:
+            raise ValueError(f"Onbekende goedkope scorer voor de cascade: {self.cascade}")
+        if self.use_cascade and (
+            self.use_budget or self.use_shards or self.batch_backend is not None
+        ):
+            raise ValueError(
+                "De modelcascade werkt niet samen met een budget, worker-processen "
+                "of een offline batch-job."
+            )
+
+
+def recompute_all_matches(options: Optional[RecomputeOptions] = None) -> None:
     """
     Herbereken alle matches voor:
     - alle organisaties × alle subsidies
 
-    Vervangt de huidige matches-tabel volledig.
+    De instellingen hieronder (max_workers, prefilter_top_k, ...) zijn
+    velden van options (zie RecomputeOptions).
+
+    De gescoorde blokken worden in een werktabel verzameld; de matches-tabel
+    houdt tot het einde van de run de vorige volledige uitkomst en krijgt
+    het resultaat pas in _store_recompute_result. Daarna bevat de tabel
+    precies de paren van alle organisaties × alle subsidies.
+
+    Met max_workers > 1 worden de LLM-calls parallel uitgevoerd in een
+    begrensde thread-pool. De volgorde van de output (en daarmee de
+    match_id's) blijft gelijk aan de sequentiële variant.
+
+    Met prefilter_top_k en/of prefilter_min_score gaat eerst een lexicale
+    BM25-selectie over alle paren; alleen de top-K subsidies per organisatie
+    (of paren boven de drempel) worden door de LLM gescoord. De overige paren
+    krijgen status "voorgefilterd" en geen matchscore.
+
+    Met batch_size > 1 gaan per LLM-call één organisatie en tot batch_size
+    subsidies mee, opgebouwd uit de blokken van het actieve template (zie
+    LLMClient.score_org_subsidies_batch).
+
+    Met batch_backend ("local" of "openai") wordt niet interactief gescoord
+    maar via een offline batch-job (zie services.batch_jobs); de resultaten
+    worden per paar teruggekoppeld.
+
+    Met time_budget (seconden) en/of call_budget (aantal paren dat naar de
+    LLM gaat) worden de paren in prioriteitsvolgorde gescoord (zie
+    services.prioritization) tot het budget op is. Paren die daarna nog
+    over zijn krijgen status "buiten_budget"; een eerdere score blijft dan
+    staan.
+
+    prompt_layout ("template", "org_vast" of "subsidie_vast") bepaalt de
+    volgorde van de stukken in de prompt. Bij "org_vast" en "subsidie_vast"
+    komt eerst de vaste tekst, dan de entiteit die tussen opeenvolgende
+    calls gelijk blijft en als laatste de wisselende entiteit, zodat de
+    prompt-cache van de provider een zo lang mogelijk begin hergebruikt.
+    Bij "subsidie_vast" worden de paren per subsidie doorlopen. Hoeveel
+    input-tokens uit die cache kwamen staat in de voortgang
+    ("input_tokens", "cached_tokens").
+
+    Met shard_workers > 0 worden de kandidaat-paren verdeeld over n_shards
+    shards (standaard SHARDS_PER_WORKER per worker; per organisatiebereik
+    of per hash, zie shard_by) in de werkwachtrij (services.work_queue) en
+    gescoord door zoveel worker-processen, elk met een evenredig deel van
+    de rate limits. Er komt per klaargezette shard een blok binnen; per
+    paar telt precies één resultaat. De LLM-metingen van die calls blijven
+    in de worker-processen.
+
+    Met cascade ("model" of "lexicaal") scoort eerst een goedkope scorer
+    alle kandidaat-paren: het model van de client of de lexicale score
+    zonder LLM-call. Alleen paren binnen cascade_band, de top cascade_top_k
+    per organisatie en mislukte paren gaan daarna naar strong_model (zie
+    services.cascade). De kolom score_bron zegt welke stap de score leverde;
+    het rapport met kosten en doorlooptijd naast een schatting voor
+    "alles met het sterke model" staat in de voortgang ("cascade") en na
+    afloop in st.session_state[CASCADE_REPORT_KEY].
+
+    Met checkpoint (standaard aan) worden gescoorde paren zonder budget,
+    shards of cascade per blok gecheckpoint (zie services.checkpoints); bij
+    een batch-job ook het id van de ingediende job. Een onderbroken run met
+    dezelfde prompt en invoer wordt bij de volgende aanroep hervat; tot
+    dan blijft de matches-tabel van vóór de onderbroken run staan.
+
+    Verder, los van de opties:
+
+    Paren die niet aan de harde voorwaarden van een subsidie voldoen (zie
+    services.eligibility) gaan nooit naar de LLM; ze krijgen status
+    "uitgesloten" met de reden in de toelichting.
+
+    Gebruikt het template {subsidie_samenvatting}, dan wordt vooraf per
+    subsidie een beknopte samenvatting gemaakt of uit de cache gehaald (zie
+    services.subsidy_summaries).
+
+    Met een tokenbudget voor prompts (SUBSIDIEMATCH_PROMPT_TOKEN_BUDGET, zie
+    services.prompt_budget) worden lange velden ingekort; het aantal
+    bespaarde prompttokens staat in de voortgang ("saved_tokens").
+
+    Paren waarvan de LLM-call mislukt krijgen status "fout" en geen score;
+    retry_failed_matches scoort later alleen die paren opnieuw.
+
+    Zie iter_recompute_matches voor een variant met tussentijdse voortgang.
+    """
+    for _ in iter_recompute_matches(options):
+        pass
+
+
+def iter_recompute_matches(
+    options: Optional[RecomputeOptions] = None,
+) -> Iterator[Dict[str, Any]]:
     """
-    # Reset de tijdelijke teller voor match_id binnen deze run
-    if _TEMP_MATCH_COUNTER_KEY in st.session_state:
-        del st.session_state[_TEMP_MATCH_COUNTER_KEY]
+    Generator-variant van recompute_all_matches.
 
+    Levert na elk gescoord blok van chunk_size paren een voortgangsdict
+    (zie _progress) en zet dat ook in st.session_state[RECOMPUTE_PROGRESS_KEY],
+    zodat andere tabbladen de voorlopige topresultaten ("top") kunnen tonen.
+    De blokken gaan in een werktabel (zie _merge_matches); de matches-tabel
+    wordt pas vervangen als de run helemaal klaar is. Een afgebroken run
+    (fout, of de gebruiker verlaat de pagina) laat de tabel dus ongemoeid.
+    """
     organisations_df = get_table(ORGANISATIONS_KEY)
     subsidies_df = get_table(SUBSIDIES_KEY)
 
@@ -40,37 +320,1425 @@ def recompute_all_matches() -> None:
         st.warning("Er is geen actieve prompt geconfigureerd. Kan matches niet herberekenen.")
         return
 
+    # De tabel van vóór de run: vorige scores en referentie voor de recall
+    previous_matches = get_table(MATCHES_KEY)
+    chunks = iter_match_chunks(
+        organisations_df,
+        subsidies_df,
+        prompt_record["prompt_template"],
+        get_llm_client(),
+        options,
+        previous_matches=previous_matches,
+        prompt_id=prompt_record.get("prompt_id"),
+    )
+
+    run_df = _matches_frame([])
+    candidates = None
+    run_id = None
+    cascade_report = None
+    try:
+        for progress in chunks:
+            run_df = _merge_matches(run_df, progress.pop("chunk"))
+            candidates = progress.pop("prefilter_candidates", None)
+            run_id = progress.get("checkpoint_run_id")
+            cascade_report = progress.get("cascade")
+            st.session_state[RECOMPUTE_PROGRESS_KEY] = progress
+            yield progress
+
+        _store_recompute_result(
+            organisations_df,
+            subsidies_df,
+            run_df,
+            previous_matches,
+            candidates,
+            cascade_report,
+            options,
+        )
+        if run_id is not None:
+            get_checkpoint_store().finish_run(run_id)
+    finally:
+        st.session_state.pop(RECOMPUTE_PROGRESS_KEY, None)
+
+
+def start_recompute_job(options: Optional[RecomputeOptions] = None) -> Optional[Job]:
+    """
+    Start een volledige herberekening als achtergrondjob.
+
+    Accepteert dezelfde opties als recompute_all_matches. De job werkt op
+    een snapshot van organisaties, subsidies, prompt en matches en verzamelt
+    de blokken in een eigen werktabel; die gaat pas bij overdracht de
+    matches-tabel in (zie services.jobs en _store_recompute_result). Werk
+    dat intussen in de voorgrond is gedaan (bewerkte organisaties of
+    subsidies, retry_failed_matches) blijft daarbij behouden.
+    Annuleren wordt tussen twee blokken opgepakt; een geannuleerde run
+    blijft gecheckpoint en wordt bij een volgende start hervat.
+    """
+    organisations_df = get_table(ORGANISATIONS_KEY).copy()
+    subsidies_df = get_table(SUBSIDIES_KEY).copy()
+    previous_matches = get_table(MATCHES_KEY).copy()
+
+    prompt_record = get_active_prompt()
+    if prompt_record is None:
+        st.warning("Er is geen actieve prompt geconfigureerd. Kan matches niet herberekenen.")
+        return None
+
     prompt_template = prompt_record["prompt_template"]
     llm_client = get_llm_client()
 
-    all_rows = []
+    def run(job: Job) -> Dict[str, Any]:
+        run_df = _matches_frame([])
+        candidates = None
+        run_id = None
+        cascade_report = None
+        for progress in iter_match_chunks(
+            organisations_df,
+            subsidies_df,
+            prompt_template,
+            llm_client,
+            options,
+            previous_matches=previous_matches,
+            prompt_id=prompt_record.get("prompt_id"),
+        ):
+            run_df = _merge_matches(run_df, progress.pop("chunk"))
+            candidates = progress.pop("prefilter_candidates", None)
+            run_id = progress.get("checkpoint_run_id")
+            cascade_report = progress.get("cascade")
+            job.report(**progress)
+            job.check_cancelled()
+
+        return {
+            "matches": run_df,
+            "candidates": candidates,
+            "run_id": run_id,
+            "cascade": cascade_report,
+        }
+
+    def handoff(result: Dict[str, Any]) -> None:
+        _store_recompute_result(
+            organisations_df,
+            subsidies_df,
+            result["matches"],
+            previous_matches,
+            result["candidates"],
+            result["cascade"],
+            options,
+        )
+        # Pas na overdracht afsluiten: tot dan blijft de run hervatbaar
+        if result["run_id"] is not None:
+            get_checkpoint_store().finish_run(result["run_id"])
+
+    n_pairs = len(organisations_df) * len(subsidies_df)
+    return submit_session_job(
+        RECOMPUTE_JOB_KIND,
+        f"Herberekening van {n_pairs} paren (prompt {prompt_record.get('prompt_id')})",
+        run,
+        handoff,
+    )
+
+
+def _store_recompute_result(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    run_df: pd.DataFrame,
+    previous_matches: pd.DataFrame,
+    candidates: Optional[np.ndarray],
+    cascade_report: Optional[Dict[str, Any]] = None,
+    options: Optional[RecomputeOptions] = None,
+) -> None:
+    """
+    Zet het resultaat van een herberekening (en het voorselectie- en
+    cascaderapport) in de sessie. De rijen van de run (run_df) worden in
+    één keer in de huidige matches-tabel samengevoegd; bestaande paren
+    houden hun match_id.
+
+    Bij een achtergrondjob kan de tabel sinds de snapshot previous_matches
+    in de voorgrond zijn bijgewerkt. Paren met een nieuwere rij dan in de
+    snapshot houden die rij; rijen van organisaties of subsidies die
+    inmiddels verwijderd zijn vallen weg. De recall
+    van de voorselectie wordt gemeten t.o.v. previous_matches, de tabel
+    van vóór de run. De voorselectie uit options wordt bewaard voor het
+    incrementele onderhoud (zie _recompute_subset).
+    """
+    if options is not None and options.use_prefilter:
+        st.session_state[PREFILTER_SETTINGS_KEY] = {
+            "top_k": options.prefilter_top_k,
+            "min_score": options.prefilter_min_score,
+        }
+    else:
+        st.session_state.pop(PREFILTER_SETTINGS_KEY, None)
+    if cascade_report is not None:
+        st.session_state[CASCADE_REPORT_KEY] = cascade_report
+    if candidates is not None:
+        st.session_state[PREFILTER_REPORT_KEY] = _prefilter_report(
+            organisations_df,
+            subsidies_df,
+            candidates,
+            previous_matches,
+        )
+    current = get_table(MATCHES_KEY)
+    changed = _pairs_changed_since(previous_matches, current)
+    if len(changed):
+        run_keys = pd.MultiIndex.from_arrays([run_df["organisatie_id"], run_df["subsidie_id"]])
+        run_df = run_df[~run_keys.isin(changed)]
+
+    matches_df = _merge_matches(current, run_df)
+    existing = matches_df["organisatie_id"].isin(get_table(ORGANISATIONS_KEY)["organisatie_id"])
+    existing &= matches_df["subsidie_id"].isin(get_table(SUBSIDIES_KEY)["subsidie_id"])
+    set_table(MATCHES_KEY, matches_df[existing].reset_index(drop=True))
+
+
+def _pairs_changed_since(snapshot: pd.DataFrame, current: pd.DataFrame) -> pd.MultiIndex:
+    """
+    (organisatie_id, subsidie_id) van rijen in current die nieuw zijn of
+    anders dan in snapshot: werk uit de voorgrond tijdens een achtergrondjob.
+    """
+    keys = ["organisatie_id", "subsidie_id"]
+    if current is snapshot or current.empty:
+        return pd.MultiIndex.from_arrays([[], []], names=keys)
+    if snapshot.empty:
+        return pd.MultiIndex.from_frame(current[keys])
+
+    columns = ["match_score", "status", "match_toelichting", "datum_toegevoegd"]
+    joined = current[keys + columns].merge(
+        snapshot[keys + columns], on=keys, how="left", suffixes=("", "_oud"), indicator=True
+    )
+    changed = (joined["_merge"] == "left_only").to_numpy()
+    for column in columns:
+        new, old = joined[column], joined[f"{column}_oud"]
+        same = new.eq(old).fillna(False).astype(bool) | (new.isna() & old.isna())
+        changed |= ~same.to_numpy()
+    return pd.MultiIndex.from_frame(joined.loc[changed, keys])
+
+
+def iter_match_chunks(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    prompt_template: str,
+    llm_client,
+    options: Optional[RecomputeOptions] = None,
+    previous_matches: Optional[pd.DataFrame] = None,
+    prompt_id: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Kern van de herberekening, los van st.session_state.
+
+    Levert per blok een voortgangsdict met onder "chunk" de matches-rijen
+    van dat blok als DataFrame. Er staan nooit meer dan chunk_size rijen
+    tegelijk als Python-dicts in het geheugen.
+
+    Met een budget komen de blokken in prioriteitsvolgorde binnen, niet in
+    pair-volgorde; _merge_matches voegt ze per paar samen.
+    previous_matches (de vorige matches-tabel) bepaalt dan welke paren al
+    eens gescoord zijn en levert de score voor paren buiten het budget.
+
+    Met options.checkpoint (standaard) worden bij scoring per paar, per
+    organisatie-batch of via een batch-job de gescoorde rijen per blok
+    weggeschreven; een onafgemaakte run met dezelfde fingerprint wordt
+    hervat. Een batch-job die nog liep wordt daarbij opnieuw gepolld. Het voortgangsdict
+    bevat dan "checkpoint_run_id" en "hervat" (aantal paren uit het
+    checkpoint). De aanroeper sluit de run af met
+    get_checkpoint_store().finish_run zodra het resultaat is opgeslagen.
+
+    Met cascade worden hele organisaties per blok gescoord (de top-K per
+    organisatie moet binnen één blok vallen) en bevat het voortgangsdict
+    onder "cascade" het cumulatieve rapport van CascadeTracker. Een
+    cascaderun wordt niet gecheckpoint.
+    """
+    if options is None:
+        options = RecomputeOptions()
+    options.validate()
+    max_workers = options.max_workers
+    batch_size = options.batch_size
+    prompt_layout = options.prompt_layout
+    # Wordt bij een offline batch-job hieronder vergroot
+    chunk_size = options.chunk_size
+
+    started = time.monotonic()
+    orgs = organisations_df.to_dict("records")
+    # Voorbewerking: samenvattingen als het template {subsidie_samenvatting} gebruikt
+    subs = with_summaries(
+        subsidies_df.to_dict("records"), llm_client, [prompt_template], max_workers
+    )
+    total = len(orgs) * len(subs)
+
+    eligibility = eligibility_matrix(organisations_df, subsidies_df)
+    eligible = eligibility["eligible"]
 
-    # Alleen organisatie-matches (geen persona's meer)
-    for _, org in organisations_df.iterrows():
-        for _, sub in subsidies_df.iterrows():
-            row = _compute_single_match_org(
-                org.to_dict(), sub.to_dict(), prompt_template, llm_client
+    lexical = (
+        lexical_score_matrix(organisations_df, subsidies_df)
+        if options.use_prefilter or options.use_budget or options.cascade == CASCADE_LEXICAAL
+        else None
+    )
+    if options.use_prefilter:
+        # Top-K alleen onder paren die aan de voorwaarden voldoen
+        candidates = select_candidates(
+            np.where(eligible, lexical, -np.inf),
+            options.prefilter_top_k,
+            options.prefilter_min_score,
+        )
+    else:
+        candidates = np.ones((len(orgs), len(subs)), dtype=bool)
+    candidates &= eligible
+
+    if options.batch_backend is not None:
+        backend = get_batch_backend(options.batch_backend, llm_client)
+
+        def score_fn(pairs):
+            # run wordt hieronder gezet (closure): met een checkpoint wordt
+            # een eerder ingediende job van deze run verder gepolld
+            return score_pairs_via_batch(
+                pairs,
+                prompt_template,
+                llm_client,
+                backend,
+                default_batch_workdir(),
+                poll_interval=options.batch_poll_interval,
+                job_id=run.batch_job() if run is not None else None,
+                on_submit=run.save_batch_job if run is not None else None,
             )
-            all_rows.append(row)
 
-    if all_rows:
-        matches_df = pd.DataFrame(all_rows)
-        matches_df["datum_toegevoegd"] = pd.to_datetime(matches_df["datum_toegevoegd"])
+        # Eén batch-job voor alle paren; blokken hebben hier geen zin
+        chunk_size = max(total, 1)
+    elif llm_client.is_real() or options.use_budget:
+        # Met een budget ook in mock-modus per blok, zodat het budget telt
+
+        def score_fn(pairs):
+            return _score_pairs(
+                pairs, prompt_template, llm_client, max_workers, batch_size, prompt_layout
+            )
+
+    else:
+        score_fn = None
+
+    budget = llm_client.prompt_budget()
+    run: Optional[RunCheckpoint] = None
+    # Budget-runs hangen af van tijd en vorige scores en worden niet
+    # gecheckpoint, net als sharded runs (eigen wachtrij) en cascaderuns.
+    # Bij een batch-job bewaart het checkpoint ook het id van de job.
+    if (
+        options.checkpoint
+        and score_fn is not None
+        and not options.use_budget
+        and not options.use_shards
+        and not options.use_cascade
+    ):
+        fingerprint = run_fingerprint(
+            organisations_df,
+            subsidies_df,
+            prompt_template,
+            llm_client.model_name(),
+            {
+                "prefilter_top_k": options.prefilter_top_k,
+                "prefilter_min_score": options.prefilter_min_score,
+                "batch_size": batch_size,
+                "prompt_layout": prompt_layout,
+                "prompt_budget": budget.describe() if budget is not None else None,
+                "batch_backend": options.batch_backend,
+            },
+        )
+        run = get_checkpoint_store().open_run(prompt_id, fingerprint, total)
+    run_id = run.run_id if run is not None else uuid.uuid4().hex[:12]
+
+    if score_fn is not None:
+        # Alle LLM-calls van deze run onder run_id en prompt_id meten
+        unlabelled_score_fn = score_fn
+
+        def score_fn(pairs):
+            with call_labels(run_id=run_id, prompt_id=prompt_id):
+                return unlabelled_score_fn(pairs)
+
+    tracker: Optional[CascadeTracker] = None
+    if options.use_shards:
+        chunk_iter = _iter_sharded_chunks(
+            orgs,
+            subs,
+            candidates,
+            lexical,
+            eligibility,
+            {
+                "run_id": run_id,
+                "prompt_template": prompt_template,
+                "prompt_layout": prompt_layout,
+                "prompt_id": prompt_id,
+            },
+            int(options.shard_workers),
+            options.n_shards or int(options.shard_workers) * SHARDS_PER_WORKER,
+            options.shard_by,
+            max_workers,
+            chunk_size,
+        )
+    elif options.use_cascade:
+        strong_client = llm_client.with_model(options.strong_model or DEFAULT_STRONG_MODEL)
+        cheap_name = (
+            llm_client.model_name() if options.cascade == CASCADE_MODEL else CASCADE_LEXICAAL
+        )
+        tracker = CascadeTracker(run_id, cheap_name, strong_client.model_name())
+
+        def cheap_fn(index_pairs):
+            if options.cascade == CASCADE_LEXICAAL:
+                return lexical_first_pass(lexical, index_pairs)
+            # Per stap een eigen run-label: kosten en latency per stap
+            with call_labels(run_id=stage_run_id(run_id, STAGE_GOEDKOOP), prompt_id=prompt_id):
+                return _score_pairs(
+                    [(orgs[i], subs[j]) for i, j in index_pairs],
+                    prompt_template,
+                    llm_client,
+                    max_workers,
+                    batch_size,
+                    prompt_layout,
+                )
+
+        def strong_fn(index_pairs):
+            with call_labels(run_id=stage_run_id(run_id, STAGE_STERK), prompt_id=prompt_id):
+                return _score_pairs(
+                    [(orgs[i], subs[j]) for i, j in index_pairs],
+                    prompt_template,
+                    strong_client,
+                    max_workers,
+                    1,
+                    prompt_layout,
+                )
+
+        chunk_iter = _iter_cascade_chunks(
+            orgs,
+            subs,
+            candidates,
+            lexical,
+            eligibility,
+            cheap_fn,
+            strong_fn,
+            options.cascade_band,
+            options.cascade_top_k,
+            chunk_size,
+            tracker,
+        )
+    elif score_fn is None:
+        # Mock-modus: hele matrix in één keer, zelfde uitkomst als per paar
+        chunk_iter = iter(
+            [
+                _mock_matches_frame(
+                    organisations_df, subsidies_df, candidates, lexical, eligibility, llm_client
+                )
+            ]
+        )
+    elif options.use_budget:
+        chunk_iter = _iter_budgeted_chunks(
+            orgs,
+            subs,
+            candidates,
+            lexical,
+            eligibility,
+            pair_priority(organisations_df, subsidies_df, lexical, previous_matches),
+            score_fn,
+            chunk_size,
+            started,
+            options.time_budget,
+            options.call_budget,
+            previous_matches,
+        )
     else:
-        matches_df = pd.DataFrame(
-            columns=[
-                "match_id",
-                "subsidie_id",
-                "organisatie_id",
-                "persona_id",
-                "type",
-                "match_score",
-                "match_toelichting",
-                "datum_toegevoegd",
+        # Per subsidie doorlopen als de subsidie het vaste deel van de prompt
+        # is; batch-calls bundelen per organisatie en blijven organisatie-major
+        subsidy_major = prompt_layout == LAYOUT_SUBSIDIE_VAST and batch_size <= 1
+        chunk_iter = _iter_scored_chunks(
+            orgs, subs, candidates, lexical, eligibility, score_fn, chunk_size, run, subsidy_major
+        )
+
+    done = 0
+    out_of_budget = 0
+    excluded = 0
+    failed = 0
+    top = _matches_frame([])
+    # De limiter is procesbreed; het verschil t.o.v. de start is bij
+    # gelijktijdige runs een benadering
+    usage_start = (
+        get_rate_limiter().snapshot()
+        if score_fn is not None and not options.use_shards
+        else None
+    )
+    budget_start = budget.snapshot() if budget is not None and usage_start is not None else None
+    for chunk in chunk_iter:
+        done += len(chunk)
+        top = _live_top(top, chunk)
+        progress = _progress(done, total, started, top)
+        progress["chunk"] = chunk
+        progress["run_id"] = run_id
+        if options.use_prefilter:
+            progress["prefilter_candidates"] = candidates
+        excluded += int((chunk["status"] == STATUS_UITGESLOTEN).sum())
+        progress["uitgesloten"] = excluded
+        failed += int((chunk["status"] == STATUS_FOUT).sum())
+        progress["mislukt"] = failed
+        if options.use_budget:
+            out_of_budget += int((chunk["status"] == STATUS_BUITEN_BUDGET).sum())
+            progress["buiten_budget"] = out_of_budget
+        if run is not None:
+            progress["checkpoint_run_id"] = run.run_id
+            progress["hervat"] = len(run.done)
+        if usage_start is not None:
+            usage = get_rate_limiter().snapshot()
+            progress["input_tokens"] = usage["prompt_tokens"] - usage_start["prompt_tokens"]
+            progress["cached_tokens"] = usage["cached_tokens"] - usage_start["cached_tokens"]
+        if budget_start is not None:
+            progress["saved_tokens"] = (
+                budget.snapshot()["tokens_saved"] - budget_start["tokens_saved"]
+            )
+        if tracker is not None:
+            progress["cascade"] = tracker.report()
+        yield progress
+
+
+def _iter_scored_chunks(
+    orgs: List[Dict[str, Any]],
+    subs: List[Dict[str, Any]],
+    candidates: np.ndarray,
+    lexical: Optional[np.ndarray],
+    eligibility: Dict[str, Any],
+    score_fn: Callable[[List[Tuple[Dict[str, Any], Dict[str, Any]]]], List[Dict[str, Any]]],
+    chunk_size: int,
+    run: Optional[RunCheckpoint] = None,
+    subsidy_major: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """
+    Loop in pair-volgorde (organisatie-major) door alle paren en scoor de
+    kandidaten per blok van chunk_size paren met score_fn. Met
+    subsidy_major per subsidie; de match_id's blijven dan gelijk, alleen
+    de blokken komen in een andere volgorde binnen.
+
+    score_fn krijgt de kandidaat-paren van een blok en retourneert de
+    resultaten in dezelfde volgorde.
+
+    Met een run-checkpoint worden paren die daar al in staan niet opnieuw
+    gescoord, en gaan nieuw gescoorde rijen (behalve mislukte calls) na
+    elk blok naar het checkpoint.
+    """
+    done = run.done if run is not None else {}
+
+    # match_id's volgen de pair-volgorde: deterministisch en zonder gedeelde
+    # teller tussen threads.
+    if subsidy_major:
+        all_pairs = (
+            (i * len(subs) + j + 1, i, j, org, sub)
+            for j, sub in enumerate(subs)
+            for i, org in enumerate(orgs)
+        )
+    else:
+        all_pairs = (
+            (i * len(subs) + j + 1, i, j, org, sub)
+            for i, org in enumerate(orgs)
+            for j, sub in enumerate(subs)
+        )
+
+    while True:
+        block = list(itertools.islice(all_pairs, chunk_size))
+        if not block:
+            return
+
+        # Alleen organisatie-matches (geen persona's meer)
+        todo = [
+            (org, sub)
+            for match_id, i, j, org, sub in block
+            if candidates[i, j] and match_id not in done
+        ]
+        results = iter(score_fn(todo) if todo else [])
+
+        rows = []
+        new_rows = []
+        for match_id, i, j, org, sub in block:
+            if not candidates[i, j]:
+                rows.append(_build_skipped_row(match_id, i, j, org, sub, lexical, eligibility))
+            elif match_id in done:
+                rows.append(_checkpointed_row(done[match_id]))
+            else:
+                result = next(results)
+                row = _build_match_row(match_id, org, sub, result)
+                rows.append(row)
+                if result.get("status") != STATUS_FOUT:
+                    new_rows.append(row)
+
+        if run is not None:
+            run.save(new_rows)
+        yield _matches_frame(rows)
+
+
+def _checkpointed_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Rij uit een checkpoint of de werkwachtrij; de datum is daar als tekst opgeslagen."""
+    return dict(row, datum_toegevoegd=pd.Timestamp(row["datum_toegevoegd"]).to_pydatetime())
+
+
+def _iter_sharded_chunks(
+    orgs: List[Dict[str, Any]],
+    subs: List[Dict[str, Any]],
+    candidates: np.ndarray,
+    lexical: Optional[np.ndarray],
+    eligibility: Dict[str, Any],
+    context: Dict[str, Any],
+    shard_workers: int,
+    n_shards: int,
+    shard_by: str,
+    max_workers: int,
+    chunk_size: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Zet de kandidaat-paren als shards in de werkwachtrij, start
+    shard_workers worker-processen en lever per klaargezette shard een blok.
+    Paren zonder LLM-call komen eerst, in blokken van chunk_size.
+
+    De run wordt na afloop (ook bij annuleren) uit de wachtrij verwijderd en
+    nog lopende workers worden gestopt.
+    """
+    n_subs = len(subs)
+    skipped = (
+        (int(i) * n_subs + int(j) + 1, int(i), int(j)) for i, j in zip(*np.nonzero(~candidates))
+    )
+    while True:
+        block = list(itertools.islice(skipped, chunk_size))
+        if not block:
+            break
+        yield _matches_frame(
+            [
+                _build_skipped_row(match_id, i, j, orgs[i], subs[j], lexical, eligibility)
+                for match_id, i, j in block
+            ]
+        )
+
+    pairs = [(int(i) * n_subs + int(j) + 1, int(i), int(j)) for i, j in zip(*np.nonzero(candidates))]
+    if not pairs:
+        return
+
+    queue = get_work_queue()
+    shards = shard_pairs(
+        pairs,
+        n_shards,
+        shard_by,
+        org_ids=[org["organisatie_id"] for org in orgs],
+        sub_ids=[sub["subsidie_id"] for sub in subs],
+    )
+    queue_run_id = queue.create_run(
+        dict(context, organisations=orgs, subsidies=subs), shards
+    )
+    processes = start_shard_workers(
+        shard_workers, queue.path, run_id=queue_run_id, max_workers=max_workers
+    )
+
+    pending = set(range(len(shards)))
+    try:
+        while pending:
+            status = queue.shard_status(queue_run_id)
+            finished = sorted(s for s in pending if status.get(s) in (SHARD_KLAAR, SHARD_MISLUKT))
+            if not finished:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError(
+                        "Alle worker-processen zijn gestopt terwijl er nog shards openstaan."
+                    )
+                time.sleep(SHARD_POLL_INTERVAL)
+                continue
+
+            rows = [
+                _checkpointed_row(row)
+                for row in queue.results(
+                    queue_run_id, [s for s in finished if status[s] == SHARD_KLAAR]
+                )
+            ]
+            for shard_id in finished:
+                if status[shard_id] == SHARD_MISLUKT:
+                    failure = error_result(queue.shard_error(queue_run_id, shard_id))
+                    rows += [
+                        _build_match_row(match_id, orgs[i], subs[j], failure)
+                        for match_id, i, j in queue.shard_pairs(queue_run_id, shard_id)
+                    ]
+            pending.difference_update(finished)
+            yield _matches_frame(rows)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        queue.discard_run(queue_run_id)
+
+
+def start_shard_workers(
+    n_workers: int,
+    queue_path: str,
+    run_id: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    idle_timeout: Optional[float] = None,
+) -> List[multiprocessing.Process]:
+    """
+    Start n_workers worker-processen (spawn, geen fork: het Streamlit-proces
+    heeft threads). Elk proces krijgt 1/n_workers van de rate limits.
+    """
+    spawn = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(n_workers):
+        process = spawn.Process(
+            target=run_shard_worker,
+            args=(queue_path, f"worker-{os.getpid()}-{index}"),
+            kwargs={
+                "run_id": run_id,
+                "max_workers": max_workers,
+                "rate_share": 1.0 / n_workers,
+                "idle_timeout": idle_timeout,
+            },
+            name=f"subsidiematch-shard-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def run_shard_worker(
+    queue_path: str,
+    worker_id: str,
+    run_id: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_share: float = 1.0,
+    idle_timeout: Optional[float] = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+) -> None:
+    """
+    Headless worker: claim shards uit de wachtrij en scoor elk paar met
+    _compute_single_match_org, zonder Streamlit-sessie. Zolang een shard
+    gescoord wordt, verlengt een heartbeat de lease; alleen een gecrashte
+    of vastgelopen worker verliest zijn shard aan een andere worker.
+
+    Met run_id alleen shards van die run; de worker stopt als die run geen
+    open shards meer heeft. Zonder run_id stopt hij na idle_timeout seconden
+    zonder werk (None = blijf wachten).
+    """
+    configure_rate_limiter(rate_share)
+    queue = WorkQueue(queue_path)
+    llm_client = get_llm_client()
+    contexts: Dict[str, Optional[Dict[str, Any]]] = {}
+    idle_since = time.monotonic()
+
+    while True:
+        claimed = queue.claim(worker_id, run_id, lease_seconds)
+        if claimed is None:
+            if run_id is not None and not queue.has_open_shards(run_id):
+                return
+            if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                return
+            time.sleep(SHARD_POLL_INTERVAL)
+            continue
+
+        shard_run_id, shard_id, pairs = claimed
+        if shard_run_id not in contexts:
+            contexts[shard_run_id] = queue.run_context(shard_run_id)
+        context = contexts[shard_run_id]
+
+        try:
+            if context is None:
+                raise RuntimeError(f"Run {shard_run_id} staat niet meer in de wachtrij.")
+            with queue.lease_heartbeat(shard_run_id, shard_id, worker_id, lease_seconds):
+                rows = _score_shard(context, pairs, llm_client, max_workers)
+        except Exception as exc:
+            queue.fail(shard_run_id, shard_id, f"{type(exc).__name__}: {exc}")
+        else:
+            queue.complete(shard_run_id, shard_id, rows)
+        idle_since = time.monotonic()
+
+
+def _score_shard(
+    context: Dict[str, Any],
+    pairs: List[Tuple[int, int, int]],
+    llm_client,
+    max_workers: int,
+) -> List[Dict[str, Any]]:
+    """Scoor de paren van één shard; rijen in de volgorde van `pairs`."""
+    orgs = context["organisations"]
+    subs = context["subsidies"]
+
+    def _run(pair):
+        match_id, i, j = pair
+        return _compute_single_match_org(
+            orgs[i],
+            subs[j],
+            context["prompt_template"],
+            llm_client,
+            match_id,
+            context["prompt_layout"],
+        )
+
+    with call_labels(run_id=context["run_id"], prompt_id=context["prompt_id"]):
+        if max_workers <= 1 or len(pairs) <= 1:
+            return [_run(pair) for pair in pairs]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(bind(_run), pairs))
+
+
+def _iter_budgeted_chunks(
+    orgs: List[Dict[str, Any]],
+    subs: List[Dict[str, Any]],
+    candidates: np.ndarray,
+    lexical: np.ndarray,
+    eligibility: Dict[str, Any],
+    priority: np.ndarray,
+    score_fn: Callable[[List[Tuple[Dict[str, Any], Dict[str, Any]]]], List[Dict[str, Any]]],
+    chunk_size: int,
+    started: float,
+    time_budget: Optional[float],
+    call_budget: Optional[int],
+    previous_matches: Optional[pd.DataFrame],
+) -> Iterator[pd.DataFrame]:
+    """
+    Scoor de kandidaten in volgorde van afnemende prioriteit tot het
+    tijd- of callbudget op is, en lever daarna de overige paren als
+    "buiten_budget" (kandidaten) en "voorgefilterd" of "uitgesloten"
+    (niet-kandidaten).
+
+    Het tijdsbudget wordt tussen blokken gecontroleerd. Zodra de snelheid
+    bekend is, wordt het volgende blok zo klein gemaakt dat het binnen de
+    resterende tijd past.
+    """
+    n_subs = len(subs)
+    is_candidate = candidates.ravel()
+    order = np.argsort(-priority.ravel(), kind="stable")
+    queue = order[is_candidate[order]]
+
+    def pair(flat):
+        return orgs[flat // n_subs], subs[flat % n_subs]
+
+    pos = 0
+    while pos < len(queue):
+        size = chunk_size
+        if call_budget is not None:
+            size = min(size, call_budget - pos)
+        if time_budget is not None:
+            elapsed = time.monotonic() - started
+            remaining = time_budget - elapsed
+            if remaining <= 0:
+                break
+            if pos:
+                size = min(size, max(1, int(pos / elapsed * remaining)))
+            else:
+                # Snelheid nog onbekend: begin met een klein blok
+                size = min(size, TIME_BUDGET_FIRST_CHUNK)
+        if size <= 0:
+            break
+
+        block = [int(flat) for flat in queue[pos:pos + size]]
+        pairs = [pair(flat) for flat in block]
+        results = score_fn(pairs)
+        # match_id = pair-index + 1, net als bij _iter_scored_chunks
+        yield _matches_frame(
+            [
+                _build_match_row(flat + 1, org, sub, result)
+                for flat, (org, sub), result in zip(block, pairs, results)
             ]
         )
+        pos += len(block)
+
+    previous = _previous_scores(previous_matches)
+    for start in range(pos, len(queue), chunk_size):
+        rows = []
+        for flat in queue[start:start + chunk_size]:
+            org, sub = pair(int(flat))
+            rows.append(
+                _build_out_of_budget_row(
+                    int(flat) + 1,
+                    org,
+                    sub,
+                    previous.get((org["organisatie_id"], sub["subsidie_id"])),
+                )
+            )
+        yield _matches_frame(rows)
+
+    skipped = np.flatnonzero(~is_candidate)
+    for start in range(0, len(skipped), chunk_size):
+        rows = []
+        for flat in skipped[start:start + chunk_size]:
+            i, j = divmod(int(flat), n_subs)
+            rows.append(
+                _build_skipped_row(int(flat) + 1, i, j, orgs[i], subs[j], lexical, eligibility)
+            )
+        yield _matches_frame(rows)
 
-    set_table(MATCHES_KEY, matches_df)
+
+def _iter_cascade_chunks(
+    orgs: List[Dict[str, Any]],
+    subs: List[Dict[str, Any]],
+    candidates: np.ndarray,
+    lexical: Optional[np.ndarray],
+    eligibility: Dict[str, Any],
+    cheap_fn: Callable[[List[Tuple[int, int]]], List[Dict[str, Any]]],
+    strong_fn: Callable[[List[Tuple[int, int]]], List[Dict[str, Any]]],
+    band: Tuple[float, float],
+    top_k: int,
+    chunk_size: int,
+    tracker: CascadeTracker,
+) -> Iterator[pd.DataFrame]:
+    """
+    Scoor per blok van hele organisaties (ongeveer chunk_size paren) eerst
+    alle kandidaten met cheap_fn en daarna de geëscaleerde paren (zie
+    services.cascade.escalation_mask) met strong_fn. Beide krijgen
+    (organisatie-index, subsidie-index)-paren en retourneren de resultaten
+    in dezelfde volgorde.
+
+    Mislukt de sterke call van een paar dat goedkoop wel een score kreeg,
+    dan blijft die goedkope score staan met een notitie in de toelichting.
+    """
+    n_subs = len(subs)
+    orgs_per_block = max(1, chunk_size // max(n_subs, 1))
+    cheap_source = score_source(STAGE_GOEDKOOP, tracker.cheap_name)
+    strong_source = score_source(STAGE_STERK, tracker.strong_model)
+
+    for start in range(0, len(orgs), orgs_per_block):
+        block = range(start, min(start + orgs_per_block, len(orgs)))
+        todo = [(i, int(j)) for i in block for j in np.flatnonzero(candidates[i])]
+
+        cheap_started = time.monotonic()
+        results = list(cheap_fn(todo)) if todo else []
+        cheap_seconds = time.monotonic() - cheap_started
+
+        escalate = np.flatnonzero(
+            escalation_mask(
+                [i for i, _ in todo],
+                [
+                    None if result.get("status") == STATUS_FOUT else result.get("match_score")
+                    for result in results
+                ],
+                band,
+                top_k,
+            )
+        )
+        strong_started = time.monotonic()
+        strong = strong_fn([todo[k] for k in escalate]) if len(escalate) else []
+        strong_seconds = time.monotonic() - strong_started
+        tracker.add(len(todo), len(escalate), cheap_seconds, strong_seconds)
+
+        sources = [cheap_source] * len(todo)
+        for k, result in zip(escalate, strong):
+            cheap = results[k]
+            if result.get("status") == STATUS_FOUT and cheap.get("status") != STATUS_FOUT:
+                results[k] = dict(
+                    cheap,
+                    match_toelichting=list(cheap.get("match_toelichting", []))
+                    + [
+                        f"Escalatie naar {tracker.strong_model} mislukt; "
+                        "score uit de eerste ronde."
+                    ],
+                )
+            else:
+                results[k] = result
+                sources[k] = strong_source
+
+        scored = {pair: (result, source) for pair, result, source in zip(todo, results, sources)}
+        rows = []
+        for i in block:
+            for j, sub in enumerate(subs):
+                match_id = i * n_subs + j + 1
+                if (i, j) not in scored:
+                    rows.append(
+                        _build_skipped_row(match_id, i, j, orgs[i], sub, lexical, eligibility)
+                    )
+                    continue
+                result, source = scored[(i, j)]
+                row = _build_match_row(match_id, orgs[i], sub, result)
+                row["score_bron"] = source
+                rows.append(row)
+        yield _matches_frame(rows)
+
+
+def _previous_scores(previous_matches: Optional[pd.DataFrame]) -> Dict[Tuple[Any, Any], Dict[str, Any]]:
+    """(organisatie_id, subsidie_id) → eerdere score, toelichting en datum."""
+    if previous_matches is None or previous_matches.empty:
+        return {}
+    scored = previous_matches[previous_matches["match_score"].notna()]
+    return {
+        (org_id, sub_id): {
+            "match_score": int(score),
+            "match_toelichting": toelichting,
+            "datum_toegevoegd": datum,
+        }
+        for org_id, sub_id, score, toelichting, datum in zip(
+            scored["organisatie_id"],
+            scored["subsidie_id"],
+            scored["match_score"],
+            scored["match_toelichting"],
+            scored["datum_toegevoegd"],
+        )
+    }
+
+
+def _live_top(top: pd.DataFrame, chunk: pd.DataFrame) -> pd.DataFrame:
+    """Houd de LIVE_TOP_N hoogst scorende matches tot nu toe bij."""
+    scored = chunk[chunk["status"] == STATUS_GESCOORD]
+    if scored.empty:
+        return top
+    candidates = scored.nlargest(LIVE_TOP_N, "match_score")
+    if top.empty:
+        return candidates.reset_index(drop=True)
+    return (
+        pd.concat([top, candidates], ignore_index=True)
+        .nlargest(LIVE_TOP_N, "match_score")
+        .reset_index(drop=True)
+    )
+
+
+def _progress(done: int, total: int, started: float, top: pd.DataFrame) -> Dict[str, Any]:
+    """Voortgang van een herberekening: aantallen, snelheid en resterende tijd."""
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    remaining = total - done
+    return {
+        "done": done,
+        "total": total,
+        "elapsed": elapsed,
+        "pairs_per_sec": rate,
+        "eta": (remaining / rate) if rate > 0 else None,
+        "top": top,
+    }
+
+
+def _mock_matches_frame(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    candidates: np.ndarray,
+    lexical: Optional[np.ndarray],
+    eligibility: Dict[str, Any],
+    llm_client,
+) -> pd.DataFrame:
+    """
+    Bouw de matches-tabel in mock-modus direct uit de scorematrix,
+    zonder Python-lus per paar.
+    """
+    n_orgs, n_subs = candidates.shape
+    n_pairs = n_orgs * n_subs
+    if n_pairs == 0:
+        return _matches_frame([])
+
+    matrix = llm_client.mock_score_matrix(organisations_df, subsidies_df)
+    is_candidate = candidates.ravel()
+    is_excluded = ~eligibility["eligible"].ravel()
+
+    scores = pd.array(matrix["match_score"].ravel(), dtype="Int64")
+    toelichting = matrix["match_toelichting"]
+    if not is_candidate.all():
+        scores[~is_candidate] = pd.NA
+
+        prefiltered = ~is_candidate & ~is_excluded
+        if prefiltered.any():
+            # Eén tekst per (afgeronde) lexicale score i.p.v. één string per paar
+            skipped_scores = np.round(lexical.ravel()[prefiltered], 2)
+            unique_scores, inverse = np.unique(skipped_scores, return_inverse=True)
+            texts = np.array([_prefilter_toelichting(score) for score in unique_scores], dtype=object)
+            toelichting[prefiltered] = texts[inverse]
+
+        if is_excluded.any():
+            # Eén tekst per uitsluitingsreden
+            texts = np.array([_excluded_toelichting(reason) for reason in eligibility["reasons"]], dtype=object)
+            toelichting[is_excluded] = texts[eligibility["reason_codes"].ravel()[is_excluded]]
+
+    status = np.where(
+        is_candidate,
+        STATUS_GESCOORD,
+        np.where(is_excluded, STATUS_UITGESLOTEN, STATUS_VOORGEFILTERD),
+    ).astype(object)
+
+    return pd.DataFrame(
+        {
+            "match_id": np.arange(1, n_pairs + 1),
+            "subsidie_id": np.tile(subsidies_df["subsidie_id"].to_numpy(), n_orgs),
+            "organisatie_id": np.repeat(organisations_df["organisatie_id"].to_numpy(), n_subs),
+            "persona_id": None,
+            "type": "organisatie",
+            "match_score": scores,
+            "match_toelichting": toelichting,
+            "datum_toegevoegd": pd.Timestamp(datetime.today()),
+            "status": status,
+        }
+    )
+
+
+def _prefilter_report(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    candidates: np.ndarray,
+    previous_matches: pd.DataFrame,
+) -> Dict[str, Any]:
+    """
+    Vat de voorselectie samen, met recall t.o.v. de vorige volledige scores.
+    """
+    candidate_pairs = pd.DataFrame(
+        {
+            "organisatie_id": np.repeat(
+                organisations_df["organisatie_id"].to_numpy(), len(subsidies_df)
+            ),
+            "subsidie_id": np.tile(
+                subsidies_df["subsidie_id"].to_numpy(), len(organisations_df)
+            ),
+            "kandidaat": candidates.ravel(),
+        }
+    )
+    report = {
+        "n_pairs": int(candidates.size),
+        "n_candidates": int(candidates.sum()),
+    }
+    report.update(prefilter_recall(candidate_pairs, previous_matches))
+    return report
+
+
+# ------------------------------------------------------------
+# Incrementeel onderhoud bij CRUD op organisaties en subsidies
+# ------------------------------------------------------------
+def recompute_matches_for_org(
+    organisatie_id: int,
+    max_workers: Optional[int] = None,
+) -> None:
+    """
+    Herbereken alleen de matches van één organisatie (één rij van de matrix).
+
+    Doet niets zolang er nog geen matches gegenereerd zijn; de eerste
+    volledige run gaat via recompute_all_matches.
+    """
+    organisations_df = get_table(ORGANISATIONS_KEY)
+    org_rows = organisations_df[organisations_df["organisatie_id"] == organisatie_id]
+    _recompute_subset(org_rows, get_table(SUBSIDIES_KEY), None, max_workers)
+
+
+def recompute_matches_for_subsidie(
+    subsidie_id: int,
+    max_workers: Optional[int] = None,
+) -> None:
+    """
+    Herbereken alleen de matches van één subsidie (één kolom van de matrix).
+
+    Doet niets zolang er nog geen matches gegenereerd zijn.
+    """
+    _recompute_subset(
+        get_table(ORGANISATIONS_KEY), get_table(SUBSIDIES_KEY), [subsidie_id], max_workers
+    )
+
+
+def failed_matches(matches_df: pd.DataFrame) -> pd.DataFrame:
+    """Rijen met status "fout": de wachtrij van retry_failed_matches."""
+    if matches_df.empty or "status" not in matches_df.columns:
+        return matches_df.iloc[0:0]
+    return matches_df[matches_df["status"] == STATUS_FOUT]
+
+
+def retry_failed_matches(max_workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Scoor alleen de paren met status "fout" opnieuw met de actieve prompt.
+
+    Na een (gedeeltelijke) storing kost herstel zo alleen de mislukte
+    paren, niet een volledige herberekening. Match_id's blijven gelijk;
+    paren waarvan de organisatie of subsidie niet meer bestaat worden
+    overgeslagen, en paren die inmiddels niet meer aan de voorwaarden
+    voldoen worden "uitgesloten".
+
+    Retourneert {"opnieuw": aantal paren, "hersteld": nu gescoord,
+    "nog_fout": opnieuw mislukt}.
+    """
+    outcome = {"opnieuw": 0, "hersteld": 0, "nog_fout": 0}
+    failed = failed_matches(get_table(MATCHES_KEY))
+    prompt_record = get_active_prompt()
+    if failed.empty or prompt_record is None:
+        return outcome
+
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+
+    organisations_df = get_table(ORGANISATIONS_KEY)
+    subsidies_df = get_table(SUBSIDIES_KEY)
+    org_rows = organisations_df[
+        organisations_df["organisatie_id"].isin(failed["organisatie_id"])
+    ].reset_index(drop=True)
+    sub_rows = subsidies_df[
+        subsidies_df["subsidie_id"].isin(failed["subsidie_id"])
+    ].reset_index(drop=True)
+
+    org_pos = pd.Index(org_rows["organisatie_id"]).get_indexer(failed["organisatie_id"])
+    sub_pos = pd.Index(sub_rows["subsidie_id"]).get_indexer(failed["subsidie_id"])
+    known = (org_pos >= 0) & (sub_pos >= 0)
+    if not known.any():
+        return outcome
+
+    orgs = org_rows.to_dict("records")
+    subs = with_summaries(
+        sub_rows.to_dict("records"),
+        get_llm_client(),
+        [prompt_record["prompt_template"]],
+        max_workers,
+    )
+    eligibility = eligibility_matrix(org_rows, sub_rows)
+    eligible = eligibility["eligible"]
+
+    pairs = [(int(i), int(j)) for i, j in zip(org_pos[known], sub_pos[known])]
+    todo = [(orgs[i], subs[j]) for i, j in pairs if eligible[i, j]]
+    # Eigen run-label, zodat de kosten van het herstel apart zichtbaar zijn
+    run_id = f"herstel-{uuid.uuid4().hex[:8]}"
+    with call_labels(run_id=run_id, prompt_id=prompt_record.get("prompt_id")):
+        results = iter(
+            _score_pairs(
+                todo,
+                prompt_record["prompt_template"],
+                get_llm_client(),
+                max_workers,
+                prompt_layout=DEFAULT_PROMPT_LAYOUT,
+            )
+        )
+
+    rows = []
+    for i, j in pairs:
+        if eligible[i, j]:
+            rows.append(_build_match_row(None, orgs[i], subs[j], next(results)))
+        else:
+            rows.append(
+                _build_excluded_row(None, orgs[i], subs[j], exclusion_reason(eligibility, i, j))
+            )
+    _upsert_matches(rows)
+
+    outcome["opnieuw"] = len(todo)
+    outcome["nog_fout"] = sum(row["status"] == STATUS_FOUT for row in rows)
+    outcome["hersteld"] = outcome["opnieuw"] - outcome["nog_fout"]
+    return outcome
+
+
+def drop_matches_for_org(organisatie_id: int) -> None:
+    """Verwijder alle matches van een (verwijderde) organisatie."""
+    matches_df = get_table(MATCHES_KEY)
+    set_table(
+        MATCHES_KEY,
+        matches_df[matches_df["organisatie_id"] != organisatie_id].reset_index(drop=True),
+    )
+
+
+def _recompute_subset(
+    org_rows: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    subsidie_ids: Optional[List[Any]],
+    max_workers: Optional[int],
+) -> None:
+    """
+    Scoor org_rows × de subsidies met een id in subsidie_ids (None = alle)
+    en voeg het resultaat samen met de bestaande matches.
+
+    Werkt zoals een volledige herberekening met de standaardinstellingen:
+    dezelfde prompt-layout en batchgrootte, eigen run-label in de
+    LLM-metingen en de lexicale voorselectie van de laatste volledige run
+    (PREFILTER_SETTINGS_KEY). De top-K wordt daarbij over alle subsidies
+    bepaald, zoals in de volledige run.
+    """
+    if get_table(MATCHES_KEY).empty or org_rows.empty or subsidies_df.empty:
+        return
+
+    prompt_record = get_active_prompt()
+    if prompt_record is None:
+        return
+
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+
+    org_rows = org_rows.reset_index(drop=True)
+    subsidies_df = subsidies_df.reset_index(drop=True)
+    columns = (
+        np.arange(len(subsidies_df))
+        if subsidie_ids is None
+        else np.flatnonzero(subsidies_df["subsidie_id"].isin(subsidie_ids).to_numpy())
+    )
+    if not len(columns):
+        return
+
+    eligibility = eligibility_matrix(org_rows, subsidies_df)
+    eligible = eligibility["eligible"]
+    prefilter = st.session_state.get(PREFILTER_SETTINGS_KEY)
+    lexical = None
+    candidates = eligible.copy()
+    if prefilter is not None:
+        lexical = lexical_score_matrix(org_rows, subsidies_df)
+        candidates &= select_candidates(
+            np.where(eligible, lexical, -np.inf), prefilter["top_k"], prefilter["min_score"]
+        )
+
+    llm_client = get_llm_client()
+    orgs = org_rows.to_dict("records")
+    subs = subsidies_df.to_dict("records")
+    subset_subs = with_summaries(
+        [subs[j] for j in columns], llm_client, [prompt_record["prompt_template"]], max_workers
+    )
+    for j, sub in zip(columns, subset_subs):
+        subs[j] = sub
+
+    pairs = [(orgs[i], subs[j]) for i in range(len(orgs)) for j in columns if candidates[i, j]]
+    # Eigen run-label, zodat de kosten van het bijwerken apart zichtbaar zijn
+    run_id = f"bijwerken-{uuid.uuid4().hex[:8]}"
+    with call_labels(run_id=run_id, prompt_id=prompt_record.get("prompt_id")):
+        results = iter(
+            _score_pairs(
+                pairs,
+                prompt_record["prompt_template"],
+                llm_client,
+                max_workers,
+                DEFAULT_BATCH_SIZE,
+                DEFAULT_PROMPT_LAYOUT,
+            )
+        )
+
+    rows = []
+    for i, org in enumerate(orgs):
+        for j in columns:
+            if candidates[i, j]:
+                rows.append(_build_match_row(None, org, subs[j], next(results)))
+            else:
+                rows.append(_build_skipped_row(None, i, j, org, subs[j], lexical, eligibility))
+    _upsert_matches(rows)
+
+
+def _prefilter_toelichting(lexical_score: float) -> str:
+    return f"Voorgefilterd: lexicale score {lexical_score:.2f} te laag, niet door de LLM beoordeeld."
+
+
+def _excluded_toelichting(reason: str) -> str:
+    return f"Uitgesloten: {reason}."
+
+
+def _upsert_matches(rows: Union[List[Dict[str, Any]], pd.DataFrame]) -> None:
+    """
+    Vervang matches voor de paren in `rows` en voeg nieuwe paren toe
+    (zie _merge_matches). rows is een lijst rijen of een matches-blok.
+    """
+    new_df = rows if isinstance(rows, pd.DataFrame) else _matches_frame(rows)
+    if new_df.empty:
+        return
+    set_table(MATCHES_KEY, _merge_matches(get_table(MATCHES_KEY), new_df))
+
+
+def _merge_matches(matches_df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nieuwe matches-tabel: matches_df met de paren uit new_df vervangen of
+    toegevoegd, gesorteerd op match_id.
+
+    Bestaande paren behouden hun match_id; nieuwe paren krijgen ids vanaf
+    het hoogste bestaande id + 1 (zoals next_id). Gevectoriseerd, omdat dit
+    bij een herberekening voor elk blok over de hele tabel loopt.
+    """
+    if new_df.empty:
+        return matches_df
+    if matches_df.empty:
+        new_df = new_df.copy()
+        new_df["match_id"] = np.arange(1, len(new_df) + 1)
+        return new_df
+
+    old_keys = pd.MultiIndex.from_arrays([matches_df["subsidie_id"], matches_df["organisatie_id"]])
+    new_keys = pd.MultiIndex.from_arrays([new_df["subsidie_id"], new_df["organisatie_id"]])
+
+    unique = ~old_keys.duplicated(keep="last")
+    existing_ids = pd.Series(
+        matches_df["match_id"].to_numpy()[unique], index=old_keys[unique]
+    ).reindex(new_keys)
+    missing = existing_ids.isna().to_numpy()
+
+    max_id = pd.to_numeric(matches_df["match_id"], errors="coerce").max()
+    next_match_id = 1 if pd.isna(max_id) else int(max_id) + 1
+    match_ids = existing_ids.to_numpy(dtype=float, na_value=np.nan)
+    match_ids[missing] = np.arange(next_match_id, next_match_id + int(missing.sum()))
+
+    new_df = new_df.copy()
+    new_df["match_id"] = match_ids.astype(int)
+
+    kept = matches_df[~old_keys.isin(new_keys)]
+    # Alle paren vervangen: geen concat met een leeg frame (dat verandert dtypes)
+    merged = pd.concat([kept, new_df], ignore_index=True) if len(kept) else new_df
+    return merged.sort_values("match_id", kind="stable", ignore_index=True)
+
+
+def _matches_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Bouw een matches-DataFrame uit rijen (of een leeg frame met het juiste schema)."""
+    if rows:
+        matches_df = pd.DataFrame(rows)
+        matches_df["datum_toegevoegd"] = pd.to_datetime(matches_df["datum_toegevoegd"])
+        # Nullable integer: voorgefilterde paren hebben geen score
+        matches_df["match_score"] = matches_df["match_score"].astype("Int64")
+        return matches_df
+
+    return pd.DataFrame(
+        columns=[
+            "match_id",
+            "subsidie_id",
+            "organisatie_id",
+            "persona_id",
+            "type",
+            "match_score",
+            "match_toelichting",
+            "datum_toegevoegd",
+            "status",
+        ]
+    )
+
+
+def _score_pairs(
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    prompt_template: str,
+    llm_client,
+    max_workers: int,
+    batch_size: int = 1,
+    prompt_layout: str = LAYOUT_TEMPLATE,
+) -> List[Dict[str, Any]]:
+    """
+    Scoor een lijst (organisatie, subsidie)-paren.
+
+    Retourneert de LLM-resultaten in dezelfde volgorde als `pairs`,
+    ongeacht in welke volgorde de calls klaar zijn.
+
+    Met batch_size > 1 worden opeenvolgende paren van dezelfde organisatie
+    gebundeld tot één batch-call van maximaal batch_size subsidies.
+    """
+    if batch_size > 1:
+        tasks = _group_by_org(pairs, batch_size)
+
+        def _run(task):
+            org, subs = task
+            return llm_client.score_org_subsidies_batch(
+                prompt_template, org, subs, prompt_layout
+            )
+
+    else:
+        tasks = pairs
+
+        def _run(task):
+            org, sub = task
+            return [
+                llm_client.score_match_org_subsidy(
+                    prompt_template=prompt_template,
+                    org=org,
+                    subsidie=sub,
+                    layout=prompt_layout,
+                )
+            ]
+
+    if max_workers <= 1 or len(tasks) <= 1:
+        nested = [_run(task) for task in tasks]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # executor.map levert resultaten in invoervolgorde op; bind geeft
+            # de meetlabels van deze run mee aan de worker-threads.
+            nested = list(executor.map(bind(_run), tasks))
+
+    return [result for results in nested for result in results]
+
+
+def _group_by_org(
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    batch_size: int,
+) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Bundel opeenvolgende paren met dezelfde organisatie tot
+    (organisatie, [subsidies]) van maximaal batch_size subsidies.
+    """
+    groups: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+    for org, sub in pairs:
+        if (
+            groups
+            and groups[-1][0]["organisatie_id"] == org["organisatie_id"]
+            and len(groups[-1][1]) < batch_size
+        ):
+            groups[-1][1].append(sub)
+        else:
+            groups.append((org, [sub]))
+    return groups
 
 
 def _compute_single_match_org(
@@ -78,6 +1746,8 @@ def _compute_single_match_org(
     subsidie: Dict[str, Any],
     prompt_template: str,
     llm_client,
+    match_id: int,
+    prompt_layout: str = LAYOUT_TEMPLATE,
 ) -> Dict[str, Any]:
     """
     Bereken match voor één organisatie + één subsidie.
@@ -86,38 +1756,126 @@ def _compute_single_match_org(
         prompt_template=prompt_template,
         org=org,
         subsidie=subsidie,
+        layout=prompt_layout,
     )
+    return _build_match_row(match_id, org, subsidie, result)
 
-    match_id = _temp_match_id()
+
+def _build_match_row(
+    match_id: Optional[int],
+    org: Dict[str, Any],
+    subsidie: Dict[str, Any],
+    result: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Zet een LLM-resultaat om naar een rij voor de matches-tabel.
+    """
     today = datetime.today()
 
+    # Een mislukte call krijgt geen (nep)score maar status "fout"
+    failed = result.get("status") == STATUS_FOUT
+
     return {
         "match_id": match_id,
         "subsidie_id": subsidie["subsidie_id"],
         "organisatie_id": org["organisatie_id"],
         "persona_id": None,
         "type": "organisatie",
-        "match_score": int(result.get("match_score", 50)),
+        "match_score": None if failed else int(result.get("match_score", 50)),
         "match_toelichting": "\n".join(result.get("match_toelichting", [])),
         "datum_toegevoegd": today,
+        "status": STATUS_FOUT if failed else STATUS_GESCOORD,
     }
 
 
+def _build_prefiltered_row(
+    match_id: int,
+    org: Dict[str, Any],
+    subsidie: Dict[str, Any],
+    lexical_score: float,
+) -> Dict[str, Any]:
+    """
+    Rij voor een paar dat door de lexicale voorselectie niet naar de LLM ging.
+    """
+    return {
+        "match_id": match_id,
+        "subsidie_id": subsidie["subsidie_id"],
+        "organisatie_id": org["organisatie_id"],
+        "persona_id": None,
+        "type": "organisatie",
+        "match_score": None,
+        "match_toelichting": _prefilter_toelichting(lexical_score),
+        "datum_toegevoegd": datetime.today(),
+        "status": STATUS_VOORGEFILTERD,
+    }
 
-# Voor een volledige reset van matches maken we tijdelijke ID's;
-# bij CRUD-operaties in de UI kun je next_id(MATCHES_KEY, "match_id") gebruiken.
-_TEMP_MATCH_COUNTER_KEY = "_temp_match_counter"
 
+def _build_excluded_row(
+    match_id: Optional[int],
+    org: Dict[str, Any],
+    subsidie: Dict[str, Any],
+    reason: str,
+) -> Dict[str, Any]:
+    """
+    Rij voor een paar dat niet aan de harde voorwaarden van de subsidie voldoet.
+    """
+    return {
+        "match_id": match_id,
+        "subsidie_id": subsidie["subsidie_id"],
+        "organisatie_id": org["organisatie_id"],
+        "persona_id": None,
+        "type": "organisatie",
+        "match_score": None,
+        "match_toelichting": _excluded_toelichting(reason),
+        "datum_toegevoegd": datetime.today(),
+        "status": STATUS_UITGESLOTEN,
+    }
+
+
+def _build_skipped_row(
+    match_id: int,
+    i: int,
+    j: int,
+    org: Dict[str, Any],
+    subsidie: Dict[str, Any],
+    lexical: Optional[np.ndarray],
+    eligibility: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Rij voor een niet-kandidaat: uitgesloten door een voorwaarde of voorgefilterd."""
+    reason = exclusion_reason(eligibility, i, j)
+    if reason is not None:
+        return _build_excluded_row(match_id, org, subsidie, reason)
+    return _build_prefiltered_row(match_id, org, subsidie, lexical[i, j])
 
-def _temp_match_id() -> int:
+
+def _build_out_of_budget_row(
+    match_id: int,
+    org: Dict[str, Any],
+    subsidie: Dict[str, Any],
+    previous: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
     """
-    Eenvoudige teller voor match_id binnen één recompute-run.
+    Rij voor een kandidaat-paar dat niet meer binnen het budget paste.
+    Een eerdere score (met toelichting en datum) blijft behouden.
     """
-    if _TEMP_MATCH_COUNTER_KEY not in st.session_state:
-        st.session_state[_TEMP_MATCH_COUNTER_KEY] = 1
-    val = st.session_state[_TEMP_MATCH_COUNTER_KEY]
-    st.session_state[_TEMP_MATCH_COUNTER_KEY] = val + 1
-    return int(val)
+    row = {
+        "match_id": match_id,
+        "subsidie_id": subsidie["subsidie_id"],
+        "organisatie_id": org["organisatie_id"],
+        "persona_id": None,
+        "type": "organisatie",
+        "match_score": None,
+        "match_toelichting": "Buiten budget: in deze run niet door de LLM beoordeeld.",
+        "datum_toegevoegd": datetime.today(),
+        "status": STATUS_BUITEN_BUDGET,
+    }
+    if previous is not None:
+        row["match_score"] = previous["match_score"]
+        row["match_toelichting"] = (
+            "Buiten budget: score uit een eerdere run.\n" + str(previous["match_toelichting"])
+        )
+        row["datum_toegevoegd"] = previous["datum_toegevoegd"]
+    return row
 
 
 def update_prompt_template(new_template: str) -> None:
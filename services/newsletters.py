@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 
@@ -15,6 +15,11 @@ from data.data_store import (
     next_id,
     set_table,
 )
+from services.jobs import Job, submit_session_job
+
+
+# Soort-aanduiding voor nieuwsbriefjobs in de jobrunner
+NEWSLETTER_JOB_KIND = "nieuwsbrieven"
 
 
 def generate_newsletter_for_org(
@@ -30,15 +35,66 @@ def generate_newsletter_for_org(
     Retourneert het aangemaakte nieuwsbriefrecord als dict.
     """
     organisations_df = get_table(ORGANISATIONS_KEY)
-    subsidies_df = get_table(SUBSIDIES_KEY)
-    matches_df = get_table(MATCHES_KEY)
-    newsletters_df = get_table(NEWSLETTERS_KEY)
 
     org_row = organisations_df.loc[organisations_df["organisatie_id"] == organisatie_id]
     if org_row.empty:
         raise ValueError(f"Organisatie met id {organisatie_id} niet gevonden.")
 
-    org = org_row.iloc[0].to_dict()
+    new_row = _compose_newsletter(
+        org_row.iloc[0].to_dict(),
+        get_table(SUBSIDIES_KEY),
+        get_table(MATCHES_KEY),
+        weeks_back,
+    )
+    return _append_newsletters([new_row])[0]
+
+
+def start_newsletter_job(
+    organisatie_ids: Optional[List[int]] = None,
+    weeks_back: Optional[int] = None,
+) -> Job:
+    """
+    Genereer nieuwsbrieven voor meerdere organisaties (standaard: alle)
+    als achtergrondjob. De nieuwsbrieven worden bij overdracht aan de
+    nieuwsbrieventabel toegevoegd.
+    """
+    organisations_df = get_table(ORGANISATIONS_KEY).copy()
+    subsidies_df = get_table(SUBSIDIES_KEY).copy()
+    matches_df = get_table(MATCHES_KEY).copy()
+
+    if organisatie_ids is not None:
+        organisations_df = organisations_df[
+            organisations_df["organisatie_id"].isin(organisatie_ids)
+        ]
+    orgs = organisations_df.to_dict("records")
+
+    def run(job: Job) -> List[Dict[str, Any]]:
+        rows = []
+        for i, org in enumerate(orgs, start=1):
+            job.check_cancelled()
+            rows.append(_compose_newsletter(org, subsidies_df, matches_df, weeks_back))
+            job.report(done=i, total=len(orgs))
+        return rows
+
+    return submit_session_job(
+        NEWSLETTER_JOB_KIND,
+        f"Nieuwsbrieven voor {len(orgs)} organisaties",
+        run,
+        _append_newsletters,
+    )
+
+
+def _compose_newsletter(
+    org: Dict[str, Any],
+    subsidies_df: pd.DataFrame,
+    matches_df: pd.DataFrame,
+    weeks_back: Optional[int],
+) -> Dict[str, Any]:
+    """
+    Stel de inhoud van één nieuwsbrief samen (nog zonder nieuwsbrief_id).
+    Leest niets uit st.session_state, zodat dit ook in een achtergrondjob kan.
+    """
+    organisatie_id = org.get("organisatie_id")
     abonnement = org.get("abonnement_type", "basic")
 
     # Standaardlogica voor vensterbreedte per abonnement
@@ -67,6 +123,7 @@ def generate_newsletter_for_org(
             (matches_df["organisatie_id"] == organisatie_id)
             & (matches_df["subsidie_id"].isin(relevant_subsidies["subsidie_id"]))
             & (matches_df["type"] == "organisatie")
+            & (matches_df["match_score"].notna())
         ]
 
         if org_matches.empty:
@@ -115,18 +172,30 @@ def generate_newsletter_for_org(
 
         content = "\n".join(content_lines)
 
-    nieuwsbrief_id = next_id(NEWSLETTERS_KEY, "nieuwsbrief_id")
-
-    new_row = {
-        "nieuwsbrief_id": nieuwsbrief_id,
+    return {
         "organisatie_id": organisatie_id,
         "organisatie_naam": org.get("organisatie_naam"),
         "nieuwsbrief_datum": today,
         "nieuwsbrief_content": content,
     }
 
+
+def _append_newsletters(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Geef de rijen een nieuwsbrief_id en voeg ze toe aan de nieuwsbrieventabel.
+    """
+    if not rows:
+        return []
+
+    newsletters_df = get_table(NEWSLETTERS_KEY)
+    first_id = next_id(NEWSLETTERS_KEY, "nieuwsbrief_id")
+    new_rows = [
+        {"nieuwsbrief_id": first_id + i, **row}
+        for i, row in enumerate(rows)
+    ]
+
     newsletters_df = pd.concat(
-        [newsletters_df, pd.DataFrame([new_row])],
+        [newsletters_df, pd.DataFrame(new_rows)],
         ignore_index=True,
     )
     newsletters_df["nieuwsbrief_datum"] = pd.to_datetime(
@@ -135,7 +204,7 @@ def generate_newsletter_for_org(
 
     set_table(NEWSLETTERS_KEY, newsletters_df)
 
-    return new_row
+    return new_rows
 
 
 def get_newsletters_for_org(organisatie_id: int) -> pd.DataFrame:
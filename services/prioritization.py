@@ -0,0 +1,107 @@
+# services/prioritization.py
+"""
+Prioriteitsvolgorde voor herberekeningen met een tijd- of callbudget.
+
+Als niet alle paren binnen het budget gescoord kunnen worden, willen we
+eerst de paren die het meest waarschijnlijk relevant en urgent zijn. De
+prioriteit per paar is een gewogen som van drie goedkope signalen:
+
+- prior: lexicale BM25-score (per organisatie genormaliseerd naar 0–1),
+  plus een bonus bij gelijke sector als de subsidie een sector heeft;
+- urgentie: hoe dichter de sluitingsdatum, hoe hoger (gesloten of
+  onbekend = 0);
+- nieuw: paren die nog nooit een LLM-score kregen gaan voor.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+PRIOR_WEIGHT = 1.0
+SECTOR_BONUS = 0.5
+URGENCY_WEIGHT = 1.0
+NEVER_SCORED_WEIGHT = 1.0
+
+# Sluitingsdatum binnen zoveel dagen geeft maximale urgentie; daarna lineair
+# aflopend tot 0 bij URGENCY_HORIZON_DAYS.
+URGENCY_FULL_DAYS = 14
+URGENCY_HORIZON_DAYS = 365
+
+
+def pair_priority(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    lexical: np.ndarray,
+    previous_matches: Optional[pd.DataFrame] = None,
+    today: Optional[datetime] = None,
+) -> np.ndarray:
+    """
+    Prioriteit als matrix (organisaties × subsidies); hoger = eerder scoren.
+    """
+    n_orgs, n_subs = len(organisations_df), len(subsidies_df)
+    if n_orgs == 0 or n_subs == 0:
+        return np.zeros((n_orgs, n_subs), dtype=float)
+
+    priority = PRIOR_WEIGHT * _lexical_prior(lexical)
+    priority = priority + SECTOR_BONUS * _same_sector(organisations_df, subsidies_df)
+    priority = priority + URGENCY_WEIGHT * _urgency(subsidies_df, today).reshape(1, -1)
+    priority = priority + NEVER_SCORED_WEIGHT * ~scored_before(
+        organisations_df, subsidies_df, previous_matches
+    )
+    return priority
+
+
+def scored_before(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    previous_matches: Optional[pd.DataFrame],
+) -> np.ndarray:
+    """Booleaanse matrix: heeft dit paar al eens een matchscore gekregen?"""
+    mask = np.zeros((len(organisations_df), len(subsidies_df)), dtype=bool)
+    if previous_matches is None or previous_matches.empty:
+        return mask
+
+    scored = previous_matches[previous_matches["match_score"].notna()]
+    org_idx = pd.Index(organisations_df["organisatie_id"]).get_indexer(scored["organisatie_id"])
+    sub_idx = pd.Index(subsidies_df["subsidie_id"]).get_indexer(scored["subsidie_id"])
+    known = (org_idx >= 0) & (sub_idx >= 0)
+    mask[org_idx[known], sub_idx[known]] = True
+    return mask
+
+
+def _lexical_prior(lexical: np.ndarray) -> np.ndarray:
+    row_max = lexical.max(axis=1, keepdims=True)
+    return np.divide(lexical, row_max, out=np.zeros_like(lexical), where=row_max > 0)
+
+
+def _same_sector(organisations_df: pd.DataFrame, subsidies_df: pd.DataFrame) -> np.ndarray:
+    if "sector" not in organisations_df.columns or "sector" not in subsidies_df.columns:
+        return np.zeros((len(organisations_df), len(subsidies_df)), dtype=bool)
+
+    org_sector = organisations_df["sector"].to_numpy(dtype=object)
+    sub_sector = subsidies_df["sector"].to_numpy(dtype=object)
+    codes, _ = pd.factorize(np.concatenate([org_sector, sub_sector]))
+    org_codes = codes[: len(org_sector)].reshape(-1, 1)
+    sub_codes = codes[len(org_sector):].reshape(1, -1)
+    # Code -1 = ontbrekende sector; die telt nooit als overeenkomst
+    return (org_codes == sub_codes) & (org_codes >= 0)
+
+
+def _urgency(subsidies_df: pd.DataFrame, today: Optional[datetime]) -> np.ndarray:
+    if "sluitingsdatum" not in subsidies_df.columns:
+        return np.zeros(len(subsidies_df), dtype=float)
+
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    days_left = (pd.to_datetime(subsidies_df["sluitingsdatum"]) - today).dt.days.to_numpy(
+        dtype=float, na_value=np.nan
+    )
+
+    urgency = 1.0 - (days_left - URGENCY_FULL_DAYS) / (URGENCY_HORIZON_DAYS - URGENCY_FULL_DAYS)
+    urgency = np.clip(urgency, 0.0, 1.0)
+    # Gesloten of zonder sluitingsdatum: geen urgentie
+    urgency[np.isnan(days_left) | (days_left < 0)] = 0.0
+    return urgency
@@ -0,0 +1,339 @@
+# services/prompt_budget.py
+"""
+Tokenbudget voor gerenderde prompts.
+
+Lange velden zoals subsidie_tekst_volledig en organisatieprofiel gaan
+standaard volledig mee in de prompt. Echte regelingsteksten (RVO, ZonMw)
+zijn duizenden tokens lang: dat kost tijd en geld en past soms niet in het
+contextvenster. Met een budget wordt de gerenderde prompt begrensd:
+
+- de prompt wordt eerst normaal gerenderd en geteld;
+- is hij te lang, dan worden de velden in BUDGET_FIELDS (configureerbare
+  prioriteitsvolgorde: het eerste veld wordt het eerst ingekort) één voor
+  één ingekort tot de prompt binnen het budget valt;
+- inkorten kiest de meest relevante alinea's van het veld: alinea's met de
+  meeste woorden uit de ankervelden van dezelfde entiteit (zoals
+  voor_wie en samenvatting_eisen bij de subsidietekst), met een lichte
+  voorkeur voor het begin. De gekozen alinea's blijven in hun oorspronkelijke
+  volgorde; weggelaten stukken worden gemarkeerd met "[…]".
+
+Het resterende budget per veld wordt afgerond op BUDGET_STEP_TOKENS, zodat
+paren met dezelfde subsidie meestal dezelfde ingekorte tekst krijgen (goed
+voor de fragmentcache en de prompt-cache van de provider).
+
+Tokens worden geteld met tiktoken als dat geïnstalleerd is, anders met de
+vuistregel van ~4 tekens per token (zie services.rate_limit.estimate_tokens).
+
+Instellen via de omgeving:
+- SUBSIDIEMATCH_PROMPT_TOKEN_BUDGET: maximum aantal prompttokens (0 = uit);
+- SUBSIDIEMATCH_PROMPT_BUDGET_FIELDS: kommagescheiden prioriteitsvolgorde.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optioneel; zonder tiktoken tellen we tekens
+    tiktoken = None
+
+from services.prompt_templates import (
+    LAYOUT_TEMPLATE,
+    ORG_PROMPT_FIELDS,
+    CompiledPrompt,
+)
+
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("SUBSIDIEMATCH_PROMPT_TOKEN_BUDGET", "0"))
+
+# Velden die ingekort mogen worden, in volgorde: het eerste veld gaat eerst
+DEFAULT_BUDGET_FIELDS = (
+    "subsidie_tekst_volledig",
+    "organisatieprofiel",
+    "samenvatting_eisen",
+    "voor_wie",
+)
+
+# Per in te korten veld: velden van dezelfde entiteit die bepalen welke
+# alinea's relevant zijn
+ANCHOR_FIELDS = {
+    "subsidie_tekst_volledig": ("subsidie_naam", "voor_wie", "samenvatting_eisen"),
+    "organisatieprofiel": ("organisatie_naam", "sector", "type_organisatie"),
+    "samenvatting_eisen": ("subsidie_naam", "voor_wie"),
+    "voor_wie": ("subsidie_naam", "samenvatting_eisen"),
+}
+
+# Een veld wordt nooit korter dan dit, ook als het budget dan overschreden wordt
+MIN_FIELD_TOKENS = 64
+BUDGET_STEP_TOKENS = 64
+
+CHARS_PER_TOKEN = 4
+OMISSION_MARKER = "[…]"
+
+# Ingekorte veldwaarden in het geheugen; daarboven wordt de cache geleegd
+SHORTENED_CACHE_MAX_ENTRIES = 20_000
+
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+")
+_WORD = re.compile(r"\w{3,}")
+
+
+# --------------------------------------------------------
+# TOKENS TELLEN
+# --------------------------------------------------------
+def token_counter(model: Optional[str] = None) -> Tuple[Callable[[str], int], Callable[[str, int], str]]:
+    """
+    (tel, afkappen) voor het model: tiktoken als dat beschikbaar is, anders
+    de tekenvuistregel. afkappen(tekst, n) geeft het begin van de tekst
+    van hoogstens n tokens.
+    """
+    encoding = _tiktoken_encoding(model)
+    if encoding is None:
+        return _count_chars, _truncate_chars
+
+    def count(text: str) -> int:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(text: str, max_tokens: int) -> str:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+    return count, truncate
+
+
+def _tiktoken_encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Bijvoorbeeld geen netwerk om de encoding op te halen
+            return None
+
+
+def _count_chars(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate_chars(text: str, max_tokens: int) -> str:
+    return text[: max_tokens * CHARS_PER_TOKEN]
+
+
+# --------------------------------------------------------
+# ALINEA'S KIEZEN
+# --------------------------------------------------------
+def select_paragraphs(
+    text: str,
+    max_tokens: int,
+    anchor_text: str,
+    count: Callable[[str], int] = _count_chars,
+    truncate: Callable[[str, int], str] = _truncate_chars,
+) -> str:
+    """
+    Kort text in tot hoogstens max_tokens door de meest relevante alinea's
+    te houden (zie de moduledocstring). Eén te lange alinea wordt eerst in
+    zinnen gesplitst; past ook de beste zin niet, dan wordt hij afgekapt op
+    een woordgrens.
+    """
+    if count(text) <= max_tokens:
+        return text
+
+    pieces = [p.strip() for p in _PARAGRAPH_SPLIT.split(text) if p.strip()]
+    separator = "\n\n"
+    if len(pieces) <= 1:
+        pieces = [p for p in _SENTENCE_SPLIT.split(text.strip()) if p]
+        separator = " "
+
+    anchor = set(_WORD.findall(anchor_text.lower()))
+    scored = []
+    for position, piece in enumerate(pieces):
+        words = _WORD.findall(piece.lower())
+        overlap = sum(word in anchor for word in words)
+        relevance = overlap / math.sqrt(len(words)) if words else 0.0
+        # Lichte voorkeur voor het begin: daar staan meestal doel en doelgroep
+        scored.append((relevance + 0.5 / (1 + position), position))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    marker_cost = count(separator + OMISSION_MARKER)
+    chosen: List[int] = []
+    used = 0
+    for _, position in scored:
+        cost = count(pieces[position]) + marker_cost
+        if used + cost <= max_tokens:
+            chosen.append(position)
+            used += cost
+
+    if not chosen:
+        # Zelfs de beste alinea past niet: die dan afkappen
+        best = pieces[scored[0][1]]
+        cut = truncate(best, max(max_tokens - marker_cost, 1))
+        head, space, _ = cut.rpartition(" ")
+        return (head if space else cut).rstrip() + " " + OMISSION_MARKER
+
+    chosen.sort()
+    out: List[str] = []
+    previous = -1
+    for position in chosen:
+        if position != previous + 1:
+            out.append(OMISSION_MARKER)
+        out.append(pieces[position])
+        previous = position
+    if previous != len(pieces) - 1:
+        out.append(OMISSION_MARKER)
+    return separator.join(out)
+
+
+# --------------------------------------------------------
+# BUDGET
+# --------------------------------------------------------
+class PromptBudget:
+    """
+    Maximum aantal prompttokens met de velden die daarvoor ingekort mogen
+    worden. Houdt bij hoeveel prompts zijn ingekort en hoeveel tokens dat
+    scheelde. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        fields: Sequence[str] = DEFAULT_BUDGET_FIELDS,
+        model: Optional[str] = None,
+        min_field_tokens: int = MIN_FIELD_TOKENS,
+    ):
+        self.max_tokens = max_tokens
+        self.fields = tuple(fields)
+        self.min_field_tokens = min_field_tokens
+        self.count, self._truncate = token_counter(model)
+        self.exact = self.count is not _count_chars
+
+        self._lock = threading.Lock()
+        self._shortened: Dict[Tuple[str, str, str, int], str] = {}
+        self.prompts = 0
+        self.truncated = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def describe(self) -> Dict[str, Any]:
+        """Instellingen die de uitkomst bepalen (voor checkpoint-fingerprints)."""
+        return {"max_tokens": self.max_tokens, "fields": list(self.fields)}
+
+    def render(
+        self,
+        compiled: CompiledPrompt,
+        org: Dict[str, Any],
+        subsidie: Dict[str, Any],
+        layout: str = LAYOUT_TEMPLATE,
+    ) -> str:
+        """Render de prompt en kort zo nodig velden in tot hij binnen het budget valt."""
+        return self._fit(compiled, org, subsidie, layout)[2]
+
+    def fit(
+        self,
+        compiled: CompiledPrompt,
+        org: Dict[str, Any],
+        subsidie: Dict[str, Any],
+        layout: str = LAYOUT_TEMPLATE,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Organisatie en subsidie met de velden zoals render ze zou inkorten.
+        Voor prompts die uit losse blokken worden opgebouwd (batch-calls).
+        """
+        org, subsidie, _ = self._fit(compiled, org, subsidie, layout)
+        return org, subsidie
+
+    def _fit(
+        self,
+        compiled: CompiledPrompt,
+        org: Dict[str, Any],
+        subsidie: Dict[str, Any],
+        layout: str,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+        prompt = compiled.render(org, subsidie, layout)
+        before = self.count(prompt)
+        after = before
+        entities = {"org": org, "subsidie": subsidie}
+
+        if before > self.max_tokens:
+            over = before - self.max_tokens
+            for field in self.fields:
+                if field not in compiled.placeholders:
+                    continue
+                side = "org" if field in ORG_PROMPT_FIELDS else "subsidie"
+                value = entities[side].get(field)
+                if not isinstance(value, str) or not value:
+                    continue
+
+                field_tokens = self.count(value)
+                allowance = field_tokens - over
+                # Afronden naar beneden op een vaste stap, zodat paren met
+                # dezelfde entiteit vaak dezelfde ingekorte tekst krijgen
+                allowance = max(
+                    allowance // BUDGET_STEP_TOKENS * BUDGET_STEP_TOKENS, self.min_field_tokens
+                )
+                if allowance >= field_tokens:
+                    continue
+
+                shortened = self._shorten(field, value, allowance, entities[side])
+                entities[side] = dict(entities[side], **{field: shortened})
+                over -= field_tokens - self.count(shortened)
+                if over <= 0:
+                    break
+
+            prompt = compiled.render(entities["org"], entities["subsidie"], layout)
+            after = self.count(prompt)
+
+        with self._lock:
+            self.prompts += 1
+            self.truncated += after < before
+            self.tokens_before += before
+            self.tokens_after += after
+        return entities["org"], entities["subsidie"], prompt
+
+    def _shorten(self, field: str, value: str, allowance: int, entity: Dict[str, Any]) -> str:
+        anchor_text = " ".join(str(entity.get(name) or "") for name in ANCHOR_FIELDS.get(field, ()))
+        # De ankertekst bepaalt welke alinea's blijven: zelfde tekst met een
+        # ander anker is een andere inkorting
+        anchor_hash = hashlib.sha1(anchor_text.encode("utf-8")).hexdigest()
+        key = (field, value, anchor_hash, allowance)
+        cached = self._shortened.get(key)
+        if cached is not None:
+            return cached
+
+        shortened = select_paragraphs(value, allowance, anchor_text, self.count, self._truncate)
+        with self._lock:
+            if len(self._shortened) >= SHORTENED_CACHE_MAX_ENTRIES:
+                self._shortened.clear()
+            self._shortened[key] = shortened
+        return shortened
+
+    def snapshot(self) -> Dict[str, int]:
+        """Tellers sinds de start van het proces."""
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "truncated": self.truncated,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+            }
+
+
+def prompt_budget_from_env(model: Optional[str] = None) -> Optional[PromptBudget]:
+    """Budget uit SUBSIDIEMATCH_PROMPT_TOKEN_BUDGET, of None als het uit staat."""
+    if DEFAULT_TOKEN_BUDGET <= 0:
+        return None
+    fields_env = os.getenv("SUBSIDIEMATCH_PROMPT_BUDGET_FIELDS")
+    fields = (
+        tuple(field.strip() for field in fields_env.split(",") if field.strip())
+        if fields_env
+        else DEFAULT_BUDGET_FIELDS
+    )
+    return PromptBudget(DEFAULT_TOKEN_BUDGET, fields, model=model)
@@ -0,0 +1,280 @@
+# services/prompt_templates.py
+"""
+Gecompileerde prompt-templates.
+
+Een prompt-template bevat placeholders voor organisatievelden en
+subsidievelden. In plaats van per paar een volledige context-dict te
+bouwen en het hele template met format_map te vullen, wordt het template
+één keer geparsed en opgesplitst in opeenvolgende stukken die alleen van
+de organisatie, alleen van de subsidie of van geen van beide afhangen.
+
+Die stukken worden één keer per organisatie en één keer per subsidie
+gerenderd (en bewaard); per paar blijft alleen een concatenatie over.
+De uitkomst is tekst-voor-tekst gelijk aan
+template.format_map(_SafeDict(context)).
+
+Met een andere layout (zie PROMPT_LAYOUTS) worden dezelfde stukken in een
+volgorde gezet die de prompt-cache van de provider beter benut: eerst alle
+vaste tekst (rol, instructie, JSON-formaat), dan het blok van de entiteit
+die tijdens een run gelijk blijft, en als laatste de wisselende entiteit.
+Opeenvolgende calls delen dan een zo lang mogelijk gemeenschappelijk begin.
+"""
+from __future__ import annotations
+
+import threading
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Velden die vanuit organisatie en subsidie in de prompt-context komen.
+ORG_PROMPT_FIELDS = (
+    "organisatie_id",
+    "organisatie_naam",
+    "sector",
+    "type_organisatie",
+    "locatie",
+    "omzet",
+    "aantal_medewerkers",
+    "abonnement_type",
+    "website_link",
+    "organisatieprofiel",
+)
+
+SUBSIDIE_PROMPT_FIELDS = (
+    "subsidie_id",
+    "subsidie_naam",
+    "bron",
+    "datum_toegevoegd",
+    "sluitingsdatum",
+    "subsidiebedrag",
+    "voor_wie",
+    "samenvatting_eisen",
+    "subsidie_tekst_volledig",
+    "weblink",
+    # Afgeleid: beknopte samenvatting, zie services.subsidy_summaries
+    "subsidie_samenvatting",
+)
+
+# Soorten stukken in een gecompileerd template
+PART_TEKST = "tekst"
+PART_ORG = "org"
+PART_SUBSIDIE = "subsidie"
+
+# Volgorde van de stukken in de prompt:
+# - "template": precies zoals het template is geschreven;
+# - "org_vast": vaste tekst, dan organisatie, dan subsidie (organisatie-major
+#   doorlopen, zodat opeenvolgende calls dezelfde organisatie delen);
+# - "subsidie_vast": vaste tekst, dan subsidie, dan organisatie
+#   (subsidie-major doorlopen).
+LAYOUT_TEMPLATE = "template"
+LAYOUT_ORG_VAST = "org_vast"
+LAYOUT_SUBSIDIE_VAST = "subsidie_vast"
+PROMPT_LAYOUTS = (LAYOUT_TEMPLATE, LAYOUT_ORG_VAST, LAYOUT_SUBSIDIE_VAST)
+
+# Maximaal aantal gerenderde stukken per soort in het geheugen; daarboven
+# wordt de cache geleegd (een volledige herberekening loopt per organisatie
+# alle subsidies door, dus LRU zou hier niets winnen).
+FRAGMENT_CACHE_MAX_ENTRIES = 50_000
+
+# Aantal gecompileerde templates dat bewaard blijft
+COMPILED_CACHE_MAX_ENTRIES = 16
+
+
+class _SafeDict(dict):
+    """
+    Voorkomt KeyErrors in str.format_map().
+    Mist een key → return "".
+    """
+
+    def __missing__(self, key):
+        return ""
+
+
+class CompiledPrompt:
+    """
+    Eén prompt-template, geparsed en opgesplitst per soort veld.
+    """
+
+    def __init__(
+        self,
+        template: str,
+        org_fields: Tuple[str, ...] = ORG_PROMPT_FIELDS,
+        subsidie_fields: Tuple[str, ...] = SUBSIDIE_PROMPT_FIELDS,
+    ):
+        self.template = template
+        self.placeholders: List[str] = []
+        self.unknown_placeholders: List[str] = []
+
+        # Opeenvolgende stukken: (soort, template-fragment, gebruikte velden)
+        self.parts: List[Tuple[str, str, Tuple[str, ...]]] = []
+
+        kind = PART_TEKST
+        fragment: List[str] = []
+        fields: List[str] = []
+        trailing = ""
+
+        # Formatter.parse geeft een ValueError bij ongeldige accolades
+        for literal, field_name, format_spec, conversion in Formatter().parse(template):
+            # Ge-escapete accolades komen als losse stukken tekst zonder veld
+            trailing += literal.replace("{", "{{").replace("}", "}}")
+            if field_name is None:
+                continue
+            fragment.append(trailing)
+            trailing = ""
+
+            base = _base_name(field_name)
+            if base not in self.placeholders:
+                self.placeholders.append(base)
+
+            if base in org_fields:
+                field_kind = PART_ORG
+            elif base in subsidie_fields:
+                field_kind = PART_SUBSIDIE
+            else:
+                # Onbekend: wordt altijd leeg ingevuld, past dus in elk stuk
+                if base not in self.unknown_placeholders:
+                    self.unknown_placeholders.append(base)
+                field_kind = kind
+
+            if kind == PART_TEKST and field_kind != PART_TEKST:
+                # Inleidende tekst tot de laatste witregel is vast; de rest
+                # (kopje, "ID: ") hoort bij het eerste entiteitblok
+                intro, sep, header = fragment[-1].rpartition("\n\n")
+                if sep:
+                    self.parts.append((PART_TEKST, "".join(fragment[:-1]) + intro + sep, ()))
+                    fragment = [header]
+            elif kind not in (PART_TEKST, field_kind):
+                self.parts.append((kind, "".join(fragment[:-1]), tuple(fields)))
+                fragment = fragment[-1:]
+                fields = []
+            kind = field_kind if field_kind != PART_TEKST else kind
+
+            fragment.append(
+                "{"
+                + field_name
+                + (f"!{conversion}" if conversion else "")
+                + (f":{format_spec}" if format_spec else "")
+                + "}"
+            )
+            # Onbekende velden blijven buiten de context, zodat _SafeDict ze leeg laat
+            if base not in fields and base not in self.unknown_placeholders:
+                fields.append(base)
+
+        if kind == PART_TEKST:
+            self.parts.append((kind, "".join(fragment) + trailing, tuple(fields)))
+        else:
+            # Slottekst na de eerste witregel (zoals de instructie) als eigen
+            # vast stuk, zodat een layout hem naar voren kan halen
+            tail, sep, closing = trailing.partition("\n\n")
+            if not sep:
+                tail, closing = "", trailing
+            self.parts.append((kind, "".join(fragment) + tail + sep, tuple(fields)))
+            if closing:
+                self.parts.append((PART_TEKST, closing, ()))
+
+        self._caches: Dict[str, Dict[Any, str]] = {
+            PART_TEKST: {},
+            PART_ORG: {},
+            PART_SUBSIDIE: {},
+        }
+        self._lock = threading.Lock()
+
+    def render(
+        self,
+        org: Dict[str, Any],
+        subsidie: Dict[str, Any],
+        layout: str = LAYOUT_TEMPLATE,
+    ) -> str:
+        """Prompt voor één paar: alleen concatenatie van per entiteit gerenderde stukken."""
+        pieces = []
+        for index in self._order(layout):
+            kind = self.parts[index][0]
+            if kind == PART_ORG:
+                pieces.append(self._render_part(index, org))
+            elif kind == PART_SUBSIDIE:
+                pieces.append(self._render_part(index, subsidie))
+            else:
+                pieces.append(self._render_part(index, {}))
+        return "".join(pieces)
+
+    def render_kind(self, kind: str, entity: Dict[str, Any]) -> str:
+        """
+        Alle stukken van één soort (PART_TEKST, PART_ORG of PART_SUBSIDIE)
+        achter elkaar, in templatevolgorde. Voor batch-prompts, waarin één
+        organisatieblok en meerdere subsidieblokken staan.
+        """
+        return "".join(
+            self._render_part(index, entity)
+            for index, part in enumerate(self.parts)
+            if part[0] == kind
+        )
+
+    def _order(self, layout: str) -> List[int]:
+        """Indexen van de stukken in de volgorde van de layout."""
+        indexes = list(range(len(self.parts)))
+        if layout == LAYOUT_TEMPLATE:
+            return indexes
+        if layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Onbekende prompt-layout: {layout}")
+
+        fixed, varying = (
+            (PART_ORG, PART_SUBSIDIE) if layout == LAYOUT_ORG_VAST else (PART_SUBSIDIE, PART_ORG)
+        )
+        rank = {PART_TEKST: 0, fixed: 1, varying: 2}
+        # sorted is stabiel: binnen een soort blijft de templatevolgorde staan
+        return sorted(indexes, key=lambda index: rank[self.parts[index][0]])
+
+    def _render_part(self, index: int, entity: Dict[str, Any]) -> str:
+        kind, fragment, fields = self.parts[index]
+        values = tuple(entity.get(field, "") for field in fields)
+
+        cache = self._caches[kind]
+        # Types mee in de sleutel: 1 == 1.0 == True, maar ze renderen verschillend
+        key = (index, values, tuple(type(value) for value in values))
+        try:
+            cached = cache.get(key)
+        except TypeError:
+            # Niet-hashbare veldwaarde: gewoon renderen zonder cache
+            cache = cached = None
+        if cached is not None:
+            return cached
+
+        rendered = fragment.format_map(_SafeDict(zip(fields, values)))
+        if cache is not None:
+            with self._lock:
+                if len(cache) >= FRAGMENT_CACHE_MAX_ENTRIES:
+                    cache.clear()
+                cache[key] = rendered
+        return rendered
+
+
+def _base_name(field_name: str) -> str:
+    """Veldnaam zonder attribuut- of indextoegang ("a.b" / "a[0]" → "a")."""
+    for sep in (".", "["):
+        field_name = field_name.split(sep, 1)[0]
+    return field_name
+
+
+# --------------------------------------------------------
+# PROCESBREDE CACHE VAN GECOMPILEERDE TEMPLATES
+# --------------------------------------------------------
+_compiled: Dict[str, CompiledPrompt] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_prompt(template: str) -> CompiledPrompt:
+    """
+    Gecompileerd template, één keer per templatetekst. Een gewijzigde
+    prompt (ook onder dezelfde prompt_id) levert vanzelf een nieuwe
+    compilatie op.
+    """
+    compiled: Optional[CompiledPrompt] = _compiled.get(template)
+    if compiled is not None:
+        return compiled
+
+    compiled = CompiledPrompt(template)
+    with _compiled_lock:
+        if len(_compiled) >= COMPILED_CACHE_MAX_ENTRIES:
+            _compiled.clear()
+        _compiled[template] = compiled
+    return compiled
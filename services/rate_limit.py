@@ -0,0 +1,373 @@
+# services/rate_limit.py
+"""
+Client-side rate limiting en retries voor OpenAI-calls.
+
+- Twee token buckets: requests per minuut en tokens per minuut. Een call
+  wacht tot er in beide emmers genoeg ruimte is.
+- Adaptieve concurrency (AIMD): bij een 429 halveert het aantal
+  gelijktijdige calls, na een reeks successen groeit het weer met één.
+- Retries met exponentiële backoff en jitter bij 429, 5xx, timeouts en
+  verbindingsfouten. Een Retry-After-header van de server gaat voor.
+
+De limiter is procesbreed: de limieten gelden per API-key, niet per sessie.
+Een RPM- of TPM-limiet van 0 betekent onbegrensd; negatieve limieten en
+een concurrency onder 1 worden bij het starten geweigerd.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+def _validate_limits(rpm: int, tpm: int, max_concurrency: int) -> None:
+    """Weiger limieten waarmee de limiter nooit of eindeloos zou wachten."""
+    if rpm < 0:
+        raise ValueError(
+            f"SUBSIDIEMATCH_OPENAI_RPM moet 0 (onbegrensd) of positief zijn, niet {rpm}"
+        )
+    if tpm < 0:
+        raise ValueError(
+            f"SUBSIDIEMATCH_OPENAI_TPM moet 0 (onbegrensd) of positief zijn, niet {tpm}"
+        )
+    if max_concurrency < 1:
+        raise ValueError(
+            f"SUBSIDIEMATCH_OPENAI_MAX_CONCURRENCY moet minstens 1 zijn, niet {max_concurrency}"
+        )
+
+
+DEFAULT_RPM = int(os.getenv("SUBSIDIEMATCH_OPENAI_RPM", "500"))
+DEFAULT_TPM = int(os.getenv("SUBSIDIEMATCH_OPENAI_TPM", "200000"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("SUBSIDIEMATCH_OPENAI_MAX_CONCURRENCY", "16"))
+_validate_limits(DEFAULT_RPM, DEFAULT_TPM, DEFAULT_MAX_CONCURRENCY)
+DEFAULT_MAX_RETRIES = int(os.getenv("SUBSIDIEMATCH_OPENAI_MAX_RETRIES", "5"))
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# Aantal successen op rij voordat de concurrency weer met één omhoog gaat
+RECOVERY_SUCCESSES = 10
+
+# Een burst 429's van calls die al onderweg waren telt als één signaal
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+
+class TokenBucket:
+    """
+    Emmer die per minuut `rate_per_min` eenheden bijvult, tot `capacity`.
+    """
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate_per_sec = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float) -> float:
+        """Neem `amount` uit de emmer; wacht zo nodig. Retourneert de wachttijd."""
+        # Grotere aanvragen dan de emmer kan bevatten zouden eeuwig wachten
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return waited
+                shortage = amount - self._level
+            delay = shortage / self.rate_per_sec
+            time.sleep(delay)
+            waited += delay
+
+    def debit(self, amount: float) -> None:
+        """Achteraf extra verbruik afboeken (mag de emmer negatief maken)."""
+        with self._lock:
+            self._refill()
+            self._level -= amount
+
+    def level(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._level
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate_per_sec)
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    Combineert request- en token-emmers met adaptieve concurrency en
+    houdt tellers bij voor weergave in de UI. Een limiet van 0 heeft geen
+    emmer en begrenst dus niets.
+    """
+
+    def __init__(
+        self,
+        rpm: int = DEFAULT_RPM,
+        tpm: int = DEFAULT_TPM,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+    ):
+        _validate_limits(rpm, tpm, max_concurrency)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+
+        self._cond = threading.Condition()
+        self._limit = max_concurrency
+        self._in_flight = 0
+        self._successes_since_change = 0
+        self._last_decrease = float("-inf")
+
+        self.requests = 0
+        self.tokens_used = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """Wacht op een vrije slot en op ruimte in beide emmers. Retourneert de wachttijd."""
+        started = time.monotonic()
+        with self._cond:
+            while self._in_flight >= self._limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+        try:
+            if self._requests is not None:
+                self._requests.acquire(1)
+            if self._tokens is not None:
+                self._tokens.acquire(estimated_tokens)
+        except BaseException:
+            self._leave()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self.requests += 1
+            self.wait_seconds += waited
+        return waited
+
+    def release(
+        self,
+        throttled: bool = False,
+        estimated_tokens: int = 0,
+        used_tokens: Optional[int] = None,
+        prompt_tokens: Optional[int] = None,
+        cached_tokens: Optional[int] = None,
+    ) -> None:
+        """
+        Geef de slot vrij en pas de concurrency aan (AIMD). Met used_tokens
+        wordt het verschil met de schatting alsnog afgeboekt. prompt_tokens
+        en cached_tokens (input-tokens uit de prompt-cache van de provider)
+        worden alleen geteld.
+        """
+        if used_tokens is not None and self._tokens is not None:
+            if used_tokens > estimated_tokens:
+                self._tokens.debit(used_tokens - estimated_tokens)
+
+        with self._cond:
+            if used_tokens is not None:
+                self.tokens_used += used_tokens
+            if prompt_tokens is not None:
+                self.prompt_tokens += prompt_tokens
+                self.cached_tokens += cached_tokens or 0
+            if throttled:
+                self.throttled += 1
+                self._successes_since_change = 0
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self._limit = max(self.min_concurrency, self._limit // 2)
+                    self._last_decrease = now
+            else:
+                self._successes_since_change += 1
+                if (
+                    self._successes_since_change >= RECOVERY_SUCCESSES
+                    and self._limit < self.max_concurrency
+                ):
+                    self._limit += 1
+                    self._successes_since_change = 0
+        self._leave()
+
+    def record_retry(self) -> None:
+        with self._cond:
+            self.retries += 1
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self.failures += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Huidige toestand en tellers."""
+        with self._cond:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "concurrency_limit": self._limit,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "requests": self.requests,
+                "tokens_used": self.tokens_used,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "failures": self.failures,
+                "wait_seconds": self.wait_seconds,
+                "request_bucket": self._requests.level() if self._requests else None,
+                "token_bucket": self._tokens.level() if self._tokens else None,
+            }
+
+    def _leave(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+# --------------------------------------------------------
+# RETRIES
+# --------------------------------------------------------
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Grove schatting vooraf: ~4 tekens per token plus het maximale antwoord."""
+    return len(prompt) // 4 + max_tokens
+
+
+def call_with_retries(
+    fn: Callable[[], Any],
+    limiter: RateLimiter,
+    estimated_tokens: int,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """
+    Voer fn() uit binnen de limiter, met retries op tijdelijke fouten.
+    Niet-tijdelijke fouten en de laatste fout na max_retries worden
+    doorgegeven aan de aanroeper.
+
+    Met stats (een dict) worden daarin "queue_seconds" (wachttijd op de
+    limiter) en "retries" bijgehouden, ook als de call uiteindelijk faalt.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(queue_seconds=0.0, retries=0)
+    attempt = 0
+    while True:
+        stats["queue_seconds"] += limiter.acquire(estimated_tokens)
+        try:
+            response = fn()
+        except Exception as exc:
+            throttled = _status_code(exc) == 429
+            limiter.release(throttled=throttled)
+            if not is_retryable(exc) or attempt >= max_retries:
+                limiter.record_failure()
+                raise
+            limiter.record_retry()
+            stats["retries"] += 1
+            time.sleep(backoff_delay(attempt, _retry_after(exc)))
+            attempt += 1
+            continue
+
+        usage = getattr(response, "usage", None)
+        limiter.release(
+            estimated_tokens=estimated_tokens,
+            used_tokens=getattr(usage, "total_tokens", None),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            cached_tokens=cached_prompt_tokens(usage),
+        )
+        return response
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Input-tokens die de provider uit zijn prompt-cache haalde (0 als onbekend)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    return cached if isinstance(cached, int) else 0
+
+
+def usage_counts(usage: Any) -> Dict[str, int]:
+    """Tokengebruik van een response als gewone dict (0 als onbekend)."""
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "cached_tokens": cached_prompt_tokens(usage),
+    }
+
+
+def is_retryable(exc: Exception) -> bool:
+    """429, 5xx, timeouts en verbindingsfouten zijn tijdelijk."""
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # openai.APITimeoutError / APIConnectionError zonder openai te importeren
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponentiële backoff met volledige jitter; Retry-After gaat voor."""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS)
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_limiter: Optional[RateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Eén limiter per proces: de limieten gelden per API-key."""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
+
+
+def configure_rate_limiter(share: float) -> RateLimiter:
+    """
+    Vervang de limiter van dit proces door een met een deel (0–1] van de
+    limieten. Voor worker-processen die samen één API-key delen. Een
+    onbegrensde limiet (0) blijft onbegrensd.
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        _shared_limiter = RateLimiter(
+            rpm=max(1, int(DEFAULT_RPM * share)) if DEFAULT_RPM else 0,
+            tpm=max(1, int(DEFAULT_TPM * share)) if DEFAULT_TPM else 0,
+            max_concurrency=max(1, int(DEFAULT_MAX_CONCURRENCY * share)),
+        )
+        return _shared_limiter
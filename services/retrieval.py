@@ -0,0 +1,188 @@
+# services/retrieval.py
+"""
+Lexicale kandidaatselectie (BM25) vóór LLM-scoring.
+
+De meeste organisatie × subsidie-paren zijn evident irrelevant. Met een
+BM25-index over de subsidieteksten en het organisatieprofiel als query
+bepalen we goedkoop welke subsidies per organisatie de moeite van een
+LLM-call waard zijn.
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+SUBSIDIE_TEXT_FIELDS = (
+    "subsidie_naam",
+    "voor_wie",
+    "samenvatting_eisen",
+    "subsidie_tekst_volledig",
+)
+
+ORG_TEXT_FIELDS = ("organisatieprofiel",)
+
+# Korte Nederlandse stopwoordenlijst; genoeg om lidwoorden en voegwoorden
+# niet te laten meetellen in de score.
+_STOPWORDS = frozenset(
+    """
+    de het een en of van voor met aan op in uit bij door naar als dat die dit deze
+    zijn is wordt worden word kan kunnen moet moeten zal zullen wil willen heeft
+    hebben om te tot over onder tussen ook niet geen wel nog al maar dan dus er
+    hun hen zij ze we wij je jij u ons onze hij haar hem wat wie waar hoe welke
+    meer meest zeer zo zoals per via mede andere anders bijvoorbeeld
+    """.split()
+)
+
+_TOKEN_RE = re.compile(r"[0-9a-zà-ÿ]+")
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercase, splits op niet-alfanumerieke tekens en verwijdert stopwoorden."""
+    if text is None or (isinstance(text, float) and math.isnan(text)):
+        return []
+    return [
+        token
+        for token in _TOKEN_RE.findall(str(text).lower())
+        if len(token) > 1 and token not in _STOPWORDS
+    ]
+
+
+def _join_fields(record: Dict[str, Any], fields: Iterable[str]) -> str:
+    return " ".join(str(record.get(field) or "") for field in fields)
+
+
+class BM25Index:
+    """
+    Minimale Okapi BM25-index over een lijst documenten (token-lijsten).
+    """
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(documents)
+        self.doc_len = np.array([len(doc) for doc in documents], dtype=float)
+        self.avg_len = float(self.doc_len.mean()) if self.n_docs else 0.0
+
+        # term → (doc-indices, term-frequenties)
+        postings: Dict[str, List[List[int]]] = {}
+        for doc_idx, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                entry = postings.setdefault(term, [[], []])
+                entry[0].append(doc_idx)
+                entry[1].append(tf)
+
+        self._postings = {
+            term: (np.array(docs, dtype=int), np.array(tfs, dtype=float))
+            for term, (docs, tfs) in postings.items()
+        }
+        self._idf = {
+            term: math.log(1.0 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, (docs, _) in self._postings.items()
+        }
+
+    def score(self, query: List[str]) -> np.ndarray:
+        """BM25-score van de query tegen elk document."""
+        scores = np.zeros(self.n_docs, dtype=float)
+        if not self.n_docs:
+            return scores
+
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / (self.avg_len or 1.0))
+        for term in set(query):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            scores[docs] += self._idf[term] * tfs * (self.k1 + 1.0) / (tfs + norm[docs])
+        return scores
+
+
+def lexical_score_matrix(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+) -> np.ndarray:
+    """
+    BM25-scores als matrix (organisaties × subsidies), in de rijvolgorde
+    van beide DataFrames.
+    """
+    sub_docs = [
+        tokenize(_join_fields(sub, SUBSIDIE_TEXT_FIELDS))
+        for sub in subsidies_df.to_dict("records")
+    ]
+    index = BM25Index(sub_docs)
+
+    matrix = np.zeros((len(organisations_df), len(subsidies_df)), dtype=float)
+    for i, org in enumerate(organisations_df.to_dict("records")):
+        matrix[i] = index.score(tokenize(_join_fields(org, ORG_TEXT_FIELDS)))
+    return matrix
+
+
+def select_candidates(
+    score_matrix: np.ndarray,
+    top_k: Optional[int] = None,
+    min_score: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Booleaans masker (organisaties × subsidies) van paren die naar de LLM gaan.
+
+    Een paar is kandidaat als het bij de top-K van de organisatie hoort of
+    een score heeft van minstens min_score. Zonder beide criteria is elk
+    paar kandidaat.
+    """
+    n_orgs, n_subs = score_matrix.shape
+    if top_k is None and min_score is None:
+        return np.ones((n_orgs, n_subs), dtype=bool)
+
+    mask = np.zeros((n_orgs, n_subs), dtype=bool)
+
+    if top_k is not None and top_k > 0 and n_subs:
+        k = min(top_k, n_subs)
+        # Stabiele sortering: bij gelijke scores wint de eerdere subsidie.
+        top_idx = np.argsort(-score_matrix, axis=1, kind="stable")[:, :k]
+        np.put_along_axis(mask, top_idx, True, axis=1)
+
+    if min_score is not None:
+        mask |= score_matrix >= min_score
+
+    return mask
+
+
+def prefilter_recall(
+    candidate_pairs: pd.DataFrame,
+    reference_matches: pd.DataFrame,
+    relevant_threshold: int = 60,
+) -> Dict[str, Any]:
+    """
+    Recall van de kandidaatselectie t.o.v. volledige LLM-scores.
+
+    candidate_pairs bevat kolommen organisatie_id, subsidie_id en
+    kandidaat (bool). reference_matches is een eerdere matches-tabel met
+    echte scores; alleen paren met score ≥ relevant_threshold tellen als
+    relevant.
+    """
+    reference = reference_matches
+    if "status" in reference.columns:
+        reference = reference[reference["status"] == "gescoord"]
+    reference = reference[
+        pd.to_numeric(reference["match_score"], errors="coerce") >= relevant_threshold
+    ]
+
+    relevant = reference[["organisatie_id", "subsidie_id"]].merge(
+        candidate_pairs,
+        how="inner",
+        on=["organisatie_id", "subsidie_id"],
+    )
+    n_relevant = len(relevant)
+    n_found = int(relevant["kandidaat"].sum()) if n_relevant else 0
+
+    return {
+        "relevant_threshold": relevant_threshold,
+        "n_relevant": n_relevant,
+        "n_found": n_found,
+        "recall": (n_found / n_relevant) if n_relevant else None,
+    }
@@ -0,0 +1,201 @@
+# services/score_cache.py
+"""
+Persistente cache voor LLM-scores per organisatie × subsidie.
+
+De sleutel is een hash van de gerenderde prompt, de modelnaam en de
+organisatie- en subsidievelden die in de prompt-context terechtkomen.
+Verandert één van die inputs, dan ontstaat vanzelf een nieuwe sleutel;
+expliciete invalidatie is dus niet nodig.
+
+De cache staat in een SQLite-bestand zodat hij herstarts overleeft en door
+alle Streamlit-sessies in hetzelfde proces gedeeld wordt. Het aantal
+entries is begrensd; bij overschrijding worden de minst recent gebruikte
+entries verwijderd (LRU).
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from data.data_store import local_data_path
+
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("SUBSIDIEMATCH_SCORE_CACHE_MAX_ENTRIES", "200000"))
+
+# Aantal hits waarvan het gebruiksmoment in het geheugen wacht voordat het
+# in één transactie naar SQLite gaat. Verloren momenten (bij een crash)
+# maken de LRU-volgorde alleen iets minder precies.
+RECENCY_FLUSH_EVERY = 256
+
+
+def score_cache_key(
+    prompt: str,
+    model: str,
+    org: Dict[str, Any],
+    subsidie: Dict[str, Any],
+    org_fields: Iterable[str],
+    subsidie_fields: Iterable[str],
+) -> str:
+    """
+    Bouw een content-adresseerbare sleutel voor één scoring.
+    """
+    payload = {
+        "prompt": prompt,
+        "model": model,
+        "org": {field: org.get(field, "") for field in org_fields},
+        "subsidie": {field: subsidie.get(field, "") for field in subsidie_fields},
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """
+    Begrensde LRU-cache op schijf (SQLite) met hit/miss-tellers.
+
+    Thread-safe: alle toegang tot de verbinding loopt via één lock, zodat de
+    cache ook vanuit de scoring-threadpool gebruikt kan worden.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores (last_used)"
+        )
+        self._conn.commit()
+
+        self._size = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        # Gebruiksmomenten van hits die nog niet in de tabel staan
+        self._pending_recency: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Geef het gecachte resultaat, of None bij een miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM scores WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            # Niet per hit schrijven: gebruiksmomenten gaan per bundel naar de tabel
+            self._pending_recency[key] = time.time()
+            if len(self._pending_recency) >= RECENCY_FLUSH_EVERY:
+                self._flush_recency()
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Sla een resultaat op en verwijder zo nodig de oudste entries."""
+        raw = json.dumps(result, ensure_ascii=False, default=str)
+        with self._lock:
+            # Eerst de openstaande gebruiksmomenten, zodat het verwijderen
+            # hieronder recent gelezen entries laat staan
+            self._flush_recency()
+            self._pending_recency.pop(key, None)
+            cur = self._conn.execute(
+                "UPDATE scores SET result = ?, last_used = ? WHERE key = ?",
+                (raw, time.time(), key),
+            )
+            if cur.rowcount == 0:
+                self._conn.execute(
+                    "INSERT INTO scores (key, result, last_used) VALUES (?, ?, ?)",
+                    (key, raw, time.time()),
+                )
+                self._size += 1
+
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    """
+                    DELETE FROM scores WHERE key IN (
+                        SELECT key FROM scores ORDER BY last_used ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,),
+                )
+                self._size -= overflow
+                self.evictions += overflow
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """Schrijf de openstaande gebruiksmomenten van hits weg."""
+        with self._lock:
+            self._flush_recency()
+            self._conn.commit()
+
+    def _flush_recency(self) -> None:
+        """Openstaande gebruiksmomenten in één executemany; commit door de aanroeper."""
+        if not self._pending_recency:
+            return
+        self._conn.executemany(
+            "UPDATE scores SET last_used = ? WHERE key = ?",
+            [(last_used, key) for key, last_used in self._pending_recency.items()],
+        )
+        self._pending_recency.clear()
+
+    def clear(self) -> None:
+        """Leeg de cache volledig (tellers blijven staan)."""
+        with self._lock:
+            self._pending_recency.clear()
+            self._conn.execute("DELETE FROM scores")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Tellers voor weergave in de UI."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_cache: Optional[ScoreCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_score_cache() -> ScoreCache:
+    """
+    Eén cache per proces, gedeeld door alle sessies.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            path = os.getenv("SUBSIDIEMATCH_SCORE_CACHE_PATH") or local_data_path(
+                "score_cache.sqlite"
+            )
+            _shared_cache = ScoreCache(path)
+            atexit.register(_shared_cache.flush)
+        return _shared_cache
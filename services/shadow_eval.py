@@ -0,0 +1,248 @@
+# services/shadow_eval.py
+"""
+Schaduwevaluatie van een gewijzigde prompt op een steekproef.
+
+In plaats van na elke promptwijziging alle paren opnieuw te scoren,
+scoren we een gestratificeerde steekproef (per sector, bron en scoreband)
+met het kandidaat-template en vergelijken we dat met de scores van de
+actieve prompt:
+
+- rangcorrelatie (Spearman): blijft de volgorde van paren gelijk?
+- gemiddelde verschuiving: scoort de nieuwe prompt structureel hoger/lager?
+- top-K-overlap per organisatie: blijven de beste subsidies de beste?
+
+Pas als de uitkomst de moeite waard is, volgt een volledige herberekening.
+"""
+from __future__ import annotations
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.eligibility import eligibility_matrix
+from services.instrumentation import bind, call_labels
+from services.matching import STATUS_FOUT
+from services.subsidy_summaries import with_summaries
+
+
+DEFAULT_SAMPLE_SIZE = 60
+DEFAULT_TOP_K = 3
+
+# Grenzen van de scorebanden voor de stratificatie
+SCORE_BANDS = (0, 25, 50, 75, 100)
+BAND_GEEN_SCORE = "geen score"
+
+STRATA_COLUMNS = ("sector", "bron", "scoreband")
+
+# Laatste schaduwrapport (voor weergave op Home)
+SHADOW_REPORT_KEY = "shadow_report"
+
+
+def stratified_sample(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    matches_df: pd.DataFrame,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Trek een steekproef van paren die aan de harde voorwaarden voldoen,
+    gestratificeerd naar sector (organisatie), bron (subsidie) en scoreband
+    van de huidige match_score.
+
+    Elk stratum krijgt naar rato plaatsen, met minimaal één paar, zodat ook
+    kleine groepen meedoen. Retourneert een DataFrame met organisatie- en
+    subsidie-index (org_pos, sub_pos), de strata en de huidige score.
+    """
+    eligible = eligibility_matrix(organisations_df, subsidies_df)["eligible"]
+    org_pos, sub_pos = np.nonzero(eligible)
+    pairs = pd.DataFrame(
+        {
+            "org_pos": org_pos,
+            "sub_pos": sub_pos,
+            "organisatie_id": organisations_df["organisatie_id"].to_numpy()[org_pos],
+            "subsidie_id": subsidies_df["subsidie_id"].to_numpy()[sub_pos],
+            "sector": _column(organisations_df, "sector")[org_pos],
+            "bron": _column(subsidies_df, "bron")[sub_pos],
+        }
+    )
+    if pairs.empty:
+        return pairs.assign(scoreband=[], score_actief=pd.array([], dtype="Int64"))
+
+    pairs = pairs.merge(_current_scores(matches_df), on=["organisatie_id", "subsidie_id"], how="left")
+    pairs["score_actief"] = pairs["score_actief"].astype("Int64")
+    pairs["scoreband"] = _score_band(pairs["score_actief"])
+    pairs[["sector", "bron"]] = pairs[["sector", "bron"]].fillna("onbekend")
+
+    if len(pairs) <= sample_size:
+        return pairs.reset_index(drop=True)
+
+    groups = pairs.groupby(list(STRATA_COLUMNS), sort=True, dropna=False)
+    quota = (groups.size() / len(pairs) * sample_size).round().clip(lower=1).astype(int)
+
+    rng = np.random.default_rng(seed)
+    picked = [
+        group.sample(n=min(quota[name], len(group)), random_state=rng)
+        for name, group in groups
+    ]
+    sample = pd.concat(picked)
+    if len(sample) > sample_size:
+        # Door het minimum van één per stratum kan de som te hoog uitvallen
+        sample = sample.sample(n=sample_size, random_state=rng)
+    return sample.sort_values(["org_pos", "sub_pos"]).reset_index(drop=True)
+
+
+def shadow_evaluate(
+    organisations_df: pd.DataFrame,
+    subsidies_df: pd.DataFrame,
+    matches_df: pd.DataFrame,
+    active_template: str,
+    candidate_template: str,
+    llm_client,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    top_k: int = DEFAULT_TOP_K,
+    max_workers: int = 8,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Scoor een steekproef met het kandidaat-template en vergelijk met de
+    actieve prompt.
+
+    Paren zonder huidige score (nog nooit gescoord, voorgefilterd) worden
+    ook met het actieve template gescoord. Mislukte calls tellen niet mee.
+    De matches-tabel wordt niet aangepast.
+
+    Retourneert het rapport (zie compare_scores) plus "pairs": de
+    steekproef met score_actief en score_kandidaat.
+    """
+    sample = stratified_sample(organisations_df, subsidies_df, matches_df, sample_size, seed)
+    orgs = organisations_df.to_dict("records")
+    subs = with_summaries(
+        subsidies_df.to_dict("records"),
+        llm_client,
+        [active_template, candidate_template],
+        max_workers,
+    )
+    pairs = [(orgs[i], subs[j]) for i, j in zip(sample["org_pos"], sample["sub_pos"])]
+
+    missing = sample["score_actief"].isna().to_numpy()
+    tasks: List[Tuple[str, Dict[str, Any], Dict[str, Any]]] = [
+        (candidate_template, org, sub) for org, sub in pairs
+    ]
+    tasks += [(active_template, org, sub) for (org, sub), m in zip(pairs, missing) if m]
+
+    def _run(task):
+        template, org, sub = task
+        result = llm_client.score_match_org_subsidy(
+            prompt_template=template, org=org, subsidie=sub
+        )
+        return result.get("match_score") if result.get("status") != STATUS_FOUT else None
+
+    # Eigen run-label, zodat de kosten van de evaluatie apart zichtbaar zijn
+    with call_labels(run_id=f"schaduw-{uuid.uuid4().hex[:8]}"):
+        if max_workers <= 1 or len(tasks) <= 1:
+            scores = [_run(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                scores = list(executor.map(bind(_run), tasks))
+
+    sample["score_kandidaat"] = pd.array(scores[: len(pairs)], dtype="Int64")
+    active = sample["score_actief"].copy()
+    active[missing] = pd.array(scores[len(pairs):], dtype="Int64")
+    sample["score_actief"] = active
+    sample["verschil"] = sample["score_kandidaat"] - sample["score_actief"]
+
+    report = compare_scores(sample, top_k)
+    report["n_calls"] = len(tasks)
+    report["n_pairs_total"] = len(organisations_df) * len(subsidies_df)
+    report["pairs"] = sample.drop(columns=["org_pos", "sub_pos"])
+    return report
+
+
+def compare_scores(pairs: pd.DataFrame, top_k: int = DEFAULT_TOP_K) -> Dict[str, Any]:
+    """
+    Vergelijk score_actief en score_kandidaat op dezelfde paren.
+
+    Retourneert een dict met:
+    - "n": aantal paren met beide scores;
+    - "spearman": rangcorrelatie (None bij te weinig variatie);
+    - "mean_shift": gemiddelde van kandidaat − actief;
+    - "mean_abs_diff": gemiddeld absoluut verschil;
+    - "top_k" en "top_k_overlap": gemiddelde overlap (0–1) van de top-K
+      subsidies per organisatie binnen de steekproef;
+    - "per_stratum": gemiddelde verschuiving per sector en per bron.
+    """
+    both = pairs.dropna(subset=["score_actief", "score_kandidaat"])
+    active = both["score_actief"].astype(float)
+    candidate = both["score_kandidaat"].astype(float)
+
+    spearman = None
+    if len(both) >= 2 and active.nunique() > 1 and candidate.nunique() > 1:
+        spearman = float(active.rank().corr(candidate.rank()))
+
+    shift = candidate - active
+    return {
+        "n": len(both),
+        "n_failed": len(pairs) - len(both),
+        "spearman": spearman,
+        "mean_shift": float(shift.mean()) if len(both) else None,
+        "mean_abs_diff": float(shift.abs().mean()) if len(both) else None,
+        "top_k": top_k,
+        "top_k_overlap": _top_k_overlap(both, top_k),
+        "per_stratum": {
+            column: shift.groupby(both[column]).mean().round(1).to_dict()
+            for column in ("sector", "bron")
+            if column in both.columns
+        },
+    }
+
+
+def _top_k_overlap(pairs: pd.DataFrame, top_k: int) -> Optional[float]:
+    overlaps = []
+    for _, group in pairs.groupby("organisatie_id"):
+        k = min(top_k, len(group))
+        if k == 0 or k == len(group):
+            # Alle paren zitten in beide top-K's: zegt niets
+            continue
+        top_active = set(group.nlargest(k, "score_actief")["subsidie_id"])
+        top_candidate = set(group.nlargest(k, "score_kandidaat")["subsidie_id"])
+        overlaps.append(len(top_active & top_candidate) / k)
+    return float(np.mean(overlaps)) if overlaps else None
+
+
+def _current_scores(matches_df: pd.DataFrame) -> pd.DataFrame:
+    """Huidige LLM-score per paar (alleen gescoorde organisatie-matches)."""
+    if matches_df.empty:
+        return pd.DataFrame(
+            {
+                "organisatie_id": pd.Series(dtype="int64"),
+                "subsidie_id": pd.Series(dtype="int64"),
+                "score_actief": pd.Series(dtype="Int64"),
+            }
+        )
+    scored = matches_df[matches_df["match_score"].notna()]
+    if "status" in scored.columns:
+        scored = scored[scored["status"].isna() | (scored["status"] == "gescoord")]
+    scored = scored.drop_duplicates(["organisatie_id", "subsidie_id"], keep="last")
+    return pd.DataFrame(
+        {
+            "organisatie_id": scored["organisatie_id"].astype("int64"),
+            "subsidie_id": scored["subsidie_id"].astype("int64"),
+            "score_actief": scored["match_score"].astype("Int64"),
+        }
+    )
+
+
+def _score_band(scores: pd.Series) -> pd.Series:
+    labels = [f"{low}–{high}" for low, high in zip(SCORE_BANDS[:-1], SCORE_BANDS[1:])]
+    bands = pd.cut(scores.astype(float), bins=SCORE_BANDS, labels=labels, include_lowest=True)
+    return bands.astype(object).where(bands.notna(), BAND_GEEN_SCORE)
+
+
+def _column(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col in df.columns:
+        return df[col].to_numpy(dtype=object)
+    return np.full(len(df), None, dtype=object)
@@ -0,0 +1,316 @@
+# services/subsidy_summaries.py
+"""
+Beknopte, gestructureerde samenvattingen van subsidies voor in de prompt.
+
+De volledige subsidietekst gaat anders bij elke organisatie opnieuw mee:
+een regeling van 5k tokens tegen 400 organisaties kost zo 2M input-tokens.
+Deze voorbewerking maakt per subsidie één keer een samenvatting (doel,
+doelgroep, eisen, uitsluitingen) uit subsidie_tekst_volledig, voor_wie en
+samenvatting_eisen. Prompt-templates gebruiken die via de placeholder
+{subsidie_samenvatting}; alleen als een template die placeholder bevat,
+worden samenvattingen gemaakt.
+
+Samenvattingen staan in een SQLite-bestand onder een hash van de inhoud
+van die drie velden, het model en SUMMARY_VERSION: verandert de tekst, dan
+ontstaat vanzelf een nieuwe sleutel. Bij het bewerken van een subsidie
+worden haar oude samenvattingen daarnaast expliciet verwijderd
+(invalidate_subsidy_summary), zodat het bestand niet blijft groeien.
+
+Zonder echte LLM (mock-modus) of bij een mislukte call wordt een
+extractieve samenvatting gebruikt: de eerste zinnen van elk veld. Alleen
+die uit mock-modus wordt bewaard; na een mislukte call volgt bij de
+volgende run een nieuwe poging.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from data.data_store import local_data_path
+from services.instrumentation import bind, call_labels
+from services.prompt_templates import compile_prompt
+
+
+SUMMARY_FIELD = "subsidie_samenvatting"
+SOURCE_FIELDS = ("subsidie_tekst_volledig", "voor_wie", "samenvatting_eisen")
+
+# Ophogen als de samenvattingsprompt of het formaat verandert
+SUMMARY_VERSION = 1
+SUMMARY_MAX_TOKENS = 350
+METHOD_EXTRACTIEF = "extractief"
+
+MAX_LIST_ITEMS = 6
+EXTRACTIVE_SENTENCES = 2
+
+SUMMARY_PROMPT = (
+    "Vat de onderstaande subsidieregeling samen voor een analist die moet "
+    "beoordelen of organisaties in aanmerking komen. Wees feitelijk en beknopt "
+    "en neem alleen op wat in de tekst staat.\n\n"
+    "Voor wie:\n{voor_wie}\n\n"
+    "Samenvatting eisen:\n{samenvatting_eisen}\n\n"
+    "Volledige subsidie-tekst:\n{subsidie_tekst_volledig}\n\n"
+    "Produceer alleen de volgende JSON-output:\n"
+    "{{\n"
+    '  "doel": "<één zin>",\n'
+    '  "doelgroep": "<één zin>",\n'
+    '  "eisen": ["korte bullet", "..."],\n'
+    '  "uitsluitingen": ["korte bullet", "..."],\n'
+    '  "bedrag_en_looptijd": "<één zin of leeg>"\n'
+    "}}\n"
+)
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+# Opsommingen: per regel of per zin
+_ITEM_SPLIT = re.compile(r"\n+|(?<=[.!?])\s+")
+_BULLET = re.compile(r"^[-•*]\s*")
+
+
+# --------------------------------------------------------
+# SLEUTEL EN OPMAAK
+# --------------------------------------------------------
+def summary_key(subsidie: Dict[str, Any], method: str) -> str:
+    """Hash over de bronvelden, de methode (model of extractief) en de versie."""
+    payload = {
+        "fields": {field: _text(subsidie.get(field)) for field in SOURCE_FIELDS},
+        "method": method,
+        "version": SUMMARY_VERSION,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def format_summary(parsed: Dict[str, Any]) -> str:
+    """Zet een JSON-samenvatting om naar compacte tekst voor in de prompt."""
+    lines = []
+    for label, key in (("Doel", "doel"), ("Doelgroep", "doelgroep")):
+        value = _text(parsed.get(key)).strip()
+        if value:
+            lines.append(f"{label}: {value}")
+    for label, key in (("Eisen", "eisen"), ("Uitsluitingen", "uitsluitingen")):
+        items = parsed.get(key) or []
+        if isinstance(items, str):
+            items = [items]
+        items = [_BULLET.sub("", _text(item).strip()) for item in items]
+        items = [item for item in items if item]
+        if items:
+            lines.append(f"{label}:")
+            lines += [f"- {item}" for item in items[:MAX_LIST_ITEMS]]
+    value = _text(parsed.get("bedrag_en_looptijd")).strip()
+    if value:
+        lines.append(f"Bedrag en looptijd: {value}")
+    return "\n".join(lines)
+
+
+def extractive_summary(subsidie: Dict[str, Any]) -> str:
+    """Samenvatting zonder LLM: de eerste zinnen van elk bronveld."""
+    return format_summary(
+        {
+            "doel": _first_sentences(subsidie.get("subsidie_tekst_volledig")),
+            "doelgroep": _first_sentences(subsidie.get("voor_wie")),
+            "eisen": _ITEM_SPLIT.split(_text(subsidie.get("samenvatting_eisen")).strip()),
+        }
+    )
+
+
+def _first_sentences(value: Any, n: int = EXTRACTIVE_SENTENCES) -> str:
+    sentences = _SENTENCE_SPLIT.split(_text(value).strip())
+    return " ".join(sentences[:n])
+
+
+def _text(value: Any) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+
+# --------------------------------------------------------
+# OPSLAG
+# --------------------------------------------------------
+class SummaryStore:
+    """
+    Samenvattingen op schijf (SQLite), per inhoudshash. Thread-safe via één lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                subsidie_id INTEGER,
+                summary TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_summaries_subsidie ON summaries (subsidie_id);
+            """
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, subsidie_id: Any, summary: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, subsidie_id, summary, created) "
+                "VALUES (?, ?, ?, ?)",
+                (key, _int_or_none(subsidie_id), summary, time.time()),
+            )
+            self._conn.commit()
+
+    def latest(self, subsidie_id: Any) -> Optional[str]:
+        """Meest recente samenvatting van een subsidie (voor weergave)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE subsidie_id = ? ORDER BY created DESC LIMIT 1",
+                (_int_or_none(subsidie_id),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def invalidate(self, subsidie_id: Any) -> int:
+        """Verwijder alle samenvattingen van een subsidie; retourneert het aantal."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM summaries WHERE subsidie_id = ?", (_int_or_none(subsidie_id),)
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# --------------------------------------------------------
+# VOORBEWERKING
+# --------------------------------------------------------
+def uses_summary(templates: Iterable[str]) -> bool:
+    """Bevat een van de templates de placeholder {subsidie_samenvatting}?"""
+    for template in templates:
+        try:
+            if SUMMARY_FIELD in compile_prompt(template).placeholders:
+                return True
+        except ValueError:
+            # Ongeldig template: de scoring meldt dat zelf
+            continue
+    return False
+
+
+def with_summaries(
+    subs: List[Dict[str, Any]],
+    llm_client,
+    templates: Iterable[str],
+    max_workers: int = 8,
+) -> List[Dict[str, Any]]:
+    """
+    Subsidierecords aangevuld met SUMMARY_FIELD, als een van de templates
+    de placeholder gebruikt; anders ongewijzigd dezelfde lijst.
+
+    Ontbrekende samenvattingen worden parallel gemaakt (één per unieke
+    inhoud) en bewaard.
+    """
+    if not subs or not uses_summary(templates):
+        return subs
+
+    store = get_summary_store()
+    real = llm_client.is_real()
+    method = llm_client.model_name() if real else METHOD_EXTRACTIEF
+    keys = [summary_key(sub, method) for sub in subs]
+
+    summaries: Dict[str, str] = {}
+    todo: Dict[str, Dict[str, Any]] = {}
+    for key, sub in zip(keys, subs):
+        if key in summaries or key in todo:
+            continue
+        cached = store.get(key)
+        if cached is not None:
+            summaries[key] = cached
+        else:
+            todo[key] = sub
+
+    def _run(item):
+        key, sub = item
+        if not real:
+            summary = extractive_summary(sub)
+            store.put(key, sub.get("subsidie_id"), summary)
+            return key, summary
+        summary = _llm_summary(sub, llm_client)
+        if summary is None:
+            # Mislukt: nu extractief, volgende run opnieuw proberen
+            return key, extractive_summary(sub)
+        store.put(key, sub.get("subsidie_id"), summary)
+        return key, summary
+
+    if todo:
+        # Eigen run-label, zodat de kosten van de voorbewerking apart zichtbaar zijn
+        with call_labels(run_id=f"samenvatting-{uuid.uuid4().hex[:8]}"):
+            if not real or max_workers <= 1 or len(todo) <= 1:
+                summaries.update(_run(item) for item in todo.items())
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    summaries.update(executor.map(bind(_run), todo.items()))
+
+    return [dict(sub, **{SUMMARY_FIELD: summaries[key]}) for key, sub in zip(keys, subs)]
+
+
+def _llm_summary(subsidie: Dict[str, Any], llm_client) -> Optional[str]:
+    prompt = SUMMARY_PROMPT.format(**{field: _text(subsidie.get(field)) for field in SOURCE_FIELDS})
+    try:
+        parsed = llm_client.complete_json(prompt, max_tokens=SUMMARY_MAX_TOKENS)
+    except Exception:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    return format_summary(parsed) or None
+
+
+def invalidate_subsidy_summary(subsidie_id: Any) -> None:
+    """Vergeet de samenvattingen van een bewerkte of verwijderde subsidie."""
+    get_summary_store().invalidate(subsidie_id)
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_store: Optional[SummaryStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_summary_store() -> SummaryStore:
+    """Eén samenvattingenbestand per proces, gedeeld door alle sessies."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            path = os.getenv("SUBSIDIEMATCH_SUMMARY_CACHE_PATH") or local_data_path(
+                "subsidy_summaries.sqlite"
+            )
+            _shared_store = SummaryStore(path)
+        return _shared_store
@@ -0,0 +1,424 @@
+# services/work_queue.py
+"""
+Lokale, duurzame werkwachtrij (SQLite) voor herberekeningen over meerdere
+processen.
+
+Een run wordt opgeknipt in shards van paren (per organisatiebereik of per
+hash van het paar). De shards gaan in de wachtrij en worden opgepakt door
+worker-processen (zie services.matching.run_shard_worker); elk proces
+heeft zijn eigen GIL, HTTP-pool en rate limiter.
+
+- Een worker claimt een shard met een lease en verlengt die zolang hij
+  eraan werkt (zie lease_heartbeat). Crasht de worker, dan loopt de lease
+  af en pakt een andere worker de shard opnieuw op; een trage maar gezonde
+  shard wordt zo niet dubbel gescoord.
+- Resultaten worden per (run_id, match_id) opgeslagen met INSERT OR IGNORE:
+  ook als een shard twee keer wordt verwerkt, telt per paar precies één
+  resultaat.
+- Een shard die MAX_ATTEMPTS keer mislukt krijgt status "mislukt".
+
+Losse workers (bijvoorbeeld extra processen naast Streamlit) starten met:
+
+    python -m services.work_queue --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from data.data_store import local_data_path
+
+
+SHARD_WACHTEND = "wachtend"
+SHARD_BEZIG = "bezig"
+SHARD_KLAAR = "klaar"
+SHARD_MISLUKT = "mislukt"
+
+# Manieren om paren over shards te verdelen
+SHARD_BY_ORGANISATIE = "organisatie"
+SHARD_BY_HASH = "hash"
+SHARD_BY = (SHARD_BY_ORGANISATIE, SHARD_BY_HASH)
+
+DEFAULT_LEASE_SECONDS = 300.0
+# Zo vaak per lease verlengt een worker de lease van zijn shard
+LEASE_RENEWALS_PER_LEASE = 3
+MAX_ATTEMPTS = 3
+
+# Paar in een shard: (match_id, organisatie-index, subsidie-index)
+Pair = Tuple[int, int, int]
+
+
+def shard_pairs(
+    pairs: Sequence[Pair],
+    n_shards: int,
+    by: str = SHARD_BY_ORGANISATIE,
+    org_ids: Optional[Sequence[Any]] = None,
+    sub_ids: Optional[Sequence[Any]] = None,
+) -> List[List[Pair]]:
+    """
+    Verdeel paren over maximaal n_shards shards.
+
+    - "organisatie": aaneengesloten organisatiebereiken; paren van één
+      organisatie blijven bij elkaar (goed voor batch-calls en prompt-cache).
+    - "hash": op een stabiele hash van (organisatie_id, subsidie_id); gelijkmatiger
+      als enkele organisaties veel meer kandidaten hebben.
+    """
+    if by not in SHARD_BY:
+        raise ValueError(f"Onbekende shardverdeling: {by}")
+    n_shards = max(1, min(n_shards, len(pairs)))
+    if not pairs:
+        return []
+
+    if by == SHARD_BY_HASH:
+        shards: List[List[Pair]] = [[] for _ in range(n_shards)]
+        for pair in pairs:
+            _, i, j = pair
+            key = f"{org_ids[i] if org_ids is not None else i}|{sub_ids[j] if sub_ids is not None else j}"
+            digest = hashlib.sha1(key.encode("utf-8")).digest()
+            shards[int.from_bytes(digest[:4], "big") % n_shards].append(pair)
+        return [shard for shard in shards if shard]
+
+    # Organisatiebereiken met ongeveer gelijke aantallen paren
+    ordered = sorted(pairs, key=lambda pair: (pair[1], pair[2]))
+    target = len(ordered) / n_shards
+    shards = [[]]
+    for pos, pair in enumerate(ordered):
+        current = shards[-1]
+        boundary = current and pair[1] != current[-1][1]
+        if boundary and pos >= target * len(shards) and len(shards) < n_shards:
+            shards.append([])
+        shards[-1].append(pair)
+    return shards
+
+
+class WorkQueue:
+    """
+    SQLite-wachtrij met runs, shards en resultaten. Veilig voor meerdere
+    threads (één lock) en meerdere processen (SQLite-locking, WAL).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit; transacties expliciet met BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS queue_runs (
+                run_id TEXT PRIMARY KEY,
+                context TEXT NOT NULL,
+                n_shards INTEGER NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS shards (
+                run_id TEXT NOT NULL,
+                shard_id INTEGER NOT NULL,
+                pairs TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                leased_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (run_id, shard_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_shards_status ON shards (status, leased_until);
+            CREATE TABLE IF NOT EXISTS results (
+                run_id TEXT NOT NULL,
+                match_id INTEGER NOT NULL,
+                shard_id INTEGER NOT NULL,
+                row TEXT NOT NULL,
+                PRIMARY KEY (run_id, match_id)
+            );
+            """
+        )
+
+    def create_run(self, context: Dict[str, Any], shards: List[List[Pair]]) -> str:
+        """
+        Zet een run met zijn shards in de wachtrij. context bevat alles wat
+        een worker nodig heeft (organisaties, subsidies, prompt, opties).
+        """
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT INTO queue_runs VALUES (?, ?, ?, ?)",
+                (run_id, json.dumps(context, ensure_ascii=False, default=str), len(shards), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO shards (run_id, shard_id, pairs, status) VALUES (?, ?, ?, ?)",
+                [
+                    (run_id, shard_id, json.dumps(pairs), SHARD_WACHTEND)
+                    for shard_id, pairs in enumerate(shards)
+                ],
+            )
+            self._conn.execute("COMMIT")
+        return run_id
+
+    def run_context(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT context FROM queue_runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def claim(
+        self,
+        worker: str,
+        run_id: Optional[str] = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ) -> Optional[Tuple[str, int, List[Pair]]]:
+        """
+        Claim de eerstvolgende wachtende shard (of een shard met verlopen
+        lease). Retourneert (run_id, shard_id, paren) of None.
+        """
+        now = time.time()
+        run_filter = "AND run_id = ?" if run_id is not None else ""
+        params: Tuple[Any, ...] = (SHARD_WACHTEND, SHARD_BEZIG, now)
+        if run_id is not None:
+            params += (run_id,)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                found = self._conn.execute(
+                    f"""
+                    SELECT run_id, shard_id, pairs FROM shards
+                    WHERE (status = ? OR (status = ? AND leased_until < ?)) {run_filter}
+                    ORDER BY run_id, shard_id LIMIT 1
+                    """,
+                    params,
+                ).fetchone()
+                if found is not None:
+                    self._conn.execute(
+                        """
+                        UPDATE shards
+                        SET status = ?, worker = ?, leased_until = ?, attempts = attempts + 1
+                        WHERE run_id = ? AND shard_id = ?
+                        """,
+                        (SHARD_BEZIG, worker, now + lease_seconds, found[0], found[1]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if found is None:
+            return None
+        return found[0], found[1], [tuple(pair) for pair in json.loads(found[2])]
+
+    def extend_lease(
+        self,
+        run_id: str,
+        shard_id: int,
+        worker: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ) -> bool:
+        """
+        Verleng de lease van een geclaimde shard. False als de worker de
+        shard niet (meer) heeft: lease verlopen en door een ander geclaimd,
+        shard al klaar of run verwijderd.
+        """
+        with self._lock:
+            updated = self._conn.execute(
+                """
+                UPDATE shards SET leased_until = ?
+                WHERE run_id = ? AND shard_id = ? AND worker = ? AND status = ?
+                """,
+                (time.time() + lease_seconds, run_id, shard_id, worker, SHARD_BEZIG),
+            )
+        return updated.rowcount > 0
+
+    def lease_heartbeat(
+        self,
+        run_id: str,
+        shard_id: int,
+        worker: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ) -> "LeaseHeartbeat":
+        """Contextmanager die de lease verlengt zolang het blok loopt."""
+        return LeaseHeartbeat(self, run_id, shard_id, worker, lease_seconds)
+
+    def complete(self, run_id: str, shard_id: int, rows: List[Dict[str, Any]]) -> None:
+        """Sla de resultaten van een shard op; per paar telt het eerste resultaat."""
+        records = [
+            (run_id, int(row["match_id"]), shard_id, json.dumps(row, ensure_ascii=False, default=str))
+            for row in rows
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO results (run_id, match_id, shard_id, row) VALUES (?, ?, ?, ?)",
+                records,
+            )
+            self._conn.execute(
+                "UPDATE shards SET status = ?, leased_until = NULL WHERE run_id = ? AND shard_id = ?",
+                (SHARD_KLAAR, run_id, shard_id),
+            )
+            self._conn.execute("COMMIT")
+
+    def fail(self, run_id: str, shard_id: int, error: str) -> None:
+        """Geef een shard terug; na MAX_ATTEMPTS pogingen wordt hij "mislukt"."""
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE shards
+                SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                    leased_until = NULL, error = ?
+                WHERE run_id = ? AND shard_id = ? AND status = ?
+                """,
+                (MAX_ATTEMPTS, SHARD_MISLUKT, SHARD_WACHTEND, error, run_id, shard_id, SHARD_BEZIG),
+            )
+
+    def shard_status(self, run_id: str) -> Dict[int, str]:
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    "SELECT shard_id, status FROM shards WHERE run_id = ?", (run_id,)
+                ).fetchall()
+            )
+
+    def shard_pairs(self, run_id: str, shard_id: int) -> List[Pair]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT pairs FROM shards WHERE run_id = ? AND shard_id = ?", (run_id, shard_id)
+            ).fetchone()
+        return [tuple(pair) for pair in json.loads(found[0])] if found else []
+
+    def shard_error(self, run_id: str, shard_id: int) -> Optional[str]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT error FROM shards WHERE run_id = ? AND shard_id = ?", (run_id, shard_id)
+            ).fetchone()
+        return found[0] if found else None
+
+    def results(self, run_id: str, shard_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Opgeslagen rijen van de gegeven shards."""
+        if not shard_ids:
+            return []
+        placeholders = ",".join("?" * len(shard_ids))
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT row FROM results WHERE run_id = ? AND shard_id IN ({placeholders})",
+                (run_id, *shard_ids),
+            ).fetchall()
+        return [json.loads(raw) for (raw,) in records]
+
+    def has_open_shards(self, run_id: Optional[str] = None) -> bool:
+        """Zijn er shards die nog niet klaar of definitief mislukt zijn?"""
+        run_filter = "AND run_id = ?" if run_id is not None else ""
+        params: Tuple[Any, ...] = (SHARD_WACHTEND, SHARD_BEZIG)
+        if run_id is not None:
+            params += (run_id,)
+        with self._lock:
+            found = self._conn.execute(
+                f"SELECT 1 FROM shards WHERE status IN (?, ?) {run_filter} LIMIT 1", params
+            ).fetchone()
+        return found is not None
+
+    def discard_run(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for table in ("results", "shards", "queue_runs"):
+                self._conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+            self._conn.execute("COMMIT")
+
+
+class LeaseHeartbeat:
+    """
+    Achtergrondthread die de lease van één shard elke
+    lease_seconds / LEASE_RENEWALS_PER_LEASE seconden verlengt, tot het
+    with-blok eindigt of de lease kwijt is (lost wordt dan True).
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        run_id: str,
+        shard_id: int,
+        worker: str,
+        lease_seconds: float,
+    ):
+        self._queue = queue
+        self._args = (run_id, shard_id, worker, lease_seconds)
+        self._interval = lease_seconds / LEASE_RENEWALS_PER_LEASE
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._beat, name=f"lease-{run_id}-{shard_id}", daemon=True
+        )
+        self.lost = False
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self) -> None:
+        while not self._stop.wait(self._interval):
+            if not self._queue.extend_lease(*self._args):
+                self.lost = True
+                return
+
+
+def default_queue_path() -> str:
+    return os.getenv("SUBSIDIEMATCH_WORK_QUEUE_PATH") or local_data_path("work_queue.sqlite")
+
+
+# --------------------------------------------------------
+# PROCESBREDE INSTANTIE
+# --------------------------------------------------------
+_shared_queue: Optional[WorkQueue] = None
+_shared_queue_lock = threading.Lock()
+
+
+def get_work_queue() -> WorkQueue:
+    """Eén verbinding per proces met het wachtrijbestand."""
+    global _shared_queue
+    with _shared_queue_lock:
+        if _shared_queue is None:
+            _shared_queue = WorkQueue(default_queue_path())
+        return _shared_queue
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless workers voor de werkwachtrij.")
+    parser.add_argument("--workers", type=int, default=1, help="Aantal worker-processen")
+    parser.add_argument("--threads", type=int, default=4, help="Gelijktijdige LLM-calls per proces")
+    parser.add_argument("--queue", default=None, help="Pad naar het wachtrijbestand")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Stop na zoveel seconden zonder werk (standaard: blijf wachten)",
+    )
+    args = parser.parse_args()
+
+    # Hier pas importeren: services.matching gebruikt deze module zelf
+    from services.matching import start_shard_workers
+
+    processes = start_shard_workers(
+        args.workers,
+        queue_path=args.queue or default_queue_path(),
+        max_workers=args.threads,
+        idle_timeout=args.idle_timeout,
+    )
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
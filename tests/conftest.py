@@ -0,0 +1,73 @@
+# tests/conftest.py
+"""
+Gedeelde instellingen voor de unit tests.
+
+Caches, checkpoints en andere bestanden op schijf gaan naar een tijdelijke
+map, zodat de tests de lokale datamap van de app niet aanraken. Een key of
+cassette uit de omgeving wordt genegeerd: de tests draaien altijd offline.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ["SUBSIDIEMATCH_DATA_DIR"] = tempfile.mkdtemp(prefix="subsidiematch-tests-")
+
+for name in ("OPENAI_API_KEY", "OPENAI_BASE_URL", "SUBSIDIEMATCH_CASSETTE_MODE", "SUBSIDIEMATCH_CASSETTE_PATH"):
+    os.environ.pop(name, None)
+
+
+import pytest  # noqa: E402
+import streamlit as st  # noqa: E402
+
+
+class FakeLLMClient:
+    """
+    "Echte" client zonder netwerk: elke call geeft score (standaard 70) en
+    wordt onthouden als (organisatie_id, subsidie_id).
+    """
+
+    def __init__(self, score=70):
+        self.score = score
+        self.calls = []
+
+    def is_real(self):
+        return True
+
+    def prompt_budget(self):
+        return None
+
+    def model_name(self):
+        return "nep-model"
+
+    def with_model(self, model):
+        return self
+
+    def score_match_org_subsidy(self, prompt_template, org, subsidie, layout=None):
+        self.calls.append((org["organisatie_id"], subsidie["subsidie_id"]))
+        return {"match_score": self.score, "match_toelichting": ["nep"], "status": "ok"}
+
+
+@pytest.fixture
+def session():
+    """Verse st.session_state met de seed-tabellen (bare mode, zonder streamlit run)."""
+    from data.data_store import init_session_state
+
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    init_session_state()
+    yield st.session_state
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    import services.matching
+
+    client = FakeLLMClient()
+    monkeypatch.setattr(services.matching, "get_llm_client", lambda: client)
+    return client
@@ -0,0 +1,148 @@
+# tests/test_batch_jobs.py
+import json
+
+import pytest
+
+from services.batch_jobs import (
+    LocalBatchBackend,
+    pair_custom_id,
+    read_results_file,
+    score_pairs_via_batch,
+    write_job_file,
+)
+from services.llm_client import LLMClient
+from services.llm_stub_server import deterministic_score
+
+
+TEMPLATE = "Organisatie: {organisatie_naam}\n\nSubsidie: {subsidie_naam}"
+
+
+def _pairs():
+    orgs = [{"organisatie_id": 1, "organisatie_naam": "Acme"}, {"organisatie_id": 2, "organisatie_naam": "Zorg BV"}]
+    subs = [{"subsidie_id": 10, "subsidie_naam": "SDE++"}, {"subsidie_id": 11, "subsidie_naam": "WBSO"}]
+    return [(org, sub) for org in orgs for sub in subs]
+
+
+@pytest.fixture
+def client():
+    return LLMClient(use_cache=False)
+
+
+def test_write_job_file_has_one_request_per_pair(tmp_path, client):
+    path = tmp_path / "job.jsonl"
+    custom_ids = write_job_file(str(path), _pairs(), TEMPLATE, client)
+
+    requests = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert custom_ids == [r["custom_id"] for r in requests]
+    assert custom_ids[1] == pair_custom_id(1, 11)
+    assert requests[1]["url"] == "/v1/chat/completions"
+    assert requests[1]["body"]["messages"][-1]["content"] == "Organisatie: Acme\n\nSubsidie: WBSO"
+
+
+def test_local_backend_round_trip_keeps_pair_order(tmp_path, client):
+    backend = LocalBatchBackend(str(tmp_path / "backend"))
+    pairs = _pairs()
+
+    results = score_pairs_via_batch(
+        pairs, TEMPLATE, client, backend, str(tmp_path / "work"), poll_interval=0
+    )
+
+    assert [r["status"] for r in results] == ["ok"] * len(pairs)
+    expected = [deterministic_score(client.render_prompt(TEMPLATE, org, sub)) for org, sub in pairs]
+    assert [r["match_score"] for r in results] == expected
+
+
+def test_read_results_file_marks_errors_per_line(tmp_path):
+    ok = {"choices": [{"message": {"content": json.dumps({"match_score": 70, "match_toelichting": "past"})}}]}
+    lines = [
+        {"custom_id": "a", "response": {"status_code": 200, "body": ok}, "error": None},
+        {"custom_id": "b", "response": {"status_code": 500, "body": {}}, "error": None},
+        {"custom_id": "c", "response": None, "error": {"message": "kapot"}},
+    ]
+    path = tmp_path / "out.jsonl"
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n\n", encoding="utf-8")
+
+    results = read_results_file(str(path))
+
+    assert results["a"] == {"match_score": 70, "match_toelichting": ["past"], "status": "ok"}
+    assert results["b"]["status"] == "fout" and results["b"]["match_score"] is None
+    assert results["c"]["status"] == "fout"
+
+
+class _FailingBackend(LocalBatchBackend):
+    def status(self, job_id):
+        return "expired"
+
+
+def test_failed_job_marks_every_pair_as_error(tmp_path, client):
+    backend = _FailingBackend(str(tmp_path / "backend"))
+
+    results = score_pairs_via_batch(_pairs(), TEMPLATE, client, backend, str(tmp_path / "work"))
+
+    assert [r["status"] for r in results] == ["fout"] * 4
+
+
+def test_missing_result_marks_pair_as_error(tmp_path, client):
+    class _DroppingBackend(LocalBatchBackend):
+        def download_results(self, job_id, output_path):
+            super().download_results(job_id, output_path)
+            with open(output_path, encoding="utf-8") as fh:
+                lines = fh.readlines()
+            with open(output_path, "w", encoding="utf-8") as fh:
+                fh.writelines(lines[1:])
+
+    backend = _DroppingBackend(str(tmp_path / "backend"))
+    results = score_pairs_via_batch(_pairs(), TEMPLATE, client, backend, str(tmp_path / "work"), poll_interval=0)
+
+    assert [r["status"] for r in results] == ["fout", "ok", "ok", "ok"]
+
+
+def test_no_pairs_submits_nothing(tmp_path, client):
+    assert score_pairs_via_batch([], TEMPLATE, client, None, str(tmp_path)) == []
+
+
+class _CountingBackend(LocalBatchBackend):
+    def __init__(self, workdir):
+        super().__init__(workdir)
+        self.submitted = []
+
+    def submit(self, job_path):
+        job_id = super().submit(job_path)
+        self.submitted.append(job_id)
+        return job_id
+
+
+def test_resumed_job_is_polled_instead_of_resubmitted(tmp_path, client):
+    backend = _CountingBackend(str(tmp_path / "backend"))
+    saved = []
+    workdir = str(tmp_path / "work")
+    first = score_pairs_via_batch(
+        _pairs(), TEMPLATE, client, backend, workdir, poll_interval=0, on_submit=saved.append
+    )
+    assert saved == backend.submitted and len(saved) == 1
+
+    # Hervatten met het bewaarde id, ook voor een deel van de paren
+    again = score_pairs_via_batch(
+        _pairs()[1:], TEMPLATE, client, backend, workdir, poll_interval=0, job_id=saved[0]
+    )
+    assert len(backend.submitted) == 1
+    assert again == first[1:]
+
+
+def test_unknown_or_failed_job_is_resubmitted(tmp_path, client):
+    backend = _CountingBackend(str(tmp_path / "backend"))
+    saved = []
+
+    results = score_pairs_via_batch(
+        _pairs(),
+        TEMPLATE,
+        client,
+        backend,
+        str(tmp_path / "work"),
+        poll_interval=0,
+        job_id="local-batch-bestaat-niet",
+        on_submit=saved.append,
+    )
+
+    assert [r["status"] for r in results] == ["ok"] * 4
+    assert saved == backend.submitted and len(saved) == 1
@@ -0,0 +1,105 @@
+# tests/test_cascade.py
+import numpy as np
+import pandas as pd
+
+from services.cascade import CascadeTracker, escalation_mask, lexical_first_pass
+from services.matching import _iter_cascade_chunks
+
+
+def test_escalation_mask_band_is_inclusive():
+    mask = escalation_mask([0] * 5, [34, 35, 60, 75, 76], band=(35, 75), top_k=0)
+
+    assert mask.tolist() == [False, True, True, True, False]
+
+
+def test_escalation_mask_top_k_per_organisation():
+    orgs = [0, 0, 0, 1, 1, 1]
+    scores = [90, 95, 10, 20, 5, 20]
+    mask = escalation_mask(orgs, scores, band=(40, 60), top_k=1)
+
+    # Per organisatie de hoogste; bij gelijke scores wint het eerste paar
+    assert mask.tolist() == [False, True, False, True, False, False]
+
+
+def test_escalation_mask_failed_scores_always_escalate():
+    mask = escalation_mask([0, 0], [None, 99], band=(40, 60), top_k=0)
+
+    assert mask.tolist() == [True, False]
+    assert escalation_mask([], []).tolist() == []
+
+
+def test_lexical_first_pass_normalises_per_organisation():
+    lexical = np.array([[2.0, 1.0, 0.0], [0.0, 0.0, 0.0]])
+    results = lexical_first_pass(lexical, [(0, 0), (0, 1), (0, 2), (1, 0)])
+
+    assert [r["match_score"] for r in results] == [100, 51, 1, 1]
+    assert all(r["status"] == "ok" for r in results)
+
+
+def test_cascade_chunks_only_send_escalated_pairs_to_strong_model():
+    orgs = [{"organisatie_id": 1}, {"organisatie_id": 2}]
+    subs = [{"subsidie_id": 10 + j} for j in range(4)]
+    candidates = np.ones((2, 4), dtype=bool)
+    candidates[1, 3] = False
+    lexical = np.zeros((2, 4))
+    cheap_scores = {(0, 0): 90, (0, 1): 50, (0, 2): 10, (0, 3): None, (1, 0): 20, (1, 1): 15, (1, 2): 5}
+
+    def cheap_fn(pairs):
+        return [
+            {"status": "fout", "match_toelichting": ["kapot"]}
+            if cheap_scores[p] is None
+            else {"status": "ok", "match_score": cheap_scores[p], "match_toelichting": ["goedkoop"]}
+            for p in pairs
+        ]
+
+    strong_calls = []
+
+    def strong_fn(pairs):
+        strong_calls.extend(pairs)
+        # De sterke call voor (0, 1) mislukt: de goedkope score blijft staan
+        return [
+            {"status": "fout", "match_toelichting": ["time-out"]}
+            if p == (0, 1)
+            else {"status": "ok", "match_score": 70, "match_toelichting": ["sterk"]}
+            for p in pairs
+        ]
+
+    tracker = CascadeTracker("run", "lexicaal", "sterk-model")
+    result = pd.concat(
+        list(
+            _iter_cascade_chunks(
+                orgs,
+                subs,
+                candidates,
+                lexical,
+                {"reason_codes": np.full((2, 4), -1), "reasons": []},
+                cheap_fn,
+                strong_fn,
+                band=(40, 60),
+                top_k=1,
+                chunk_size=4,
+                tracker=tracker,
+            )
+        ),
+        ignore_index=True,
+    )
+
+    assert strong_calls == [(0, 0), (0, 1), (0, 3), (1, 0)]
+    assert result["match_id"].tolist() == list(range(1, 9))
+    assert result["score_bron"].iloc[:7].tolist() == [
+        "sterk:sterk-model",
+        "goedkoop:lexicaal",
+        "goedkoop:lexicaal",
+        "sterk:sterk-model",
+        "sterk:sterk-model",
+        "goedkoop:lexicaal",
+        "goedkoop:lexicaal",
+    ]
+    assert result["match_score"].iloc[1] == 50
+    assert "Escalatie naar sterk-model mislukt" in result["match_toelichting"].iloc[1]
+    # Niet-kandidaat: geen score en geen bron
+    assert result["status"].iloc[7] == "voorgefilterd"
+    assert pd.isna(result["score_bron"].iloc[7])
+
+    report = tracker.report()
+    assert report["n_pairs"] == 7 and report["n_escalated"] == 4
@@ -0,0 +1,93 @@
+# tests/test_cassette.py
+import gzip
+import json
+
+import pytest
+
+from services.cassette import (
+    CASSETTE_RECORD,
+    CASSETTE_REPLAY,
+    Cassette,
+    CassetteMiss,
+    cassette_key,
+)
+from services.llm_client import LLMClient
+
+
+TEMPLATE = "Organisatie: {organisatie_naam}\n\nSubsidie: {subsidie_naam}"
+ORG = {"organisatie_id": 1, "organisatie_naam": "Acme"}
+SUB = {"subsidie_id": 10, "subsidie_naam": "SDE++"}
+USAGE = {"prompt_tokens": 12, "completion_tokens": 5, "cached_tokens": 0}
+
+
+def _record_answer(path, client, content):
+    body = client.chat_request_body(client.render_prompt(TEMPLATE, ORG, SUB))
+    recorder = Cassette(str(path), CASSETTE_RECORD)
+    recorder.record(body, content, USAGE)
+    return body
+
+
+def test_key_ignores_dict_order():
+    assert cassette_key({"a": 1, "b": [1, 2]}) == cassette_key({"b": [1, 2], "a": 1})
+    assert cassette_key({"a": 1}) != cassette_key({"a": 2})
+
+
+def test_replay_returns_recorded_answer_from_file(tmp_path):
+    path = tmp_path / "cassette.jsonl.gz"
+    client = LLMClient(use_cache=False)
+    body = _record_answer(path, client, '{"match_score": 77, "match_toelichting": ["uit opname"]}')
+
+    player = Cassette(str(path), CASSETTE_REPLAY)
+    assert player.replay(body) == ('{"match_score": 77, "match_toelichting": ["uit opname"]}', USAGE)
+
+    with pytest.raises(CassetteMiss):
+        player.replay(dict(body, model="ander-model"))
+    assert player.stats()["hits"] == 1 and player.stats()["misses"] == 1
+
+
+def test_client_replays_without_network(tmp_path):
+    path = tmp_path / "cassette.jsonl.gz"
+    _record_answer(path, LLMClient(use_cache=False), '{"match_score": 77, "match_toelichting": "ok"}')
+
+    client = LLMClient(use_cache=True, cassette=Cassette(str(path), CASSETTE_REPLAY))
+    assert client.is_real() and client.openai_client() is None
+
+    result = client.score_match_org_subsidy(TEMPLATE, ORG, SUB)
+    assert result == {"match_score": 77, "match_toelichting": ["ok"], "status": "ok"}
+
+    # Een prompt zonder opname wordt een fout-resultaat, geen mock-score
+    missing = client.score_match_org_subsidy(TEMPLATE, ORG, dict(SUB, subsidie_naam="WBSO"))
+    assert missing["status"] == "fout"
+
+
+def test_record_skips_known_requests_and_compact_dedups(tmp_path):
+    path = tmp_path / "cassette.jsonl.gz"
+    first = Cassette(str(path), CASSETTE_RECORD)
+    first.record({"p": 1}, "een", {})
+    first.record({"p": 1}, "twee", {})
+    # Een tweede proces vult hetzelfde bestand aan
+    second = Cassette(str(path), CASSETTE_RECORD)
+    second.record({"p": 2}, "drie", {})
+    first.record({"p": 2}, "drie", {})
+
+    first.compact()
+
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        lines = [json.loads(line) for line in fh]
+    assert sorted(line["c"] for line in lines) == ["drie", "een"]
+    assert first.recorded == 2
+
+
+def test_truncated_last_member_keeps_earlier_recordings(tmp_path):
+    path = tmp_path / "cassette.jsonl.gz"
+    recorder = Cassette(str(path), CASSETTE_RECORD)
+    recorder.record({"p": 1}, "een", {})
+    with open(path, "ab") as fh:
+        fh.write(gzip.compress(b'{"k": "x", "c": "half"}\n')[:-6])
+
+    assert Cassette(str(path), CASSETTE_REPLAY).replay({"p": 1}) == ("een", {})
+
+
+def test_unknown_mode_raises(tmp_path):
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path / "c.gz"), "afspelen")
@@ -0,0 +1,109 @@
+# tests/test_checkpoints.py
+import numpy as np
+import pandas as pd
+
+from services.checkpoints import CheckpointStore, run_fingerprint
+from services.matching import _iter_scored_chunks
+
+
+ORGS = pd.DataFrame(
+    [{"organisatie_id": 1, "organisatie_naam": "Acme"}, {"organisatie_id": 2, "organisatie_naam": "Zorg BV"}]
+)
+SUBS = pd.DataFrame(
+    [{"subsidie_id": 10 + j, "subsidie_naam": f"Regeling {j}"} for j in range(3)]
+)
+
+
+def _fingerprint(subs=SUBS, prompt="prompt"):
+    return run_fingerprint(ORGS, subs, prompt, "model", {"batch_size": 1})
+
+
+class _Scorer:
+    """score_fn die bijhoudt welke paren zijn gescoord; paren in fail_once mislukken één keer."""
+
+    def __init__(self, fail_once=()):
+        self.calls = []
+        self.fail_once = set(fail_once)
+
+    def __call__(self, pairs):
+        results = []
+        for org, sub in pairs:
+            key = (org["organisatie_id"], sub["subsidie_id"])
+            self.calls.append(key)
+            if key in self.fail_once:
+                self.fail_once.discard(key)
+                results.append({"status": "fout", "match_toelichting": ["kapot"]})
+            else:
+                score = org["organisatie_id"] * 10 + sub["subsidie_id"]
+                results.append({"status": "ok", "match_score": score, "match_toelichting": ["ok"]})
+        return results
+
+
+def _chunks(run, score_fn):
+    orgs = ORGS.to_dict("records")
+    subs = SUBS.to_dict("records")
+    candidates = np.ones((len(orgs), len(subs)), dtype=bool)
+    return _iter_scored_chunks(orgs, subs, candidates, None, {}, score_fn, 2, run)
+
+
+def test_fingerprint_changes_with_inputs():
+    assert _fingerprint() == _fingerprint()
+    assert _fingerprint(prompt="anders") != _fingerprint()
+    assert _fingerprint(subs=SUBS.assign(subsidie_naam="x")) != _fingerprint()
+    # Kolomvolgorde doet er niet toe
+    assert _fingerprint(subs=SUBS[["subsidie_naam", "subsidie_id"]]) == _fingerprint()
+
+
+def test_interrupted_run_resumes_with_missing_pairs_only(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+
+    # Eerste poging: na twee blokken afgebroken, één call mislukt
+    first = store.open_run(7, _fingerprint(), total=6)
+    scorer = _Scorer(fail_once=[(1, 11)])
+    chunks = _chunks(first, scorer)
+    next(chunks)
+    next(chunks)
+    chunks.close()
+    assert scorer.calls == [(1, 10), (1, 11), (1, 12), (2, 10)]
+    assert store.unfinished_runs()[0]["n_done"] == 3
+
+    # Hervatten: zelfde fingerprint, alleen het mislukte en de ontbrekende paren
+    resumed = store.open_run(7, _fingerprint(), total=6)
+    assert resumed.run_id == first.run_id and resumed.resumed
+    scorer = _Scorer()
+    result = pd.concat(list(_chunks(resumed, scorer)), ignore_index=True)
+
+    assert scorer.calls == [(1, 11), (2, 11), (2, 12)]
+    assert result["match_id"].tolist() == [1, 2, 3, 4, 5, 6]
+    assert (result["status"] == "gescoord").all()
+    assert result["match_score"].tolist() == [20, 21, 22, 30, 31, 32]
+    assert pd.api.types.is_datetime64_any_dtype(result["datum_toegevoegd"])
+
+
+def test_finished_or_other_runs_are_not_resumed(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    run = store.open_run(7, _fingerprint(), total=6)
+    list(_chunks(run, _Scorer()))
+    store.finish_run(run.run_id)
+
+    fresh = store.open_run(7, _fingerprint(), total=6)
+    assert fresh.run_id != run.run_id and not fresh.resumed
+
+    other = store.open_run(7, _fingerprint(prompt="anders"), total=6)
+    assert other.run_id != fresh.run_id
+
+    store.discard_run(fresh.run_id)
+    assert [r["run_id"] for r in store.unfinished_runs()] == [other.run_id]
+
+
+def test_batch_job_id_is_kept_until_the_run_finishes(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    run = store.open_run(7, _fingerprint(), total=6)
+    assert run.batch_job() is None
+
+    run.save_batch_job("batch-123")
+    resumed = store.open_run(7, _fingerprint(), total=6)
+    assert resumed.batch_job() == "batch-123"
+
+    store.finish_run(run.run_id)
+    assert store.batch_job(run.run_id) is None
@@ -0,0 +1,115 @@
+# tests/test_eligibility.py
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from services.eligibility import eligibility_matrix, exclusion_reason, parse_rules
+
+
+TODAY = datetime(2025, 6, 1)
+
+
+def _orgs():
+    return pd.DataFrame(
+        [
+            {"organisatie_id": 1, "sector": "Zorg", "aantal_medewerkers": 40, "omzet": 2_000_000},
+            {"organisatie_id": 2, "sector": "techniek", "aantal_medewerkers": 900, "omzet": 90_000_000},
+            {"organisatie_id": 3, "sector": None, "aantal_medewerkers": None, "omzet": None},
+        ]
+    )
+
+
+def test_parse_rules_accepts_json_dict_and_empty():
+    assert parse_rules('{"sectoren": ["zorg"]}') == {"sectoren": ["zorg"]}
+    assert parse_rules({"max_omzet": 10}) == {"max_omzet": 10}
+    assert parse_rules(None) == {}
+    assert parse_rules("  ") == {}
+    assert parse_rules(float("nan")) == {}
+
+
+def test_parse_rules_rejects_unknown_rules_and_non_objects():
+    with pytest.raises(ValueError):
+        parse_rules('{"sector": ["zorg"]}')
+    with pytest.raises(ValueError):
+        parse_rules("[1, 2]")
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        '{"sectoren": 5}',
+        '{"sectoren": ["zorg", 3]}',
+        '{"locaties": {"stad": "Utrecht"}}',
+        '{"max_medewerkers": "veel"}',
+        '{"min_omzet": [1]}',
+        '{"max_omzet": true}',
+        '{"min_medewerkers": NaN}',
+    ],
+)
+def test_parse_rules_rejects_wrong_value_types(raw):
+    with pytest.raises(ValueError):
+        parse_rules(raw)
+
+
+def test_parse_rules_accepts_string_for_set_rule_and_null_values():
+    assert parse_rules('{"sectoren": "zorg", "max_omzet": null}') == {"sectoren": "zorg", "max_omzet": None}
+    assert parse_rules({"min_omzet": 2.5e6, "max_medewerkers": 250}) == {"min_omzet": 2.5e6, "max_medewerkers": 250}
+
+
+def test_invalid_rules_raise_value_error_from_matrix():
+    subs = pd.DataFrame([{"subsidie_id": 10, "voorwaarden": '{"sectoren": ["zorg", 3]}'}])
+
+    with pytest.raises(ValueError):
+        eligibility_matrix(_orgs(), subs, today=TODAY)
+
+
+def test_set_rule_is_case_insensitive_and_skips_missing_values():
+    subs = pd.DataFrame([{"subsidie_id": 10, "voorwaarden": '{"sectoren": ["ZORG"]}'}])
+    elig = eligibility_matrix(_orgs(), subs, today=TODAY)
+
+    assert elig["eligible"][:, 0].tolist() == [True, False, True]
+    assert exclusion_reason(elig, 1, 0) == "sector niet in: ZORG"
+    assert exclusion_reason(elig, 0, 0) is None
+
+
+def test_range_rules_build_the_full_mask():
+    subs = pd.DataFrame(
+        [
+            {"subsidie_id": 10, "voorwaarden": '{"max_medewerkers": 250}'},
+            {"subsidie_id": 11, "voorwaarden": '{"min_omzet": 5000000}'},
+            {"subsidie_id": 12, "voorwaarden": None},
+        ]
+    )
+    elig = eligibility_matrix(_orgs(), subs, today=TODAY)
+
+    assert elig["eligible"].tolist() == [
+        [True, False, True],
+        [False, True, True],
+        [True, True, True],
+    ]
+    assert exclusion_reason(elig, 1, 0) == "meer dan 250 medewerkers"
+    assert exclusion_reason(elig, 0, 1) == "minder dan 5.000.000 omzet"
+
+
+def test_closed_subsidy_excludes_every_organisation_first():
+    subs = pd.DataFrame(
+        [
+            {"subsidie_id": 10, "sluitingsdatum": "2025-01-01", "voorwaarden": '{"sectoren": ["zorg"]}'},
+            {"subsidie_id": 11, "sluitingsdatum": "2025-12-31", "voorwaarden": None},
+        ]
+    )
+    elig = eligibility_matrix(_orgs(), subs, today=TODAY)
+
+    assert not elig["eligible"][:, 0].any()
+    assert elig["eligible"][:, 1].all()
+    # De eerste reden blijft staan, ook als ook de sectorregel faalt
+    assert exclusion_reason(elig, 1, 0) == "sluitingsdatum 2025-01-01 is verstreken"
+    assert len(set(elig["reason_codes"][:, 0])) == 1
+
+
+def test_empty_inputs_give_empty_matrix():
+    elig = eligibility_matrix(_orgs(), pd.DataFrame(columns=["subsidie_id"]), today=TODAY)
+
+    assert elig["eligible"].shape == (3, 0)
+    assert elig["reasons"] == []
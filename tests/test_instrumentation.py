@@ -0,0 +1,131 @@
+# tests/test_instrumentation.py
+import json
+import threading
+
+import pytest
+
+from services.instrumentation import (
+    Histogram,
+    Metrics,
+    bind,
+    call_labels,
+    estimate_cost,
+)
+
+
+def test_estimate_cost_uses_cached_price_for_cached_tokens(monkeypatch):
+    for name in ("SUBSIDIEMATCH_PRICE_INPUT", "SUBSIDIEMATCH_PRICE_CACHED", "SUBSIDIEMATCH_PRICE_OUTPUT"):
+        monkeypatch.delenv(name, raising=False)
+
+    # 600k ongecached à 0.15, 400k gecached à 0.075, 100k output à 0.60
+    cost = estimate_cost("gpt-4o-mini", 1_000_000, 400_000, 100_000)
+
+    assert cost == pytest.approx(0.09 + 0.03 + 0.06)
+    assert estimate_cost("onbekend-model", 1_000, 0, 1_000) == 0.0
+
+
+def test_histogram_quantile_returns_bucket_bound():
+    histogram = Histogram((1.0, 2.0))
+    for value in (0.5, 0.5, 1.5, 10.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [2, 3, 4]
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(0.75) == 2.0
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) is None
+
+
+def test_calls_are_grouped_by_labels():
+    metrics = Metrics()
+    with call_labels(run_id="run-a", prompt_id=1):
+        metrics.record("gpt-4o-mini", 0.2, prompt_tokens=100, completion_tokens=10)
+        metrics.record("gpt-4o-mini", 0.4, retries=2, error="RateLimitError")
+    with call_labels(run_id="run-b", prompt_id=1):
+        metrics.record("gpt-4o-mini", 0.3, prompt_tokens=50)
+
+    per_run = {row["run_id"]: row for row in metrics.per_run()}
+    assert per_run["run-a"]["calls"] == 2
+    assert per_run["run-a"]["prompt_tokens"] == 100
+    assert per_run["run-a"]["retries"] == 2
+    assert per_run["run-a"]["errors"] == {"RateLimitError": 1}
+    assert metrics.run_stats("run-b")["calls"] == 1
+    assert metrics.run_stats("onbekend") is None
+    assert [row["calls"] for row in metrics.per_prompt()] == [3]
+
+
+def test_bind_carries_labels_into_another_thread():
+    metrics = Metrics()
+    with call_labels(run_id="run-a", prompt_id=7):
+        thread = threading.Thread(target=bind(lambda: metrics.record("gpt-4o-mini", 0.1)))
+        thread.start()
+        thread.join()
+
+    assert [(row["run_id"], row["prompt_id"]) for row in metrics.per_run()] == [("run-a", 7)]
+
+
+def test_oldest_runs_are_retired_but_still_count_per_prompt():
+    metrics = Metrics(max_runs=2)
+    for run_id in ("run-1", "run-2", "run-3"):
+        with call_labels(run_id=run_id, prompt_id=1):
+            metrics.record("gpt-4o-mini", 0.1, prompt_tokens=10)
+
+    assert [row["run_id"] for row in metrics.per_run()] == ["run-2", "run-3"]
+    assert metrics.run_stats("run-1") is None
+
+    per_prompt = metrics.per_prompt()
+    assert [row["calls"] for row in per_prompt] == [3]
+    assert per_prompt[0]["prompt_tokens"] == 30
+    assert per_prompt[0]["wall_histogram"]["0.1"] == 3
+
+
+def test_recent_use_keeps_a_run_from_being_retired():
+    metrics = Metrics(max_runs=2)
+    for run_id in ("run-1", "run-2", "run-1", "run-3"):
+        with call_labels(run_id=run_id, prompt_id=1):
+            metrics.record("gpt-4o-mini", 0.1)
+
+    assert {row["run_id"] for row in metrics.per_run()} == {"run-1", "run-3"}
+    assert metrics.run_stats("run-1")["calls"] == 2
+
+
+def test_prometheus_text_has_counters_errors_and_histograms():
+    metrics = Metrics()
+    with call_labels(run_id='run "a"', prompt_id=3):
+        metrics.record("gpt-4o-mini", 0.2, queue_seconds=0.05, prompt_tokens=100)
+        metrics.record("gpt-4o-mini", 20.0, error="Timeout")
+
+    text = metrics.prometheus_text()
+    labels = 'run_id="run \\"a\\"",prompt_id="3"'
+
+    assert "# TYPE subsidiematch_llm_calls_total counter" in text
+    assert f"subsidiematch_llm_calls_total{{{labels}}} 2" in text
+    assert f"subsidiematch_llm_prompt_tokens_total{{{labels}}} 100" in text
+    assert f'subsidiematch_llm_errors_total{{{labels},error="Timeout"}} 1' in text
+    assert 'error="ok"' not in text
+    assert "# TYPE subsidiematch_llm_call_seconds histogram" in text
+    assert f'subsidiematch_llm_call_seconds_bucket{{{labels},le="0.25"}} 1' in text
+    assert f'subsidiematch_llm_call_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"subsidiematch_llm_call_seconds_count{{{labels}}} 2" in text
+    assert f'subsidiematch_llm_queue_seconds_bucket{{{labels},le="0.1"}} 2' in text
+    assert text.endswith("\n")
+
+
+def test_prometheus_text_without_labels_uses_empty_values():
+    metrics = Metrics()
+    metrics.record("gpt-4o-mini", 0.1)
+
+    assert 'subsidiematch_llm_calls_total{run_id="",prompt_id=""} 1' in metrics.prometheus_text()
+
+
+def test_write_metrics_file_contains_per_run_and_per_prompt(tmp_path):
+    metrics = Metrics()
+    with call_labels(run_id="run-a", prompt_id=1):
+        metrics.record("gpt-4o-mini", 0.1)
+
+    path = metrics.write_metrics_file(str(tmp_path / "metrics.json"))
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    assert data["per_run"][0]["run_id"] == "run-a"
+    assert data["per_prompt"][0]["calls"] == 1
@@ -0,0 +1,101 @@
+# tests/test_jobs.py
+import threading
+import time
+
+from data.data_store import MATCHES_KEY, ORGANISATIONS_KEY, get_table, set_table
+from services.jobs import (
+    JOB_GEANNULEERD,
+    JOB_KLAAR,
+    JOB_MISLUKT,
+    JobRunner,
+    hand_off,
+    hand_off_finished_jobs,
+)
+from services.matching import (
+    RecomputeOptions,
+    drop_matches_for_org,
+    recompute_all_matches,
+    recompute_matches_for_org,
+    start_recompute_job,
+)
+
+
+def _wait(job, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    # finished wordt net na de eindstatus gezet
+    while not job.is_finished() or job.finished is None:
+        assert time.monotonic() < deadline, "job niet op tijd klaar"
+        time.sleep(0.01)
+
+
+def test_runner_statuses_and_handoff_clears_result():
+    runner = JobRunner(max_concurrent_jobs=2)
+    received = []
+
+    done = runner.submit("test", "klaar", lambda job: {"waarde": 1}, received.append)
+    failed = runner.submit("test", "mislukt", lambda job: 1 / 0)
+    release = threading.Event()
+
+    def wait_for_cancel(job):
+        while not release.wait(0.01):
+            job.check_cancelled()
+
+    cancelled = runner.submit("test", "annuleren", wait_for_cancel)
+    runner.cancel(cancelled.job_id)
+    for job in (done, failed, cancelled):
+        _wait(job)
+
+    assert done.status == JOB_KLAAR
+    assert failed.status == JOB_MISLUKT and failed.error.startswith("ZeroDivisionError")
+    assert cancelled.status == JOB_GEANNULEERD
+
+    hand_off(done)
+    hand_off(done)
+    assert received == [{"waarde": 1}]
+    assert done.result is None and done.handed_off
+
+
+def test_purge_removes_only_expired_finished_jobs():
+    runner = JobRunner(ttl_seconds=0)
+    release = threading.Event()
+    # Eerst de lopende job: submit ruimt zelf ook al verlopen jobs op
+    running = runner.submit("test", "loopt", lambda job: release.wait(10))
+    finished = runner.submit("test", "klaar", lambda job: None)
+    _wait(finished)
+    time.sleep(0.01)
+
+    assert runner.purge() == 1
+    assert runner.get(finished.job_id) is None
+    assert runner.get(running.job_id) is running
+    release.set()
+
+
+def test_handoff_keeps_foreground_work_done_during_the_job(session, fake_llm):
+    options = RecomputeOptions(max_workers=1, chunk_size=3, checkpoint=False)
+    recompute_all_matches(options)
+    org_ids = get_table(ORGANISATIONS_KEY)["organisatie_id"].tolist()
+    edited, deleted = org_ids[0], org_ids[-1]
+
+    fake_llm.score = 20
+    job = start_recompute_job(options)
+    _wait(job)
+    assert job.status == JOB_KLAAR
+
+    # Voorgrond, terwijl de job klaarstaat: organisatie bewerkt en opnieuw
+    # gescoord, een andere verwijderd
+    fake_llm.score = 90
+    recompute_matches_for_org(edited)
+    orgs = get_table(ORGANISATIONS_KEY)
+    set_table(ORGANISATIONS_KEY, orgs[orgs["organisatie_id"] != deleted])
+    drop_matches_for_org(deleted)
+    before_ids = get_table(MATCHES_KEY).set_index(["organisatie_id", "subsidie_id"])["match_id"]
+
+    assert hand_off_finished_jobs() == [job]
+
+    matches = get_table(MATCHES_KEY)
+    scored = matches[matches["status"] == "gescoord"]
+    assert set(scored.loc[scored["organisatie_id"] == edited, "match_score"]) == {90}
+    assert set(scored.loc[scored["organisatie_id"] != edited, "match_score"]) == {20}
+    assert deleted not in set(matches["organisatie_id"])
+    assert matches.set_index(["organisatie_id", "subsidie_id"])["match_id"].equals(before_ids)
+
@@ -0,0 +1,115 @@
+# tests/test_matching.py
+import pandas as pd
+
+from data.data_store import MATCHES_KEY, ORGANISATIONS_KEY, SUBSIDIES_KEY, get_table
+from services.matching import (
+    RecomputeOptions,
+    _matches_frame,
+    _merge_matches,
+    iter_recompute_matches,
+    recompute_all_matches,
+)
+
+
+def _rows(pairs, score):
+    return _matches_frame(
+        [
+            {
+                "match_id": None,
+                "subsidie_id": sub_id,
+                "organisatie_id": org_id,
+                "persona_id": None,
+                "type": "organisatie",
+                "match_score": score,
+                "match_toelichting": "",
+                "datum_toegevoegd": pd.Timestamp("2025-01-01"),
+                "status": "gescoord",
+            }
+            for org_id, sub_id in pairs
+        ]
+    )
+
+
+def test_merge_into_empty_table_numbers_from_one():
+    merged = _merge_matches(_matches_frame([]), _rows([(1, 10), (1, 11)], 50))
+
+    assert merged["match_id"].tolist() == [1, 2]
+
+
+def test_merge_keeps_ids_of_existing_pairs_and_appends_new_ones():
+    current = _rows([(1, 10), (1, 11), (2, 10)], 50)
+    current["match_id"] = [3, 7, 5]
+
+    merged = _merge_matches(current, _rows([(2, 10), (3, 10), (1, 10)], 80))
+
+    by_pair = merged.set_index(["organisatie_id", "subsidie_id"])
+    assert by_pair.loc[(1, 10), "match_id"] == 3
+    assert by_pair.loc[(2, 10), "match_id"] == 5
+    assert by_pair.loc[(3, 10), "match_id"] == 8
+    assert by_pair.loc[(1, 11), "match_score"] == 50
+    assert by_pair.loc[(1, 10), "match_score"] == 80
+    assert merged["match_id"].tolist() == [3, 5, 7, 8]
+
+
+def test_merge_chunks_one_by_one_matches_single_merge():
+    pairs = [(org, sub) for org in (1, 2) for sub in (10, 11, 12)]
+    once = _merge_matches(_matches_frame([]), _rows(pairs, 60))
+
+    chunked = _matches_frame([])
+    for start in range(0, len(pairs), 2):
+        chunked = _merge_matches(chunked, _rows(pairs[start : start + 2], 60))
+
+    pd.testing.assert_frame_equal(once, chunked)
+
+
+def test_merge_with_empty_chunk_is_a_no_op():
+    current = _rows([(1, 10)], 50)
+    current["match_id"] = [1]
+
+    assert _merge_matches(current, _matches_frame([])) is current
+
+
+def test_interrupted_recompute_leaves_previous_table_in_place(session, fake_llm):
+    recompute_all_matches(RecomputeOptions(max_workers=1, chunk_size=2, checkpoint=False))
+    before = get_table(MATCHES_KEY).copy()
+    assert set(before.loc[before["status"] == "gescoord", "match_score"]) == {70}
+
+    fake_llm.score = 20
+    chunks = iter_recompute_matches(
+        RecomputeOptions(max_workers=1, chunk_size=2, checkpoint=False)
+    )
+    progress = next(chunks)
+    assert progress["done"] < progress["total"]
+    # De voorlopige top komt uit de voortgang, niet uit de tabel
+    assert set(progress["top"]["match_score"]) == {20}
+    chunks.close()
+
+    pd.testing.assert_frame_equal(get_table(MATCHES_KEY), before)
+
+
+def test_completed_recompute_swaps_in_result_with_stable_ids(session, fake_llm):
+    recompute_all_matches(RecomputeOptions(max_workers=1, chunk_size=2, checkpoint=False))
+    before = get_table(MATCHES_KEY).copy()
+
+    fake_llm.score = 20
+    recompute_all_matches(RecomputeOptions(max_workers=1, chunk_size=2, checkpoint=False))
+    after = get_table(MATCHES_KEY)
+
+    assert set(after.loc[after["status"] == "gescoord", "match_score"]) == {20}
+    assert after[["match_id", "organisatie_id", "subsidie_id"]].equals(
+        before[["match_id", "organisatie_id", "subsidie_id"]]
+    )
+
+
+def test_mock_recompute_names_organisation_and_subsidy(session):
+    recompute_all_matches(RecomputeOptions(checkpoint=False))
+    matches = get_table(MATCHES_KEY)
+    names = matches.merge(
+        get_table(ORGANISATIONS_KEY)[["organisatie_id", "organisatie_naam"]], on="organisatie_id"
+    ).merge(get_table(SUBSIDIES_KEY)[["subsidie_id", "subsidie_naam"]], on="subsidie_id")
+    scored = names[names["status"] == "gescoord"]
+
+    assert len(scored)
+    for row in scored.itertuples():
+        assert f"Organisatie: {row.organisatie_naam}" in row.match_toelichting
+        assert f"Subsidie: {row.subsidie_naam}" in row.match_toelichting
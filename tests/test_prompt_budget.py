@@ -0,0 +1,131 @@
+# tests/test_prompt_budget.py
+from services.prompt_budget import (
+    OMISSION_MARKER,
+    PromptBudget,
+    _count_chars,
+    select_paragraphs,
+)
+from services.prompt_templates import CompiledPrompt
+
+
+TEMPLATE = (
+    "Beoordeel de match.\n\n"
+    "Organisatie: {organisatie_naam}\n"
+    "Profiel: {organisatieprofiel}\n\n"
+    "Subsidie: {subsidie_naam}\n"
+    "Voor wie: {voor_wie}\n"
+    "Tekst: {subsidie_tekst_volledig}\n\n"
+    "Geef JSON terug."
+)
+
+
+def _long_text(n_paragraphs=40):
+    paragraphs = [f"Algemene alinea {i} over procedures en termijnen." for i in range(n_paragraphs)]
+    paragraphs[25] = "Deze regeling is bedoeld voor zorginstellingen met innovatieve thuiszorg."
+    return "\n\n".join(paragraphs)
+
+
+def test_select_paragraphs_keeps_short_text_unchanged():
+    assert select_paragraphs("Korte tekst.", 100, "") == "Korte tekst."
+
+
+def test_select_paragraphs_prefers_anchor_paragraphs_and_marks_gaps():
+    text = _long_text()
+    shortened = select_paragraphs(text, 60, "zorginstellingen thuiszorg")
+
+    assert _count_chars(shortened) <= 60
+    assert "zorginstellingen" in shortened
+    assert OMISSION_MARKER in shortened
+    # Gekozen alinea's blijven in hun oorspronkelijke volgorde
+    kept = [p for p in shortened.split("\n\n") if p != OMISSION_MARKER]
+    assert kept == sorted(kept, key=text.index)
+
+
+def test_select_paragraphs_cuts_single_long_paragraph_on_word_boundary():
+    text = "woord " * 200
+    shortened = select_paragraphs(text, 20, "")
+
+    assert shortened.endswith(" " + OMISSION_MARKER)
+    assert _count_chars(shortened) <= 20
+    assert "woor " not in shortened
+
+
+def _pair():
+    org = {"organisatie_naam": "Zorg BV", "organisatieprofiel": "Thuiszorg in Utrecht."}
+    sub = {
+        "subsidie_naam": "Zorginnovatie",
+        "voor_wie": "zorginstellingen",
+        "subsidie_tekst_volledig": _long_text(200),
+    }
+    return org, sub
+
+
+def test_budget_leaves_prompt_within_limit_untouched():
+    compiled = CompiledPrompt(TEMPLATE)
+    org, sub = _pair()
+    budget = PromptBudget(1_000_000)
+
+    assert budget.render(compiled, org, sub) == compiled.render(org, sub)
+    assert budget.snapshot()["truncated"] == 0
+
+
+def test_budget_shortens_first_priority_field_only():
+    compiled = CompiledPrompt(TEMPLATE)
+    org, sub = _pair()
+    budget = PromptBudget(600, min_field_tokens=16)
+
+    prompt = budget.render(compiled, org, sub)
+
+    assert budget.count(prompt) <= 600
+    assert "Thuiszorg in Utrecht." in prompt
+    assert "zorginstellingen met innovatieve thuiszorg" in prompt
+
+    stats = budget.snapshot()
+    assert stats["prompts"] == 1 and stats["truncated"] == 1
+    assert stats["tokens_saved"] == stats["tokens_before"] - budget.count(prompt)
+
+
+def test_fit_returns_the_fields_render_uses():
+    compiled = CompiledPrompt(TEMPLATE)
+    org, sub = _pair()
+    budget = PromptBudget(600, min_field_tokens=16)
+
+    fitted_org, fitted_sub = budget.fit(compiled, org, sub)
+
+    assert fitted_org == org
+    assert fitted_sub["subsidie_naam"] == sub["subsidie_naam"]
+    assert len(fitted_sub["subsidie_tekst_volledig"]) < len(sub["subsidie_tekst_volledig"])
+    assert compiled.render(fitted_org, fitted_sub) == budget.render(compiled, org, sub)
+    # De invoer zelf wordt niet aangepast
+    assert sub["subsidie_tekst_volledig"] == _long_text(200)
+
+
+def test_min_field_tokens_wins_over_budget():
+    compiled = CompiledPrompt(TEMPLATE)
+    org, sub = _pair()
+    budget = PromptBudget(10, fields=("subsidie_tekst_volledig",), min_field_tokens=128)
+
+    _, fitted_sub = budget.fit(compiled, org, sub)
+
+    assert budget.count(fitted_sub["subsidie_tekst_volledig"]) <= 128
+    assert budget.count(fitted_sub["subsidie_tekst_volledig"]) > 64
+
+
+def test_shortened_text_is_not_reused_across_anchors():
+    compiled = CompiledPrompt(TEMPLATE)
+    org, sub = _pair()
+    paragraphs = sub["subsidie_tekst_volledig"].split("\n\n")
+    paragraphs[150] = "Scholen in het primair onderwijs kunnen lesmateriaal laten ontwikkelen."
+    text = "\n\n".join(paragraphs)
+    zorg = dict(sub, subsidie_tekst_volledig=text)
+    onderwijs = dict(zorg, subsidie_naam="Lesmateriaal", voor_wie="scholen primair onderwijs")
+    budget = PromptBudget(600, min_field_tokens=16)
+
+    _, fitted_zorg = budget.fit(compiled, org, zorg)
+    _, fitted_onderwijs = budget.fit(compiled, org, onderwijs)
+
+    assert "thuiszorg" in fitted_zorg["subsidie_tekst_volledig"]
+    assert "primair onderwijs" in fitted_onderwijs["subsidie_tekst_volledig"]
+    # Zelfde uitkomst als een budget zonder eerdere inkortingen
+    _, fresh = PromptBudget(600, min_field_tokens=16).fit(compiled, org, onderwijs)
+    assert fitted_onderwijs == fresh
@@ -0,0 +1,92 @@
+# tests/test_prompt_templates.py
+import pytest
+
+from data.data_store import _seed_organisations, _seed_prompts, _seed_subsidies
+from services.prompt_templates import (
+    LAYOUT_ORG_VAST,
+    LAYOUT_SUBSIDIE_VAST,
+    LAYOUT_TEMPLATE,
+    PART_ORG,
+    PART_SUBSIDIE,
+    PART_TEKST,
+    CompiledPrompt,
+    _SafeDict,
+    compile_prompt,
+)
+
+
+def _format_map(template, org, sub):
+    return template.format_map(_SafeDict({**org, **sub}))
+
+
+def _seed_pairs():
+    orgs = _seed_organisations().to_dict("records")
+    subs = _seed_subsidies().to_dict("records")
+    return [(org, sub) for org in orgs for sub in subs]
+
+
+@pytest.mark.parametrize("template", _seed_prompts()["prompt_template"].tolist())
+def test_seed_prompts_render_like_format_map(template):
+    compiled = CompiledPrompt(template)
+
+    for org, sub in _seed_pairs():
+        assert compiled.render(org, sub) == _format_map(template, org, sub)
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "Geen velden, {{wel}} accolades.",
+        "{organisatie_naam}",
+        "Intro.\n\nOrg: {organisatie_naam} ({sector})\nSub: {subsidie_naam}\n\nSlot.",
+        "Sub eerst: {subsidie_naam}\n\nOrg: {organisatie_naam}\nWeer sub: {voor_wie}",
+        "Onbekend {foo} en {organisatie_naam!r} met {omzet:>12}",
+        "Dubbel {sector} {sector} en {subsidie_id}{organisatie_id}",
+    ],
+)
+def test_edge_templates_render_like_format_map(template):
+    compiled = CompiledPrompt(template)
+    org = {"organisatie_naam": "Acme", "sector": "zorg", "omzet": 1000, "organisatie_id": 7}
+    sub = {"subsidie_naam": "SDE++", "voor_wie": "mkb", "subsidie_id": 3}
+
+    assert compiled.render(org, sub) == _format_map(template, org, sub)
+
+
+def test_unknown_placeholders_stay_empty():
+    compiled = CompiledPrompt("A{foo}B {organisatie_naam}")
+
+    assert compiled.unknown_placeholders == ["foo"]
+    assert compiled.render({"organisatie_naam": "X", "foo": "lek"}, {}) == "AB X"
+
+
+def test_layouts_reorder_parts_without_losing_text():
+    template = _seed_prompts()["prompt_template"].iloc[0]
+    compiled = CompiledPrompt(template)
+    org, sub = _seed_pairs()[0]
+
+    text = compiled.render_kind(PART_TEKST, {})
+    org_block = compiled.render_kind(PART_ORG, org)
+    sub_block = compiled.render_kind(PART_SUBSIDIE, sub)
+
+    assert compiled.render(org, sub, LAYOUT_ORG_VAST) == text + org_block + sub_block
+    assert compiled.render(org, sub, LAYOUT_SUBSIDIE_VAST) == text + sub_block + org_block
+    assert sorted(compiled.render(org, sub, LAYOUT_ORG_VAST)) == sorted(
+        compiled.render(org, sub, LAYOUT_TEMPLATE)
+    )
+
+
+def test_unknown_layout_raises():
+    with pytest.raises(ValueError):
+        CompiledPrompt("{organisatie_naam}").render({}, {}, "onbekend")
+
+
+def test_values_of_different_types_are_cached_separately():
+    compiled = CompiledPrompt("{omzet}")
+
+    assert compiled.render({"omzet": 1}, {}) == "1"
+    assert compiled.render({"omzet": 1.0}, {}) == "1.0"
+    assert compiled.render({"omzet": True}, {}) == "True"
+
+
+def test_compile_prompt_reuses_compilation():
+    assert compile_prompt("x {sector}") is compile_prompt("x {sector}")
@@ -0,0 +1,96 @@
+# tests/test_retrieval.py
+import numpy as np
+import pandas as pd
+
+from services.retrieval import (
+    BM25Index,
+    lexical_score_matrix,
+    prefilter_recall,
+    select_candidates,
+    tokenize,
+)
+
+
+def test_tokenize_lowercases_and_drops_stopwords():
+    assert tokenize("De Zorg en het ONDERWIJS, 2024!") == ["zorg", "onderwijs", "2024"]
+    assert tokenize(None) == []
+    assert tokenize(float("nan")) == []
+
+
+def test_bm25_ranks_matching_document_first():
+    index = BM25Index([["zorg", "ouderen"], ["techniek", "ai"], ["zorg", "zorg", "ai"]])
+    scores = index.score(["zorg"])
+
+    assert scores[1] == 0.0
+    assert scores[2] > scores[0] > 0.0
+
+
+def test_bm25_rare_terms_weigh_more():
+    index = BM25Index([["zorg", "ai"], ["zorg"], ["zorg"], ["techniek"]])
+    scores = index.score(["zorg", "ai"])
+
+    # Alleen document 0 bevat het zeldzame "ai"
+    assert np.argmax(scores) == 0
+
+
+def test_lexical_score_matrix_shape_and_order():
+    orgs = pd.DataFrame(
+        [
+            {"organisatie_id": 1, "organisatieprofiel": "Thuiszorg voor ouderen"},
+            {"organisatie_id": 2, "organisatieprofiel": "Softwarebedrijf in AI"},
+        ]
+    )
+    subs = pd.DataFrame(
+        [
+            {"subsidie_id": 10, "subsidie_naam": "AI-innovatie", "voor_wie": "mkb"},
+            {"subsidie_id": 11, "subsidie_naam": "Thuiszorg", "voor_wie": "ouderen"},
+        ]
+    )
+    matrix = lexical_score_matrix(orgs, subs)
+
+    assert matrix.shape == (2, 2)
+    assert matrix[0, 1] > matrix[0, 0]
+    assert matrix[1, 0] > matrix[1, 1]
+
+
+def test_select_candidates_top_k_is_stable_on_ties():
+    scores = np.array([[1.0, 3.0, 3.0, 0.0]])
+    mask = select_candidates(scores, top_k=2)
+
+    assert mask.tolist() == [[False, True, True, False]]
+    # Bij gelijke scores wint de eerdere subsidie
+    assert select_candidates(scores, top_k=1).tolist() == [[False, True, False, False]]
+
+
+def test_select_candidates_combines_top_k_and_min_score():
+    scores = np.array([[5.0, 1.0, 4.0], [0.0, 0.5, 0.2]])
+    mask = select_candidates(scores, top_k=1, min_score=4.0)
+
+    assert mask.tolist() == [[True, False, True], [False, True, False]]
+
+
+def test_select_candidates_without_criteria_selects_everything():
+    assert select_candidates(np.zeros((2, 3))).all()
+
+
+def test_prefilter_recall_counts_relevant_pairs_only():
+    candidates = pd.DataFrame(
+        {
+            "organisatie_id": [1, 1, 2],
+            "subsidie_id": [10, 11, 10],
+            "kandidaat": [True, False, True],
+        }
+    )
+    reference = pd.DataFrame(
+        {
+            "organisatie_id": [1, 1, 2],
+            "subsidie_id": [10, 11, 10],
+            "match_score": [80, 70, 20],
+            "status": ["gescoord", "gescoord", "gescoord"],
+        }
+    )
+    report = prefilter_recall(candidates, reference)
+
+    assert report["n_relevant"] == 2
+    assert report["n_found"] == 1
+    assert report["recall"] == 0.5
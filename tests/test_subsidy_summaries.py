@@ -0,0 +1,133 @@
+# tests/test_subsidy_summaries.py
+import pytest
+
+import services.subsidy_summaries as summaries
+from services.subsidy_summaries import (
+    METHOD_EXTRACTIEF,
+    SUMMARY_FIELD,
+    SummaryStore,
+    extractive_summary,
+    format_summary,
+    invalidate_subsidy_summary,
+    summary_key,
+    uses_summary,
+    with_summaries,
+)
+
+
+TEMPLATE = "Subsidie:\n{subsidie_samenvatting}\n\nOrganisatie: {organisatie_naam}"
+
+
+class _MockClient:
+    def is_real(self):
+        return False
+
+
+class _RealClient:
+    def __init__(self, parsed=None, fail=False):
+        self.parsed = parsed
+        self.fail = fail
+        self.prompts = []
+
+    def is_real(self):
+        return True
+
+    def model_name(self):
+        return "nep-model"
+
+    def complete_json(self, prompt, max_tokens=None):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("API niet bereikbaar")
+        return self.parsed
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SummaryStore(str(tmp_path / "summaries.sqlite"))
+    monkeypatch.setattr(summaries, "_shared_store", store)
+    return store
+
+
+def _sub(subsidie_id=1, tekst="Deze regeling steunt innovatie. Meer tekst volgt. Slot."):
+    return {
+        "subsidie_id": subsidie_id,
+        "subsidie_naam": f"Regeling {subsidie_id}",
+        "subsidie_tekst_volledig": tekst,
+        "voor_wie": "Mkb-bedrijven.",
+        "samenvatting_eisen": "- Vestiging in Nederland\n- Minder dan 250 medewerkers",
+    }
+
+
+def test_summary_key_follows_content_and_method():
+    sub = _sub()
+
+    assert summary_key(sub, "model-a") == summary_key(dict(sub, subsidie_naam="Anders"), "model-a")
+    assert summary_key(sub, "model-a") != summary_key(sub, "model-b")
+    assert summary_key(sub, "model-a") != summary_key(_sub(tekst="Andere tekst."), "model-a")
+
+
+def test_format_summary_strips_bullets_and_skips_empty_parts():
+    text = format_summary(
+        {"doel": "Innovatie", "doelgroep": "", "eisen": ["- Eis 1", "", "• Eis 2"], "uitsluitingen": []}
+    )
+
+    assert text == "Doel: Innovatie\nEisen:\n- Eis 1\n- Eis 2"
+
+
+def test_extractive_summary_takes_first_sentences():
+    text = extractive_summary(_sub())
+
+    assert "Doel: Deze regeling steunt innovatie. Meer tekst volgt." in text
+    assert "Slot." not in text
+    assert "- Vestiging in Nederland" in text
+
+
+def test_uses_summary_only_for_templates_with_the_placeholder():
+    assert uses_summary([TEMPLATE])
+    assert not uses_summary(["Subsidie: {subsidie_naam}"])
+
+
+def test_without_placeholder_records_are_returned_unchanged(store):
+    subs = [_sub()]
+
+    assert with_summaries(subs, _MockClient(), ["{subsidie_naam}"]) is subs
+    assert store.stats()["entries"] == 0
+
+
+def test_mock_summaries_are_stored_once_per_content(store):
+    subs = [_sub(1), _sub(2)]  # zelfde inhoud, andere id
+
+    first = with_summaries(subs, _MockClient(), [TEMPLATE])
+    second = with_summaries(subs, _MockClient(), [TEMPLATE])
+
+    assert first == second
+    assert first[0][SUMMARY_FIELD] == extractive_summary(subs[0])
+    assert store.stats()["entries"] == 1
+    assert store.stats()["hits"] >= 1
+
+
+def test_llm_summary_is_stored_under_the_model(store):
+    client = _RealClient({"doel": "Innovatie stimuleren", "eisen": ["Mkb"]})
+
+    result = with_summaries([_sub()], client, [TEMPLATE])
+
+    assert result[0][SUMMARY_FIELD] == "Doel: Innovatie stimuleren\nEisen:\n- Mkb"
+    assert store.get(summary_key(_sub(), "nep-model")) == result[0][SUMMARY_FIELD]
+    assert store.get(summary_key(_sub(), METHOD_EXTRACTIEF)) is None
+
+
+def test_failed_llm_call_falls_back_without_storing(store):
+    result = with_summaries([_sub()], _RealClient(fail=True), [TEMPLATE])
+
+    assert result[0][SUMMARY_FIELD] == extractive_summary(_sub())
+    assert store.stats()["entries"] == 0
+
+
+def test_invalidate_removes_summaries_of_one_subsidy(store):
+    with_summaries([_sub(1), _sub(2, tekst="Iets anders.")], _MockClient(), [TEMPLATE])
+
+    invalidate_subsidy_summary(1)
+
+    assert store.latest(1) is None
+    assert store.latest(2) is not None
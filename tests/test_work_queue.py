@@ -0,0 +1,144 @@
+# tests/test_work_queue.py
+import threading
+import time
+
+import pytest
+
+from services.matching import run_shard_worker
+from services.work_queue import (
+    MAX_ATTEMPTS,
+    SHARD_BY_HASH,
+    SHARD_KLAAR,
+    SHARD_MISLUKT,
+    SHARD_WACHTEND,
+    WorkQueue,
+    shard_pairs,
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / "queue.sqlite"))
+
+
+def _pairs(n_orgs, n_subs):
+    return [(i * n_subs + j + 1, i, j) for i in range(n_orgs) for j in range(n_subs)]
+
+
+def test_shard_by_organisation_keeps_organisations_together():
+    shards = shard_pairs(_pairs(4, 3), 2)
+
+    assert len(shards) == 2
+    assert sum(len(shard) for shard in shards) == 12
+    org_sets = [{i for _, i, _ in shard} for shard in shards]
+    assert not org_sets[0] & org_sets[1]
+
+
+def test_shard_by_hash_is_stable_and_complete():
+    pairs = _pairs(5, 5)
+    first = shard_pairs(pairs, 3, SHARD_BY_HASH, org_ids=list("abcde"), sub_ids=list(range(5)))
+    again = shard_pairs(pairs, 3, SHARD_BY_HASH, org_ids=list("abcde"), sub_ids=list(range(5)))
+
+    assert first == again
+    assert sorted(pair for shard in first for pair in shard) == pairs
+    with pytest.raises(ValueError):
+        shard_pairs(pairs, 3, "willekeurig")
+
+
+def test_claim_complete_and_first_result_wins(queue):
+    run_id = queue.create_run({"x": 1}, [[(1, 0, 0), (2, 0, 1)]])
+
+    claimed = queue.claim("w1", run_id)
+    assert claimed == (run_id, 0, [(1, 0, 0), (2, 0, 1)])
+    assert queue.claim("w2", run_id) is None
+
+    queue.complete(run_id, 0, [{"match_id": 1, "v": "eerste"}, {"match_id": 2, "v": "eerste"}])
+    queue.complete(run_id, 0, [{"match_id": 1, "v": "tweede"}])
+
+    assert queue.shard_status(run_id) == {0: SHARD_KLAAR}
+    assert sorted(row["v"] for row in queue.results(run_id, [0])) == ["eerste", "eerste"]
+    assert not queue.has_open_shards(run_id)
+
+
+def test_expired_lease_is_reclaimed(queue):
+    run_id = queue.create_run({}, [[(1, 0, 0)]])
+    queue.claim("w1", run_id, lease_seconds=0.05)
+    time.sleep(0.1)
+
+    assert queue.claim("w2", run_id)[1] == 0
+    # De oude worker is zijn shard kwijt en kan de lease niet meer verlengen
+    assert not queue.extend_lease(run_id, 0, "w1")
+    assert queue.extend_lease(run_id, 0, "w2")
+
+
+def test_extended_lease_is_not_reclaimed(queue):
+    run_id = queue.create_run({}, [[(1, 0, 0)]])
+    queue.claim("w1", run_id, lease_seconds=0.2)
+
+    with queue.lease_heartbeat(run_id, 0, "w1", lease_seconds=0.2) as heartbeat:
+        time.sleep(0.5)
+        assert queue.claim("w2", run_id) is None
+    assert not heartbeat.lost
+
+
+def test_heartbeat_notices_lost_lease(queue):
+    run_id = queue.create_run({}, [[(1, 0, 0)]])
+    queue.claim("w1", run_id, lease_seconds=0.1)
+    queue.discard_run(run_id)
+
+    with queue.lease_heartbeat(run_id, 0, "w1", lease_seconds=0.1) as heartbeat:
+        time.sleep(0.2)
+    assert heartbeat.lost
+
+
+def test_failed_shard_is_retried_until_max_attempts(queue):
+    run_id = queue.create_run({}, [[(1, 0, 0)]])
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        assert queue.claim("w1", run_id) is not None
+        queue.fail(run_id, 0, f"poging {attempt}")
+        expected = SHARD_MISLUKT if attempt == MAX_ATTEMPTS else SHARD_WACHTEND
+        assert queue.shard_status(run_id) == {0: expected}
+
+    assert queue.claim("w1", run_id) is None
+    assert queue.shard_error(run_id, 0) == f"poging {MAX_ATTEMPTS}"
+
+
+def test_slow_shard_is_scored_once_with_two_workers(queue, fake_llm):
+    # De shard duurt ruim drie keer de lease; zonder heartbeat zou de
+    # tweede worker de shard halverwege overnemen en alles opnieuw scoren
+    score = fake_llm.score_match_org_subsidy
+
+    def slow_score(*args, **kwargs):
+        time.sleep(0.2)
+        return score(*args, **kwargs)
+
+    fake_llm.score_match_org_subsidy = slow_score
+    orgs = [{"organisatie_id": 1}]
+    subs = [{"subsidie_id": 10 + j} for j in range(5)]
+    context = {
+        "organisations": orgs,
+        "subsidies": subs,
+        "prompt_template": "{organisatie_id} {subsidie_id}",
+        "prompt_layout": "template",
+        "run_id": "test",
+        "prompt_id": None,
+    }
+    run_id = queue.create_run(context, [_pairs(1, 5)])
+
+    workers = [
+        threading.Thread(
+            target=run_shard_worker,
+            args=(queue.path, f"w{n}"),
+            kwargs={"run_id": run_id, "max_workers": 1, "lease_seconds": 0.3},
+        )
+        for n in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+        time.sleep(0.05)
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert sorted(fake_llm.calls) == [(1, 10 + j) for j in range(5)]
+    assert queue.shard_status(run_id) == {0: SHARD_KLAAR}
+    assert len(queue.results(run_id, [0])) == 5
@@ -10,6 +10,7 @@ from data.data_store import (
     next_id,
     set_table,
 )
+from services.matching import drop_matches_for_org, recompute_matches_for_org
 
 
 def render_companies() -> None:
@@ -233,6 +234,7 @@ def _update_org(
     orgs_df.at[i, "organisatieprofiel"] = profiel
 
     set_table(ORGANISATIONS_KEY, orgs_df)
+    recompute_matches_for_org(org_id)
 
 
 def _render_add_delete_org(orgs_df: pd.DataFrame) -> None:
@@ -332,8 +334,10 @@ def _add_org(
         ignore_index=True,
     )
     set_table(ORGANISATIONS_KEY, new_df)
+    recompute_matches_for_org(new_id)
 
 
 def _delete_org(orgs_df: pd.DataFrame, org_id: int) -> None:
     new_df = orgs_df[orgs_df["organisatie_id"] != org_id].copy()
     set_table(ORGANISATIONS_KEY, new_df)
+    drop_matches_for_org(org_id)
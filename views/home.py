@@ -1,9 +1,66 @@
 # views/home.py
+import pandas as pd
 import streamlit as st
 
-from data.data_store import get_active_prompt, get_table, PROMPTS_KEY, MATCHES_KEY
-from services.matching import recompute_all_matches, update_prompt_template
+from data.data_store import (
+    get_active_prompt,
+    get_table,
+    MATCHES_KEY,
+    ORGANISATIONS_KEY,
+    PROMPTS_KEY,
+    SUBSIDIES_KEY,
+)
+from services.matching import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PROMPT_LAYOUT,
+    PREFILTER_REPORT_KEY,
+    RecomputeOptions,
+    failed_matches,
+    iter_recompute_matches,
+    recompute_all_matches,
+    retry_failed_matches,
+    start_recompute_job,
+    update_prompt_template,
+)
+from services.batch_jobs import BATCH_BACKENDS
+from services.cascade import (
+    CASCADE_LEXICAAL,
+    CASCADE_MODEL,
+    CASCADE_REPORT_KEY,
+    DEFAULT_CASCADE_BAND,
+    DEFAULT_CASCADE_TOP_K,
+    DEFAULT_STRONG_MODEL,
+)
+from services.checkpoints import get_checkpoint_store
+from services.instrumentation import get_metrics
+from services.jobs import (
+    JOB_BEZIG,
+    JOB_KLAAR,
+    get_job_runner,
+    hand_off,
+    has_active_jobs,
+    session_jobs,
+)
 from services.llm_client import get_llm_client
+from services.newsletters import start_newsletter_job
+from services.prompt_templates import PROMPT_LAYOUTS, compile_prompt
+from services.rate_limit import get_rate_limiter
+from services.score_cache import get_score_cache
+from services.shadow_eval import (
+    DEFAULT_SAMPLE_SIZE,
+    DEFAULT_TOP_K,
+    SHADOW_REPORT_KEY,
+    shadow_evaluate,
+)
+from services.work_queue import SHARD_BY
+
+# Bovengrens voor het aantal parallelle LLM-calls; een hogere standaard uit
+# SUBSIDIEMATCH_MAX_WORKERS verhoogt de grens mee
+_MAX_WORKERS_LIMIT = max(64, DEFAULT_MAX_WORKERS)
+
+# Idem voor het aantal subsidies per LLM-call (SUBSIDIEMATCH_BATCH_SIZE)
+_BATCH_SIZE_LIMIT = max(25, DEFAULT_BATCH_SIZE)
 
 
 def render_home() -> None:
@@ -92,7 +149,15 @@ def _render_prompt_editor() -> None:
         return
 
     llm_client = get_llm_client()
-    if llm_client.is_real():
+    cassette = llm_client.cassette()
+    if cassette is not None and cassette.replaying:
+        st.info(
+            f"Cassette-modus: antwoorden worden afgespeeld uit {cassette.path} "
+            f"({len(cassette)} opnames). Er gaan geen calls naar OpenAI."
+        )
+    elif llm_client.is_real():
+        if cassette is not None:
+            st.caption(f"Antwoorden worden opgenomen in {cassette.path}.")
         st.info(
             "Er is een OPENAI_API_KEY geconfigureerd. Matches gebruiken de echte LLM-backend."
         )
@@ -121,27 +186,658 @@ def _render_prompt_editor() -> None:
         height=300,
         help=(
             "Gebruik placeholders zoals {organisatieprofiel}, {subsidie_naam}, {bron}, "
-            "{voor_wie}, {samenvatting_eisen}."
+            "{voor_wie}, {samenvatting_eisen}. {subsidie_samenvatting} is een beknopte, "
+            "eenmalig gemaakte samenvatting van de subsidie in plaats van de volledige tekst."
         ),
     )
+    template_error = _render_template_check(new_template)
 
     # Bepaal of er al matches bestaan
     matches_df = get_table(MATCHES_KEY)
     has_matches = not matches_df.empty
     button_label = "Alle matches opnieuw berekenen" if has_matches else "Genereer matches"
 
-    col_save, col_recompute = st.columns([1, 2])
+    max_workers = st.number_input(
+        "Aantal parallelle LLM-calls",
+        min_value=1,
+        max_value=_MAX_WORKERS_LIMIT,
+        value=max(1, DEFAULT_MAX_WORKERS),
+        step=1,
+        help=(
+            "Bij 1 worden de combinaties één voor één gescoord. Over alle sessies heen "
+            "begrenst de gedeelde OpenAI-limiter het werkelijke aantal gelijktijdige calls."
+        ),
+    )
+    batch_size = st.number_input(
+        "Subsidies per LLM-call",
+        min_value=1,
+        max_value=_BATCH_SIZE_LIMIT,
+        value=max(1, DEFAULT_BATCH_SIZE),
+        step=1,
+        help=(
+            "Bij meer dan 1 gaat het organisatieblok van de prompt één keer mee voor "
+            "meerdere subsidies. Ontbrekende of ongeldige antwoorden worden alsnog per "
+            "paar gescoord."
+        ),
+    )
+
+    prompt_layout = st.selectbox(
+        "Volgorde in de prompt",
+        options=list(PROMPT_LAYOUTS),
+        index=list(PROMPT_LAYOUTS).index(DEFAULT_PROMPT_LAYOUT),
+        format_func=_PROMPT_LAYOUT_LABELS.get,
+        help=(
+            "Vaste tekst eerst en de wisselende entiteit als laatste laat opeenvolgende "
+            "calls een langer gemeenschappelijk begin delen, zodat de prompt-cache van "
+            "OpenAI meer input-tokens goedkoper hergebruikt."
+        ),
+    )
+
+    with st.expander("Lexicale voorselectie (BM25)", expanded=False):
+        st.caption(
+            "Scoor alleen de lexicaal meest relevante subsidies per organisatie met de LLM. "
+            "Overige paren krijgen status 'voorgefilterd'."
+        )
+        col_k, col_min = st.columns(2)
+        with col_k:
+            prefilter_top_k = st.number_input(
+                "Top-K subsidies per organisatie (0 = uit)",
+                min_value=0,
+                value=0,
+                step=1,
+            )
+        with col_min:
+            prefilter_min_score = st.number_input(
+                "Of BM25-score minimaal (0 = uit)",
+                min_value=0.0,
+                value=0.0,
+                step=0.5,
+            )
+        _render_prefilter_report()
+
+    with st.expander("Tijd- en callbudget", expanded=False):
+        st.caption(
+            "Scoor de belangrijkste paren eerst (lexicale score, sector, sluitingsdatum, "
+            "nog nooit gescoord) en stop zodra het budget op is. Overige paren krijgen "
+            "status 'buiten_budget' en houden hun eerdere score."
+        )
+        col_time, col_calls = st.columns(2)
+        with col_time:
+            time_budget_min = st.number_input(
+                "Tijdsbudget in minuten (0 = onbeperkt)",
+                min_value=0.0,
+                value=0.0,
+                step=1.0,
+            )
+        with col_calls:
+            call_budget = st.number_input(
+                "Maximaal aantal paren naar de LLM (0 = onbeperkt)",
+                min_value=0,
+                value=0,
+                step=50,
+            )
+
+    with st.expander("Meerdere worker-processen", expanded=False):
+        st.caption(
+            "Verdeel de paren in shards over een lokale wachtrij en laat meerdere "
+            "processen tegelijk scoren. Elk proces krijgt een evenredig deel van de "
+            "OpenAI-limieten. Werkt niet samen met een budget."
+        )
+        col_workers, col_shard_by = st.columns(2)
+        with col_workers:
+            shard_workers = st.number_input(
+                "Aantal worker-processen (0 = alles in dit proces)",
+                min_value=0,
+                max_value=32,
+                value=0,
+                step=1,
+            )
+        with col_shard_by:
+            shard_by = st.selectbox(
+                "Verdeling over shards",
+                options=list(SHARD_BY),
+                help="'organisatie': aaneengesloten organisaties; 'hash': gelijkmatig per paar.",
+            )
+
+    with st.expander("Modelcascade (goedkoop → sterk)", expanded=False):
+        st.caption(
+            "Een goedkope scorer beoordeelt eerst alle paren; alleen twijfelgevallen en de "
+            "beste paren per organisatie gaan naar een sterker model. Werkt niet samen met "
+            "een budget, worker-processen of een offline batch-job."
+        )
+        col_cheap, col_strong = st.columns(2)
+        with col_cheap:
+            cascade = st.selectbox(
+                "Goedkope eerste ronde",
+                options=["", CASCADE_MODEL, CASCADE_LEXICAAL],
+                format_func=_CASCADE_LABELS.get,
+            )
+        with col_strong:
+            strong_model = st.text_input("Sterk model", value=DEFAULT_STRONG_MODEL)
+        col_band, col_top_k = st.columns(2)
+        with col_band:
+            cascade_band = st.slider(
+                "Onzekere band (scores die escaleren)",
+                min_value=1,
+                max_value=100,
+                value=DEFAULT_CASCADE_BAND,
+            )
+        with col_top_k:
+            cascade_top_k = st.number_input(
+                "Altijd escaleren: top-K per organisatie",
+                min_value=0,
+                value=DEFAULT_CASCADE_TOP_K,
+                step=1,
+            )
+        _render_cascade_report()
+
+    recompute_options = RecomputeOptions(
+        max_workers=int(max_workers),
+        prefilter_top_k=int(prefilter_top_k) or None,
+        prefilter_min_score=float(prefilter_min_score) or None,
+        batch_size=int(batch_size),
+        time_budget=float(time_budget_min) * 60 or None,
+        call_budget=int(call_budget) or None,
+        prompt_layout=prompt_layout,
+        shard_workers=int(shard_workers) or None,
+        shard_by=shard_by,
+        cascade=cascade or None,
+        cascade_band=tuple(cascade_band),
+        cascade_top_k=int(cascade_top_k),
+        strong_model=strong_model.strip() or None,
+    )
+
+    col_save, col_recompute, col_background = st.columns([1, 2, 2])
 
     with col_save:
         if st.button("Prompt opslaan"):
-            update_prompt_template(new_template)
-            st.success("Prompt opgeslagen.")
+            if template_error:
+                st.error("Prompt niet opgeslagen: het template is ongeldig.")
+            else:
+                update_prompt_template(new_template)
+                st.success("Prompt opgeslagen.")
 
     with col_recompute:
         if st.button(button_label):
-            with st.spinner("Matches worden berekend..."):
-                recompute_all_matches()
-            st.success("Matches zijn bijgewerkt.")
+            try:
+                _run_recompute_with_progress(recompute_options)
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                st.success("Matches zijn bijgewerkt.")
+
+    with col_background:
+        if st.button("Op de achtergrond starten"):
+            if start_recompute_job(recompute_options) is not None:
+                st.success("Herberekening gestart; de voortgang staat hieronder bij 'Achtergrondjobs'.")
+
+    _render_failed_pairs(int(max_workers))
+
+    with st.expander("Offline batch-job (goedkoop, niet-interactief)", expanded=False):
+        st.caption(
+            "Schrijft alle prompts naar een JSONL-jobbestand, dient dat in bij een batch-backend "
+            "en koppelt de resultaten per paar terug. 'local' is een offline stand-in. "
+            "Wordt de run onderbroken, dan pakt een nieuwe run met dezelfde instellingen "
+            "(zonder callbudget) de al ingediende job weer op."
+        )
+        backend_name = st.selectbox("Batch-backend", options=list(BATCH_BACKENDS))
+        if st.button("Herbereken via batch-job"):
+            with st.spinner("Batch-job loopt; dit kan bij de OpenAI-backend uren duren..."):
+                try:
+                    recompute_all_matches(
+                        RecomputeOptions(
+                            prefilter_top_k=int(prefilter_top_k) or None,
+                            prefilter_min_score=float(prefilter_min_score) or None,
+                            call_budget=int(call_budget) or None,
+                            batch_backend=backend_name,
+                            batch_poll_interval=1.0 if backend_name == "local" else 30.0,
+                        )
+                    )
+                except ValueError as exc:
+                    st.error(str(exc))
+                else:
+                    st.success("Matches zijn bijgewerkt via batch-job.")
+
+    with st.expander("Schaduwevaluatie op een steekproef", expanded=False):
+        st.caption(
+            "Scoor een gestratificeerde steekproef (sector, bron, scoreband) met het "
+            "template hierboven en vergelijk met de actieve prompt, zonder de matches "
+            "te wijzigen. Zo betaal je pas voor een volledige herberekening als de "
+            "nieuwe prompt de moeite waard is."
+        )
+        col_n, col_k = st.columns(2)
+        with col_n:
+            sample_size = st.number_input(
+                "Steekproefgrootte (paren)",
+                min_value=5,
+                value=DEFAULT_SAMPLE_SIZE,
+                step=10,
+            )
+        with col_k:
+            top_k = st.number_input(
+                "K voor top-K-overlap",
+                min_value=1,
+                value=DEFAULT_TOP_K,
+                step=1,
+            )
+        if st.button("Evalueer template op steekproef", disabled=template_error):
+            with st.spinner("Steekproef wordt gescoord..."):
+                st.session_state[SHADOW_REPORT_KEY] = shadow_evaluate(
+                    get_table(ORGANISATIONS_KEY),
+                    get_table(SUBSIDIES_KEY),
+                    matches_df,
+                    current_template,
+                    new_template,
+                    llm_client,
+                    sample_size=int(sample_size),
+                    top_k=int(top_k),
+                    max_workers=int(max_workers),
+                )
+        _render_shadow_report()
+
+    _render_unfinished_runs()
+    _render_score_cache_stats()
+    _render_rate_limit_stats()
+    _render_prompt_budget_stats(llm_client)
+    _render_llm_metrics()
+
+    st.markdown("---")
+    _render_background_jobs()
+
+
+_PROMPT_LAYOUT_LABELS = {
+    "template": "Zoals het template is geschreven",
+    "org_vast": "Vaste tekst → organisatie → subsidie",
+    "subsidie_vast": "Vaste tekst → subsidie → organisatie (per subsidie doorlopen)",
+}
+
+_CASCADE_LABELS = {
+    "": "Uit (alles met het standaardmodel)",
+    CASCADE_MODEL: "Standaardmodel van de client",
+    CASCADE_LEXICAAL: "Lexicale score (geen LLM-calls)",
+}
+
+
+def _render_failed_pairs(max_workers: int) -> None:
+    """Aantal paren met een mislukte LLM-call, met een knop om alleen die te herstellen."""
+    n_failed = len(failed_matches(get_table(MATCHES_KEY)))
+    if not n_failed:
+        return
+
+    st.warning(
+        f"{n_failed} paren hebben status 'fout': de LLM-call mislukte en ze hebben geen score."
+    )
+    if st.button(f"Alleen mislukte paren opnieuw scoren ({n_failed})"):
+        with st.spinner("Mislukte paren worden opnieuw gescoord..."):
+            outcome = retry_failed_matches(max_workers=max_workers)
+        st.success(
+            f"{outcome['hersteld']} van {outcome['opnieuw']} paren hersteld"
+            + (f"; {outcome['nog_fout']} nog steeds mislukt." if outcome["nog_fout"] else ".")
+        )
+
+
+def _render_template_check(template: str) -> bool:
+    """Meld onbekende placeholders en syntaxfouten; True bij een ongeldig template."""
+    try:
+        compiled = compile_prompt(template)
+    except ValueError as exc:
+        st.error(f"Ongeldig prompt-template (controleer de accolades): {exc}")
+        return True
+
+    if compiled.unknown_placeholders:
+        names = ", ".join(f"{{{name}}}" for name in compiled.unknown_placeholders)
+        st.warning(f"Onbekende placeholders, deze worden leeg ingevuld: {names}")
+    return False
+
+
+def _run_recompute_with_progress(options: RecomputeOptions) -> None:
+    """Herbereken matches met voortgangsbalk en live topresultaten."""
+    bar = st.progress(0.0, text="Matches worden berekend...")
+    live = st.empty()
+
+    for progress in iter_recompute_matches(options):
+        bar.progress(_progress_fraction(progress), text=_format_progress(progress))
+        if not progress["top"].empty:
+            live.dataframe(
+                progress["top"][["organisatie_id", "subsidie_id", "match_score", "status"]],
+                use_container_width=True,
+            )
+
+    bar.empty()
+    live.empty()
+
+
+def _format_progress(progress: dict) -> str:
+    """Korte voortgangstekst: aantallen, paren/s en resterende tijd."""
+    eta = progress.get("eta")
+    eta_text = _format_duration(eta) if eta is not None else "onbekend"
+    text = (
+        f"{progress['done']} / {progress['total']} paren · "
+        f"{progress['pairs_per_sec']:.1f} paren/s · nog ca. {eta_text}"
+    )
+    if progress.get("uitgesloten"):
+        text += f" · {progress['uitgesloten']} uitgesloten"
+    if progress.get("mislukt"):
+        text += f" · {progress['mislukt']} mislukt"
+    if progress.get("buiten_budget"):
+        text += f" · {progress['buiten_budget']} buiten budget"
+    if progress.get("hervat"):
+        text += f" · {progress['hervat']} hervat uit checkpoint"
+    cascade = progress.get("cascade")
+    if cascade and cascade["n_pairs"]:
+        text += (
+            f" · {cascade['n_escalated']} van {cascade['n_pairs']} geëscaleerd naar "
+            f"{cascade['strong']['model']}"
+        )
+    if progress.get("saved_tokens"):
+        text += f" · {progress['saved_tokens']} prompttokens bespaard door het budget"
+    if progress.get("input_tokens"):
+        text += (
+            f" · {progress['cached_tokens'] / progress['input_tokens']:.0%} "
+            "input-tokens uit prompt-cache"
+        )
+    return text
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}u {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+
+def _format_seconds(seconds: float) -> str:
+    """Als _format_duration, maar met tienden onder de minuut."""
+    return f"{seconds:.1f}s" if seconds < 60 else _format_duration(seconds)
+
+
+def _render_prefilter_report() -> None:
+    report = st.session_state.get(PREFILTER_REPORT_KEY)
+    if not report:
+        return
+
+    recall = report.get("recall")
+    recall_text = (
+        f"{recall:.0%} ({report['n_found']}/{report['n_relevant']} relevante paren, "
+        f"score ≥ {report['relevant_threshold']})"
+        if recall is not None
+        else "onbekend (geen eerdere volledige scores)"
+    )
+    st.caption(
+        f"Laatste run: {report['n_candidates']} van {report['n_pairs']} paren naar de LLM · "
+        f"recall t.o.v. vorige LLM-scores: {recall_text}"
+    )
+
+
+def _render_cascade_report() -> None:
+    report = st.session_state.get(CASCADE_REPORT_KEY)
+    if not report:
+        return
+
+    baseline = report["baseline"]
+    col_cost, col_time, col_share = st.columns(3)
+    col_cost.metric(
+        "Kosten (USD)",
+        f"{report['total']['cost_usd']:.4f}",
+        help=(
+            f"Geschat met alleen {report['strong']['model']}: "
+            + (f"{baseline['cost_usd']:.4f}" if baseline["cost_usd"] is not None else "onbekend")
+        ),
+    )
+    col_time.metric(
+        "Doorlooptijd scoring",
+        _format_seconds(report["total"]["seconds"]),
+        help=(
+            f"Geschat met alleen {report['strong']['model']}: "
+            + (
+                _format_seconds(baseline["seconds"])
+                if baseline["seconds"] is not None
+                else "onbekend"
+            )
+        ),
+    )
+    col_share.metric(
+        "Geëscaleerd",
+        f"{report['escalation_share']:.0%}",
+        help=f"{report['n_escalated']} van {report['n_pairs']} paren",
+    )
+    savings = [
+        f"{label} {value:.0%}"
+        for label, value in (("kosten", report["cost_saving"]), ("tijd", report["time_saving"]))
+        if value is not None
+    ]
+    st.caption(
+        f"Laatste run: eerste ronde {report['cheap']['scorer']} "
+        f"({report['cheap']['calls']} calls, ${report['cheap']['cost_usd']:.4f}, "
+        f"{_format_seconds(report['cheap']['seconds'])}) · "
+        f"{report['strong']['model']} ({report['strong']['calls']} calls, "
+        f"${report['strong']['cost_usd']:.4f}, {_format_seconds(report['strong']['seconds'])})"
+        + (f" · besparing t.o.v. alleen het sterke model: {', '.join(savings)}" if savings else "")
+    )
+
+
+def _render_shadow_report() -> None:
+    report = st.session_state.get(SHADOW_REPORT_KEY)
+    if not report:
+        return
+    if not report["n"]:
+        st.warning("Geen bruikbare scores in de steekproef.")
+        return
+
+    col_rho, col_shift, col_overlap = st.columns(3)
+    col_rho.metric(
+        "Rangcorrelatie (Spearman)",
+        f"{report['spearman']:.2f}" if report["spearman"] is not None else "n.v.t.",
+    )
+    col_shift.metric(
+        "Gemiddelde verschuiving",
+        f"{report['mean_shift']:+.1f}",
+        help=f"Gemiddeld absoluut verschil: {report['mean_abs_diff']:.1f}",
+    )
+    col_overlap.metric(
+        f"Top-{report['top_k']}-overlap per organisatie",
+        f"{report['top_k_overlap']:.0%}" if report["top_k_overlap"] is not None else "n.v.t.",
+    )
+    st.caption(
+        f"{report['n']} paren vergeleken ({report['n_failed']} mislukt) met "
+        f"{report['n_calls']} LLM-calls; een volledige herberekening kost "
+        f"tot {report['n_pairs_total']} calls."
+    )
+    for column, shifts in report["per_stratum"].items():
+        st.caption(
+            f"Verschuiving per {column}: "
+            + ", ".join(f"{name} {shift:+.1f}" for name, shift in shifts.items())
+        )
+    st.dataframe(
+        report["pairs"].sort_values("verschil", key=lambda s: s.abs(), ascending=False),
+        use_container_width=True,
+    )
+
+
+def _render_unfinished_runs() -> None:
+    """Onderbroken herberekeningen die bij een volgende run worden hervat."""
+    runs = get_checkpoint_store().unfinished_runs()
+    if not runs:
+        return
+
+    with st.expander(f"Onderbroken herberekeningen ({len(runs)})", expanded=False):
+        st.caption(
+            "Een herberekening met dezelfde prompt, instellingen en gegevens gaat verder "
+            "waar deze runs gebleven zijn. Na een wijziging begint een nieuwe run."
+        )
+        for run in runs:
+            col_info, col_action = st.columns([4, 1])
+            with col_info:
+                st.markdown(
+                    f"Run {run['run_id']} (prompt {run['prompt_id']}) · "
+                    f"{run['n_done']} / {run['total']} paren gescoord"
+                )
+            with col_action:
+                if st.button("Weggooien", key=f"discard_run_{run['run_id']}"):
+                    get_checkpoint_store().discard_run(run["run_id"])
+                    st.rerun()
+
+
+def _render_score_cache_stats() -> None:
+    stats = get_score_cache().stats()
+    st.caption(
+        f"Score-cache: {stats['entries']} / {stats['max_entries']} entries · "
+        f"{stats['hits']} hits · {stats['misses']} misses "
+        f"(hit-rate {stats['hit_rate']:.0%}) · {stats['evictions']} verwijderd (LRU)"
+    )
+
+
+def _render_prompt_budget_stats(llm_client) -> None:
+    budget = llm_client.prompt_budget()
+    if budget is None:
+        return
+    stats = budget.snapshot()
+    saved_share = stats["tokens_saved"] / stats["tokens_before"] if stats["tokens_before"] else 0.0
+    st.caption(
+        f"Promptbudget: max {budget.max_tokens} tokens "
+        f"({'tiktoken' if budget.exact else '~4 tekens per token'}; inkorten in volgorde: "
+        f"{', '.join(budget.fields)}) · {stats['truncated']} van {stats['prompts']} prompts "
+        f"ingekort · {stats['tokens_saved']} tokens bespaard ({saved_share:.0%})"
+    )
+
+
+def _render_rate_limit_stats() -> None:
+    stats = get_rate_limiter().snapshot()
+    st.caption(
+        f"OpenAI-limiter: {stats['in_flight']} / {stats['concurrency_limit']} gelijktijdige calls "
+        f"(max {stats['max_concurrency']}) · {stats['requests']} requests · "
+        f"{stats['tokens_used']} tokens ({stats['cached_tokens']} van "
+        f"{stats['prompt_tokens']} input-tokens uit prompt-cache) · {stats['throttled']}× 429 · "
+        f"{stats['retries']} retries · {stats['failures']} definitief mislukt · "
+        f"{stats['wait_seconds']:.1f}s gewacht op limieten "
+        f"(limieten: {stats['rpm'] or 'onbegrensd'} req/min, "
+        f"{stats['tpm'] or 'onbegrensd'} tokens/min)"
+    )
+
+
+_METRIC_COLUMNS = [
+    "run_id",
+    "prompt_id",
+    "calls",
+    "wall_seconds_p50",
+    "wall_seconds_p95",
+    "queue_seconds_p95",
+    "prompt_tokens",
+    "cached_tokens",
+    "completion_tokens",
+    "cost_usd",
+    "retries",
+    "errors",
+]
+
+
+def _render_llm_metrics() -> None:
+    metrics = get_metrics()
+    per_run = metrics.per_run()
+    if not per_run:
+        return
+
+    with st.expander("LLM-metingen per run en prompt", expanded=False):
+        st.caption(
+            "Per LLM-call: duur (incl. retries), wachttijd op de limiter, tokens, "
+            "geschatte kosten (USD), retries en foutklasse. p50/p95 zijn bovengrenzen "
+            "van histogram-buckets."
+        )
+        st.dataframe(_metrics_frame(per_run, _METRIC_COLUMNS), use_container_width=True)
+        st.dataframe(
+            _metrics_frame(metrics.per_prompt(), _METRIC_COLUMNS[1:]),
+            use_container_width=True,
+        )
+        col_json, col_prom = st.columns(2)
+        with col_json:
+            st.download_button(
+                "Metrics als JSON",
+                data=metrics.metrics_json(),
+                file_name="llm_metrics.json",
+                mime="application/json",
+            )
+        with col_prom:
+            st.download_button(
+                "Metrics in Prometheus-formaat",
+                data=metrics.prometheus_text(),
+                file_name="llm_metrics.prom",
+                mime="text/plain",
+            )
+
+
+def _metrics_frame(rows: list, columns: list) -> pd.DataFrame:
+    df = pd.DataFrame(rows)[columns]
+    df["errors"] = df["errors"].map(
+        lambda errors: ", ".join(f"{name}: {count}" for name, count in errors.items())
+    )
+    return df
+
+
+def _render_background_jobs() -> None:
+    st.subheader("Achtergrondjobs")
+    st.caption(
+        "Jobs lopen door als je van tabblad wisselt of de pagina herlaadt. "
+        "Het resultaat wordt overgenomen zodra de job klaar is."
+    )
+
+    if st.button("Nieuwsbrieven voor alle organisaties genereren"):
+        start_newsletter_job()
+
+    # Alleen verversen zolang er een job loopt of wacht
+    if has_active_jobs():
+        _render_live_job_list()
+    else:
+        _render_job_list()
+
+
+@st.fragment(run_every=2)
+def _render_live_job_list() -> None:
+    if not has_active_jobs():
+        # Alles afgerond: één volledige rerun neemt de resultaten over
+        # (zie app.py) en stopt het verversen
+        st.rerun()
+    _render_job_list()
+
+
+def _render_job_list() -> None:
+    jobs = session_jobs()
+    if not jobs:
+        st.caption("Nog geen achtergrondjobs gestart in deze sessie.")
+        return
+
+    for job in jobs:
+        col_info, col_action = st.columns([4, 1])
+        with col_info:
+            st.markdown(f"**{job.description}** · {job.status} (job {job.job_id})")
+            if job.status == JOB_BEZIG and job.progress:
+                st.progress(_progress_fraction(job.progress), text=_format_job_progress(job.progress))
+            if job.error:
+                st.error(job.error)
+        with col_action:
+            if job.status == JOB_BEZIG:
+                if job.cancel_requested():
+                    st.caption("Wordt geannuleerd...")
+                elif st.button("Annuleren", key=f"cancel_job_{job.job_id}"):
+                    get_job_runner().cancel(job.job_id)
+            elif job.status == JOB_KLAAR and not job.handed_off:
+                if st.button("Resultaat overnemen", key=f"hand_off_job_{job.job_id}"):
+                    hand_off(job)
+                    st.rerun()
+
+
+def _progress_fraction(progress: dict) -> float:
+    return min(progress["done"] / progress["total"], 1.0) if progress.get("total") else 1.0
+
+
+def _format_job_progress(progress: dict) -> str:
+    if "pairs_per_sec" in progress:
+        return _format_progress(progress)
+    return f"{progress['done']} / {progress['total']}"
+
 
 def _render_dataset_overview() -> None:
     st.subheader("Overzicht van tabellen in deze PoC")
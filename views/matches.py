@@ -8,6 +8,8 @@ from data.data_store import (
     SUBSIDIES_KEY,
     get_table,
 )
+from services.jobs import JOB_BEZIG, session_jobs
+from services.matching import RECOMPUTE_JOB_KIND, RECOMPUTE_PROGRESS_KEY, STATUS_FOUT
 
 
 def render_matches() -> None:
@@ -17,6 +19,8 @@ def render_matches() -> None:
     orgs_df = get_table(ORGANISATIONS_KEY)
     subs_df = get_table(SUBSIDIES_KEY)
 
+    _render_recompute_progress(orgs_df, subs_df)
+
     if matches_df.empty:
         st.info("Er zijn nog geen matches beschikbaar. Genereer matches met AI via het tabblad 'Home'.")
         return
@@ -26,19 +30,23 @@ def render_matches() -> None:
     filters = _render_filters(matches_df)
     filtered = _apply_filters(matches_df, filters)
 
+    columns = [
+        "match_id",
+        "type",
+        "match_score",
+        "status",
+        "organisatie_naam",
+        "subsidie_naam",
+        "bron",
+        "datum_toegevoegd",
+    ]
+    # Na een cascaderun: welke stap (goedkoop of sterk model) de score gaf
+    if "score_bron" in filtered.columns:
+        columns.insert(4, "score_bron")
+
     st.subheader("Overzicht matches")
     st.dataframe(
-        filtered[
-            [
-                "match_id",
-                "type",
-                "match_score",
-                "organisatie_naam",
-                "subsidie_naam",
-                "bron",
-                "datum_toegevoegd",
-            ]
-        ].sort_values("match_score", ascending=False),
+        filtered[columns].sort_values("match_score", ascending=False),
         use_container_width=True,
     )
 
@@ -46,6 +54,35 @@ def render_matches() -> None:
     _render_match_detail(filtered)
 
 
+def _render_recompute_progress(orgs_df: pd.DataFrame, subs_df: pd.DataFrame) -> None:
+    """Toon voorlopige topresultaten van een lopende herberekening."""
+    progress = st.session_state.get(RECOMPUTE_PROGRESS_KEY)
+    if not progress:
+        running = [
+            job
+            for job in session_jobs()
+            if job.kind == RECOMPUTE_JOB_KIND and job.status == JOB_BEZIG and job.progress
+        ]
+        if not running:
+            return
+        progress = running[0].progress
+
+    st.subheader("Herberekening loopt")
+    st.caption(
+        f"{progress['done']} van {progress['total']} paren gescoord. "
+        "Hieronder de voorlopige topresultaten; de tabel daaronder toont "
+        "nog de vorige run tot deze run klaar is."
+    )
+    top = progress["top"]
+    if not top.empty:
+        top = _enrich_matches(top, orgs_df, subs_df)
+        st.dataframe(
+            top[["match_score", "organisatie_naam", "subsidie_naam", "bron"]],
+            use_container_width=True,
+        )
+    st.markdown("---")
+
+
 def _enrich_matches(
     matches_df: pd.DataFrame,
     orgs_df: pd.DataFrame,
@@ -89,13 +126,17 @@ def _enrich_matches(
     if "datum_toegevoegd" in df.columns:
         df["datum_toegevoegd"] = pd.to_datetime(df["datum_toegevoegd"]).dt.date
 
+    # Matches van vóór de statuskolom zijn allemaal gescoord
+    if "status" not in df.columns:
+        df["status"] = "gescoord"
+
     return df
 
 
 def _render_filters(df: pd.DataFrame) -> dict:
     st.subheader("Filters")
 
-    col_type, col_min_score, col_search = st.columns([1, 1, 2])
+    col_type, col_status, col_min_score, col_search = st.columns([1, 1, 1, 2])
 
     with col_type:
         type_filter = st.selectbox(
@@ -103,6 +144,18 @@ def _render_filters(df: pd.DataFrame) -> dict:
             options=["Alle", "organisatie", "persona"],
         )
 
+    with col_status:
+        statuses = ["Alle"] + sorted(df["status"].dropna().unique().tolist())
+        status_filter = st.selectbox(
+            "Status",
+            options=statuses,
+            help=(
+                "'voorgefilterd' zijn paren die de lexicale voorselectie niet haalden; "
+                "'fout' zijn paren waarvan de LLM-call mislukte."
+            ),
+        )
+        hide_failed = st.checkbox("Mislukte scorings verbergen", value=False)
+
     with col_min_score:
         min_score = st.slider(
             "Minimale matchscore",
@@ -120,6 +173,8 @@ def _render_filters(df: pd.DataFrame) -> dict:
 
     return {
         "type_filter": type_filter,
+        "status_filter": status_filter,
+        "hide_failed": hide_failed,
         "min_score": min_score,
         "search_text": search_text.strip().lower(),
     }
@@ -131,7 +186,15 @@ def _apply_filters(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
     if filters["type_filter"] != "Alle":
         out = out[out["type"] == filters["type_filter"]]
 
-    out = out[out["match_score"] >= filters["min_score"]]
+    if filters["status_filter"] != "Alle":
+        out = out[out["status"] == filters["status_filter"]]
+
+    if filters["hide_failed"]:
+        out = out[out["status"] != STATUS_FOUT]
+
+    # Paren zonder score (voorgefilterd) vallen af zodra er een minimum is gekozen
+    if filters["min_score"] > 0:
+        out = out[out["match_score"].fillna(0) >= filters["min_score"]]
 
     if filters["search_text"]:
         text = filters["search_text"]
@@ -173,7 +236,8 @@ def _render_match_detail(df: pd.DataFrame) -> None:
 
     cols = st.columns(3)
     with cols[0]:
-        st.metric("Matchscore", int(selected_row["match_score"]))
+        score = selected_row["match_score"]
+        st.metric("Matchscore", "–" if pd.isna(score) else int(score))
     with cols[1]:
         st.write("**Organisatie**")
         st.write(selected_row.get("organisatie_naam") or "–")
@@ -182,6 +246,10 @@ def _render_match_detail(df: pd.DataFrame) -> None:
     st.write(selected_row.get("subsidie_naam") or "Onbekend")
     st.write(f"Bron: {selected_row.get('bron') or 'Onbekend'}")
 
+    score_bron = selected_row.get("score_bron")
+    if isinstance(score_bron, str) and score_bron:
+        st.caption(f"Score van: {score_bron}")
+
     st.markdown("**Toelichting**")
     st.text(selected_row.get("match_toelichting") or "")
 
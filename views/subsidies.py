@@ -11,6 +11,9 @@ from data.data_store import (
     next_id,
     set_table,
 )
+from services.eligibility import RULES_COLUMN, parse_rules
+from services.matching import recompute_matches_for_subsidie
+from services.subsidy_summaries import get_summary_store, invalidate_subsidy_summary
 
 
 def render_subsidies() -> None:
@@ -162,10 +165,16 @@ def _render_subsidie_detail(subs_df: pd.DataFrame) -> None:
             "Weblink",
             value=row["weblink"],
         )
+        voorwaarden = st.text_area(
+            "Harde voorwaarden (JSON)",
+            value=_rules_text(row.get(RULES_COLUMN)),
+            height=80,
+            help=_RULES_HELP,
+        )
 
         submitted = st.form_submit_button("Opslaan wijzigingen")
 
-    if submitted:
+    if submitted and _valid_rules(voorwaarden):
         _update_subsidie(
             subs_df,
             sub_id,
@@ -177,9 +186,15 @@ def _render_subsidie_detail(subs_df: pd.DataFrame) -> None:
             voor_wie,
             eisen,
             weblink,
+            voorwaarden,
         )
         st.success("Subsidie bijgewerkt.")
 
+    summary = get_summary_store().latest(sub_id)
+    if summary:
+        with st.expander("Samenvatting voor prompts ({subsidie_samenvatting})", expanded=False):
+            st.text(summary)
+
     st.markdown("### Matches voor deze subsidie")
     _render_subsidie_matches(sub_id)
 
@@ -195,6 +210,7 @@ def _update_subsidie(
     voor_wie: str,
     eisen: str,
     weblink: str,
+    voorwaarden: str = "",
 ) -> None:
     idx = subs_df.index[subs_df["subsidie_id"] == sub_id]
     if len(idx) == 0:
@@ -208,8 +224,12 @@ def _update_subsidie(
     subs_df.at[i, "voor_wie"] = voor_wie
     subs_df.at[i, "samenvatting_eisen"] = eisen
     subs_df.at[i, "weblink"] = weblink
+    subs_df.at[i, RULES_COLUMN] = voorwaarden.strip()
 
     set_table(SUBSIDIES_KEY, subs_df)
+    # Voor_wie en eisen gaan mee in de samenvatting: opnieuw laten maken
+    invalidate_subsidy_summary(sub_id)
+    recompute_matches_for_subsidie(sub_id)
 
 
 def _render_subsidie_matches(sub_id: int) -> None:
@@ -277,10 +297,11 @@ def _render_add_subsidie(subs_df: pd.DataFrame) -> None:
         voor_wie = st.text_area("Voor wie", height=80)
         eisen = st.text_area("Samenvatting eisen", height=100)
         weblink = st.text_input("Weblink")
+        voorwaarden = st.text_area("Harde voorwaarden (JSON)", height=80, help=_RULES_HELP)
 
         submitted = st.form_submit_button("Toevoegen")
 
-    if submitted and naam:
+    if submitted and naam and _valid_rules(voorwaarden):
         _add_subsidie(
             subs_df,
             naam,
@@ -291,6 +312,7 @@ def _render_add_subsidie(subs_df: pd.DataFrame) -> None:
             voor_wie,
             eisen,
             weblink,
+            voorwaarden,
         )
         st.success("Subsidie toegevoegd.")
 
@@ -305,6 +327,7 @@ def _add_subsidie(
     voor_wie: str,
     eisen: str,
     weblink: str,
+    voorwaarden: str = "",
 ) -> None:
     new_id = next_id(SUBSIDIES_KEY, "subsidie_id")
     new_row = {
@@ -317,9 +340,33 @@ def _add_subsidie(
         "voor_wie": voor_wie,
         "samenvatting_eisen": eisen,
         "weblink": weblink,
+        RULES_COLUMN: voorwaarden.strip(),
     }
     new_df = pd.concat(
         [subs_df, pd.DataFrame([new_row])],
         ignore_index=True,
     )
     set_table(SUBSIDIES_KEY, new_df)
+    recompute_matches_for_subsidie(new_id)
+
+
+_RULES_HELP = (
+    'Bijvoorbeeld {"max_medewerkers": 250} of {"sectoren": ["zorg"]}. '
+    "Mogelijk: sectoren, types_organisatie, locaties, min_/max_medewerkers, "
+    "min_/max_omzet. Organisaties die niet voldoen gaan niet naar de LLM."
+)
+
+
+def _rules_text(raw) -> str:
+    if raw is None or (isinstance(raw, float) and pd.isna(raw)):
+        return ""
+    return str(raw)
+
+
+def _valid_rules(voorwaarden: str) -> bool:
+    try:
+        parse_rules(voorwaarden)
+    except ValueError as exc:
+        st.error(f"Ongeldige voorwaarden: {exc}")
+        return False
+    return True